@@ -0,0 +1,141 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+from matching.canonical import LOCATIONS, SPECIALIZATIONS
+from matching.taxonomy import TAXONOMY
+
+# =====================================
+# Capacity-aware global assignment (min-cost flow)
+# =====================================
+# The weighted score only depends on the student and the rank of the location,
+# so every opening in a (specialization, location) bucket is worth the same to
+# a student. The flow therefore runs student -> bucket -> sink, with one arc per
+# preferred location (cost = -score) and bucket capacity = the sum of its
+# openings' seats. Seats inside a bucket are handed out afterwards.
+#
+# The network is solved as a linear program with the HiGHS dual simplex
+# (scipy, imported only by this mode). Its constraint matrix is a network
+# matrix, so every vertex of the polytope is integral and the basic solution
+# the simplex returns gives every student a whole seat or none. That is
+# checked rather than assumed: a fractional solution raises instead of being
+# rounded into placements.
+
+
+def build_buckets(openings, capacities):
+    """Group openings by canonical (specialization, location) ids; returns bucket keys, seat counts and member rows"""
+    bucket_ids = {}
+    seats = []
+    members = []
+    for row, opening in enumerate(openings):
+        key = (SPECIALIZATIONS.id(opening[1]), LOCATIONS.id(opening[2]))
+        if key not in bucket_ids:
+            bucket_ids[key] = len(seats)
+            seats.append(0)
+            members.append([])
+        bucket = bucket_ids[key]
+        seats[bucket] += capacities.get(opening[0], 1)
+        members[bucket].append(row)
+    return bucket_ids, seats, members
+
+
+def student_options(students, bucket_ids, gpa_weight, location_weight):
+    """List (bucket, score, priority) options per student using the weighted score"""
+    options = []
+    for student in students:
+        gpa, spec = student[4], SPECIALIZATIONS.id(student[5])
+        best = {}
+        for priority, loc in enumerate(LOCATIONS.id_list(student[6])):
+            # one arc per bucket of every specialization the taxonomy relates to the student's
+            for related in TAXONOMY.related(spec):
+                bucket = bucket_ids.get((related, loc))
+                if bucket is None:
+                    continue
+                score = (gpa * gpa_weight) + ((3 - priority) * location_weight)
+                if bucket not in best or score > best[bucket][0]:
+                    best[bucket] = (score, priority)
+        options.append([(bucket, score, priority) for bucket, (score, priority) in best.items()])
+    return options
+
+
+def solve_flow(options, seats):
+    """Return the bucket chosen for each student (-1 when unplaced)"""
+    from scipy.optimize import linprog  # only needed by the global assignment
+    from scipy.sparse import csr_matrix
+    student_idx = [i for i, opts in enumerate(options) for _ in opts]
+    bucket_idx = [bucket for opts in options for bucket, _, _ in opts]
+    cost = np.array([-score for opts in options for _, score, _ in opts], dtype=np.float64)
+    assigned = [-1] * len(options)
+    if not len(cost):
+        return assigned
+
+    arcs = len(cost)
+    rows = np.concatenate([np.array(student_idx), len(options) + np.array(bucket_idx)])
+    cols = np.tile(np.arange(arcs), 2)
+    # one row per student (at most one seat) and one per bucket (its seat count)
+    A = csr_matrix((np.ones(2 * arcs), (rows, cols)), shape=(len(options) + len(seats), arcs))
+    b = np.concatenate([np.ones(len(options)), np.array(seats, dtype=np.float64)])
+
+    result = linprog(cost, A_ub=A, b_ub=b, bounds=(0, 1), method="highs-ds")
+    if result.status != 0:
+        raise RuntimeError(f"Assignment solver failed: {result.message}")
+
+    x = np.round(result.x)
+    if np.abs(result.x - x).max() > 1e-6:
+        raise RuntimeError("Assignment solver returned a fractional solution")
+    for arc in np.flatnonzero(x == 1).tolist():
+        assigned[student_idx[arc]] = bucket_idx[arc]
+    return assigned
+
+
+def assign_globally(students, openings, capacities, gpa_weight=0.6, location_weight=0.4):
+    """Solve the capacity-constrained assignment.
+
+    Returns (placements, stats) where placements[i] is (opening row, priority, score)
+    or None for student i, and stats reports solve time, peak memory and fill.
+    """
+    # peak memory of the solve itself (Python and NumPy allocations), on every platform;
+    # tracing slows allocation down a little, which solve_seconds includes
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    bucket_ids, seats, members = build_buckets(openings, capacities)
+    options = student_options(students, bucket_ids, gpa_weight, location_weight)
+    assigned = solve_flow(options, seats)
+
+    # hand out concrete seats: openings in table order, students by descending score
+    by_bucket = [[] for _ in seats]
+    for i, bucket in enumerate(assigned):
+        if bucket >= 0:
+            score, priority = next((s, p) for b, s, p in options[i] if b == bucket)
+            by_bucket[bucket].append((-score, i, priority))
+
+    placements = [None] * len(students)
+    total_score = 0.0
+    for bucket, placed in enumerate(by_bucket):
+        placed.sort()
+        seat_rows = (row for row in members[bucket]
+                     for _ in range(capacities.get(openings[row][0], 1)))
+        for (neg_score, i, priority), row in zip(placed, seat_rows):
+            placements[i] = (row, priority, -neg_score)
+            total_score -= neg_score
+
+    solve_seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - base
+    if not tracing:
+        tracemalloc.stop()
+
+    stats = {
+        "solve_seconds": round(solve_seconds, 3),
+        "peak_traced_mb": round(peak / (1024 * 1024), 1),
+        "students": len(students),
+        "openings": len(openings),
+        "seats": sum(seats),
+        "assigned": sum(1 for p in placements if p is not None),
+        "total_score": round(total_score, 4),
+    }
+    return placements, stats
@@ -0,0 +1,209 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from matching.runs import diff, previous_run_id
+from matching.streaming import CsvSink, JsonlSink, match_columns, stream_to
+
+# =====================================
+# Batch matching CLI
+# =====================================
+# Runs one matching mode against a database and writes the matches to CSV or
+# JSONL in buffered chunks, instead of printing a line per match:
+#
+#   python -m matching.batch /path/to/apprenticeship.db --mode weighted --format csv --out matches.csv
+#
+# Made for cron: nothing is interactive, progress goes to stderr (or nowhere
+# with --quiet), the summary is printed at the end, and the output file is only
+# replaced once the run has finished, so a failed run never leaves half a file
+# behind. The exit code is 0 on success and 1 on failure.
+#
+# Every mode but matcher also saves the run (matching.runs); the summary then
+# has its run_id and how many students' openings changed since the last run
+# with the same mode and parameters.
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODES = {
+    "matcher": "matching.matcher: first opening in the best preferred location (streamed)",
+    "loop": "models.maching_system, unweighted (streamed)",
+    "weighted": "models.maching_system, weighted by GPA and location rank (streamed)",
+    "numpy": "models.maching_system vectorized engine, weighted",
+    "global": "capacity-aware global assignment (openings.capacity)",
+}
+
+SINKS = {"csv": CsvSink, "jsonl": JsonlSink}
+
+
+def import_models():
+    """The models package, imported"""
+    # importing models.* opens the default database, so its folder has to exist
+    os.makedirs(os.path.join(REPO_ROOT, 'database'), exist_ok=True)
+    import models.company
+    import models.maching_system
+    import models.student
+    return models
+
+
+def use_models_database(path):
+    """Point the models layer at `path` (the modules read db_path on every call)"""
+    models = import_models()
+    for module in (models.student, models.company, models.maching_system):
+        module.db_path = path
+    return models.maching_system
+
+
+def mode_matches(args):
+    """Return (matches, columns, close, saved_run) for the chosen mode; matches may be a generator.
+
+    saved_run() is the run_id of the saved run once the matches have been consumed (None for matcher).
+    """
+    if args.mode == "matcher":
+        from matching.matcher import MatchingSystem
+        system = MatchingSystem(args.db_path)
+        columns = match_columns(True, args.top_k)
+        matches = system.iter_matches(args.min_skill_overlap, args.top_k, args.chunk_size, quiet=True,
+                                      radius_km=args.radius_km)
+        return matches, columns, system.close, lambda: None
+
+    maching_system = use_models_database(args.db_path)
+    system = maching_system.MatchingSystem()
+    columns = match_columns(False, args.top_k)
+    if args.mode in ("loop", "weighted"):
+        matches = system.stream_matches(args.mode == "weighted", args.gpa_weight, args.location_weight,
+                                        args.min_skill_overlap, args.top_k, args.chunk_size, args.radius_km,
+                                        args.half_life_km)
+    elif args.mode == "numpy":
+        system.snapshot_path = args.snapshot
+        status, matches = system.match_students_to_openings(True, args.gpa_weight, args.location_weight, engine="numpy")
+    else:
+        status, matches = system.assign_students_to_openings(args.gpa_weight, args.location_weight)
+    return matches, columns, None, lambda: system.last_run_id
+
+
+class Summary:
+    """Counts matches as they pass through on their way to the sink"""
+    def __init__(self):
+        self.rows = 0
+        self.matched = 0
+        self.gpa_total = 0.0
+
+    def count(self, matches):
+        for match in matches:
+            self.rows += 1
+            if isinstance(match, dict):
+                placed = match["opening_id"] != "N/A" and match.get("rank", 1) == 1
+                gpa = match["gpa"]
+            else:
+                placed = len(match) == 5 or match[5] == 1  # one row per student, or its rank-1 row
+                gpa = match[1]
+            if placed:
+                self.matched += 1
+                self.gpa_total += gpa
+            yield match
+
+
+def count_students(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM students")
+    total = cursor.fetchone()[0]
+    conn.close()
+    return total
+
+
+def run(args):
+    students = count_students(args.db_path)
+    start = time.perf_counter()
+    last_report = [start]
+
+    def progress(written):
+        now = time.perf_counter()
+        if not args.quiet and now - last_report[0] >= args.progress_interval:
+            last_report[0] = now
+            print(f"[{now - start:8.1f}s] {written:,} rows written ({written / (now - start):,.0f} rows/s)",
+                  file=sys.stderr, flush=True)
+
+    matches, columns, close, saved_run = mode_matches(args)
+    summary = Summary()
+    partial = args.out + ".partial"
+    try:
+        written = stream_to(summary.count(matches), SINKS[args.format](partial, columns), args.chunk_size, progress)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        if close:
+            close()
+    os.replace(partial, args.out)
+
+    elapsed = time.perf_counter() - start
+    run_id, changed = saved_run(), None
+    if run_id is not None:
+        conn = sqlite3.connect(args.db_path)
+        previous = previous_run_id(conn, run_id)
+        changed = len(diff(conn, previous, run_id)) if previous is not None else None
+        conn.close()
+    return {
+        "mode": args.mode,
+        "database": args.db_path,
+        "output": args.out,
+        "students": students,
+        "rows_written": written,
+        "students_matched": summary.matched,
+        "students_unmatched": max(students - summary.matched, 0),
+        "match_rate": round(summary.matched / students, 4) if students else 0.0,
+        "average_matched_gpa": round(summary.gpa_total / summary.matched, 3) if summary.matched else None,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(written / elapsed, 1) if elapsed else None,
+        "run_id": run_id,
+        "students_changed": changed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a matching mode and write the results to CSV or JSONL")
+    parser.add_argument("db_path", help="SQLite database with the students and openings tables")
+    parser.add_argument("--mode", choices=list(MODES), default="weighted",
+                        help="; ".join(f"{mode}: {text}" for mode, text in MODES.items()))
+    parser.add_argument("--format", choices=list(SINKS), default="csv")
+    parser.add_argument("--out", help="output file (default: matches.<format>)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per fetch and per write")
+    parser.add_argument("--gpa-weight", type=float, default=0.6)
+    parser.add_argument("--location-weight", type=float, default=0.4)
+    parser.add_argument("--min-skill-overlap", type=int, default=0, help="matcher, loop and weighted modes")
+    parser.add_argument("--top-k", type=int, help="matcher, loop and weighted modes")
+    parser.add_argument("--radius-km", type=float, default=0,
+                        help="also match openings within this distance of a preferred city (matcher, loop and weighted modes)")
+    parser.add_argument("--half-life-km", type=float,
+                        help="distance at which the weighted location score halves (default: radius / 2)")
+    parser.add_argument("--snapshot", help="numpy mode: map the features from this matching.snapshot file, "
+                                           "rebuilding it when the database has changed")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument("--quiet", action="store_true", help="no progress lines, only the summary")
+    args = parser.parse_args(argv)
+    args.out = args.out or f"matches.{args.format}"
+
+    if not os.path.exists(args.db_path):
+        print(f"Database not found: {args.db_path}", file=sys.stderr)
+        return 1
+    if (args.min_skill_overlap or args.top_k or args.radius_km) and args.mode in ("numpy", "global"):
+        print(f"--min-skill-overlap, --top-k and --radius-km are not supported by the {args.mode} mode", file=sys.stderr)
+        return 1
+
+    try:
+        summary = run(args)
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Matching failed: {e}", file=sys.stderr)
+        return 1
+
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
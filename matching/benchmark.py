@@ -0,0 +1,327 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from matching.batch import use_models_database
+
+try:
+    import resource
+except ImportError:  # Windows has no getrusage; peak memory is then reported as None
+    resource = None
+
+# =====================================
+# Matching benchmark suite
+# =====================================
+# Builds seeded synthetic cohorts and times the matchers against them:
+#
+#   python -m matching.benchmark --sizes 1000 10000 100000 1000000 --out bench.json
+#   python -m matching.benchmark --sizes 1000 10000 --compare bench.json
+#
+# Each (case, size) runs in a fresh Python process, so the peak RSS it reports
+# belongs to that case alone. The generated databases are cached in --data-dir
+# by size and seed, so the same seed always gives the same cohort and later
+# runs don't have to rebuild them.
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+CASES = {
+    "matcher.match_students": "matching.matcher MatchingSystem.match_students()",
+    "maching_system.unweighted": "models.maching_system match_students_to_openings(weighted=False)",
+    "maching_system.weighted": "models.maching_system match_students_to_openings(weighted=True)",
+    "maching_system.numpy": "models.maching_system match_students_to_openings(weighted=True, engine='numpy')",
+}
+# the parallel path at 1, 2, 4 and 8 worker processes; workers=1 goes through the same pool, so the
+# timings show how it scales rather than how it compares with the loop engine
+WORKER_COUNTS = [1, 2, 4, 8]
+for workers in WORKER_COUNTS:
+    CASES[f"maching_system.workers={workers}"] = (f"models.maching_system parallel path, weighted, "
+                                                  f"{workers} worker process{'es' if workers > 1 else ''}")
+
+# -------------------------------------
+# Synthetic cohorts
+# -------------------------------------
+# (name, share of students and openings)
+SPECIALIZATIONS = [
+    ("IT", 0.22), ("Software Engineering", 0.18), ("Computer Science", 0.14), ("Accounting", 0.10),
+    ("Finance", 0.08), ("Marketing", 0.07), ("Cyber Security", 0.07), ("Data Science", 0.06),
+    ("HR", 0.04), ("Industrial Engineering", 0.04),
+]
+
+# big cities get most students and openings
+LOCATIONS = [
+    ("Riyadh", 0.34), ("Jeddah", 0.20), ("Dammam", 0.10), ("Mecca", 0.07), ("Medina", 0.06),
+    ("Khobar", 0.06), ("Abha", 0.04), ("Tabuk", 0.03), ("Taif", 0.03), ("Hail", 0.02),
+    ("Jazan", 0.02), ("Buraidah", 0.02), ("Najran", 0.01),
+]
+
+COMMON_SKILLS = ["communication", "teamwork", "excel", "english", "problem solving", "presentation"]
+
+SPECIALIZATION_SKILLS = {
+    "IT": ["networking", "linux", "windows server", "help desk", "sql", "python"],
+    "Software Engineering": ["python", "java", "git", "sql", "javascript", "testing", "c++"],
+    "Computer Science": ["python", "c++", "algorithms", "java", "ml", "sql"],
+    "Accounting": ["accounting", "ifrs", "sap", "auditing", "tax"],
+    "Finance": ["financial modeling", "accounting", "power bi", "valuation", "sql"],
+    "Marketing": ["social media", "seo", "content writing", "design", "analytics"],
+    "Cyber Security": ["networking", "linux", "siem", "penetration testing", "python"],
+    "Data Science": ["python", "sql", "ml", "statistics", "power bi", "r"],
+    "HR": ["recruitment", "payroll", "labor law", "arabic writing"],
+    "Industrial Engineering": ["autocad", "lean", "six sigma", "operations research", "excel"],
+}
+
+SCHEMA = """
+CREATE TABLE students (
+    student_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mobile_number TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    gpa REAL NOT NULL,
+    specialization TEXT NOT NULL,
+    preferred_locations TEXT NOT NULL,
+    skills TEXT NOT NULL
+);
+CREATE TABLE companies (
+    company_name TEXT PRIMARY KEY,
+    company_email TEXT UNIQUE NOT NULL,
+    company_password TEXT NOT NULL
+);
+CREATE TABLE openings (
+    opening_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_name TEXT NOT NULL,
+    specialization TEXT NOT NULL,
+    location TEXT NOT NULL,
+    stipend INTEGER NOT NULL,
+    required_skills TEXT NOT NULL,
+    capacity INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE applications (
+    application_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    opening_id INTEGER NOT NULL,
+    status TEXT DEFAULT 'pending',
+    preference_rank INTEGER
+);
+"""
+
+
+def pick_skills(rnd, spec, count):
+    """Mostly skills of the specialization, topped up with general ones"""
+    pool = SPECIALIZATION_SKILLS[spec]
+    own = rnd.sample(pool, min(len(pool), max(1, count - 1)))
+    return own + rnd.sample(COMMON_SKILLS, count - len(own))
+
+
+def synthetic_students(rnd, count):
+    specs, spec_weights = zip(*SPECIALIZATIONS)
+    locs, loc_weights = zip(*LOCATIONS)
+    for i in range(count):
+        spec = rnd.choices(specs, spec_weights)[0]
+        preferred = []
+        while len(preferred) < rnd.choices([1, 2, 3], [0.3, 0.45, 0.25])[0]:
+            loc = rnd.choices(locs, loc_weights)[0]
+            if loc not in preferred:
+                preferred.append(loc)
+        gpa = round(min(5.0, max(2.0, rnd.gauss(3.7, 0.55))), 2)
+        yield (f"{i:07d}", f"Student {i}", f"05{rnd.randrange(10 ** 8):08d}", f"student{i}@example.com", "x",
+               gpa, spec, ", ".join(preferred), ",".join(pick_skills(rnd, spec, rnd.randint(2, 6))))
+
+
+def synthetic_openings(rnd, count, companies):
+    specs, spec_weights = zip(*SPECIALIZATIONS)
+    locs, loc_weights = zip(*LOCATIONS)
+    for _ in range(count):
+        spec = rnd.choices(specs, spec_weights)[0]
+        yield (f"Company {rnd.randrange(companies)}", spec, rnd.choices(locs, loc_weights)[0],
+               rnd.randrange(2000, 8001, 250), ",".join(pick_skills(rnd, spec, rnd.randint(1, 4))),
+               rnd.choices([1, 2, 3, 5], [0.6, 0.2, 0.15, 0.05])[0])
+
+
+def build_database(path, students, openings, seed):
+    """Write a seeded synthetic cohort to a new SQLite file"""
+    rnd = random.Random(seed)
+    companies = max(1, openings // 8)
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.executescript(SCHEMA)
+    cursor.executemany("INSERT INTO companies VALUES (?, ?, ?)",
+                       [(f"Company {i}", f"hr{i}@company{i}.com", "x") for i in range(companies)])
+    cursor.executemany("INSERT INTO students VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", synthetic_students(rnd, students))
+    cursor.executemany("""
+        INSERT INTO openings (company_name, specialization, location, stipend, required_skills, capacity)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, synthetic_openings(rnd, openings, companies))
+    conn.commit()
+    conn.close()
+
+
+def cohort_path(data_dir, students, openings, seed):
+    path = os.path.join(data_dir, f"cohort_{students}_{openings}_{seed}.db")
+    if not os.path.exists(path):
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        build_database(partial, students, openings, seed)
+        os.replace(partial, path)
+    return path
+
+
+# -------------------------------------
+# Running one case (inside the child process)
+# -------------------------------------
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (the case runs alone in it), None without getrusage"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KB on Linux
+
+
+def run_case(case, path):
+    if case == "matcher.match_students":
+        from matching.matcher import MatchingSystem
+        start = time.perf_counter()
+        system = MatchingSystem(path)
+        with contextlib.redirect_stdout(io.StringIO()):  # one "No match found" line per unmatched student
+            matched = len(system.match_students())
+        system.close()
+    elif case.startswith("maching_system.workers="):
+        maching_system = use_models_database(path)
+        system = maching_system.MatchingSystem()
+        system.keep_runs = False
+        start = time.perf_counter()
+        students, openings = maching_system.view_students(), maching_system.view_openings()
+        status, matches = system.match_students_parallel(students, openings, int(case.split("=")[1]), True, 0.6, 0.4)
+        matched = sum(1 for match in matches if match["opening_id"] != "N/A")
+    else:
+        maching_system = use_models_database(path)
+        options = {
+            "maching_system.unweighted": {"weighted": False},
+            "maching_system.weighted": {"weighted": True},
+            "maching_system.numpy": {"weighted": True, "engine": "numpy"},
+        }[case]
+        system = maching_system.MatchingSystem()
+        system.keep_runs = False  # time the matching, not the saving of the run
+        start = time.perf_counter()
+        status, matches = system.match_students_to_openings(**options)
+        matched = sum(1 for match in matches if match["opening_id"] != "N/A")
+    wall = time.perf_counter() - start
+
+    return {
+        "wall_seconds": round(wall, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "matches": matched,
+        "matches_per_sec": round(matched / wall, 1) if wall else None,
+    }
+
+
+# -------------------------------------
+# Suite
+# -------------------------------------
+def run_isolated(case, path, timeout):
+    command = [sys.executable, "-m", "matching.benchmark", "--run-case", case, path]
+    try:
+        completed = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"status": "timeout"}
+    if completed.returncode != 0:
+        return {"status": "error", "error": completed.stderr.strip().splitlines()[-1:]}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["status"] = "ok"
+    return result
+
+
+def run_suite(sizes, cases, seed, openings_ratio, data_dir, timeout):
+    results = []
+    for students in sizes:
+        openings = max(1, students // openings_ratio)
+        path = cohort_path(data_dir, students, openings, seed)
+        for case in cases:
+            result = {"case": case, "students": students, "openings": openings}
+            result.update(run_isolated(case, path, timeout))
+            results.append(result)
+            print(format_result(result), flush=True)
+    return results
+
+
+def format_result(result):
+    if result["status"] != "ok":
+        return f"{result['case']:<28} {result['students']:>9,} students | {result['status']}"
+    rss = f"{result['peak_rss_mb']:>8.1f} MB" if result["peak_rss_mb"] is not None else f"{'-':>8} MB"
+    return (f"{result['case']:<28} {result['students']:>9,} students | {result['wall_seconds']:>9.3f} s | "
+            f"{rss} | {result['matches_per_sec']:>12,.0f} matches/s")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    """Print wall time and memory of this run next to a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {(r["case"], r["students"]): r for r in json.load(f)["results"] if r.get("status") == "ok"}
+
+    print(f"\nCompared with {baseline_path}")
+    print(f"{'case':<28} {'students':>9} | {'wall':>8} | {'rss':>8}")
+    for result in results:
+        before = baseline.get((result["case"], result["students"]))
+        if result["status"] != "ok" or before is None:
+            continue
+        wall = result["wall_seconds"] / before["wall_seconds"] if before["wall_seconds"] else float("nan")
+        rss = (result["peak_rss_mb"] / before["peak_rss_mb"] if result["peak_rss_mb"] and before.get("peak_rss_mb")
+               else float("nan"))
+        print(f"{result['case']:<28} {result['students']:>9,} | {wall:>7.2f}x | {rss:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the matchers on synthetic cohorts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="student counts")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--openings-ratio", type=int, default=20, help="students per opening")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "matching_benchmark"))
+    parser.add_argument("--timeout", type=float, default=1800, help="seconds per case before it is skipped")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--run-case", nargs=2, metavar=("CASE", "DB_PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(*args.run_case)))
+        sys.exit(0)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = run_suite(args.sizes, args.cases, args.seed, args.openings_ratio, args.data_dir, args.timeout)
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "openings_ratio": args.openings_ratio,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,119 @@
+import heapq
+from itertools import islice
+
+from matching.canonical import LOCATIONS, SPECIALIZATIONS
+from matching.geo import CITIES, decay
+from matching.skills import SKILLS, popcount
+
+# =====================================
+# One student's matches
+# =====================================
+# The matching of MatchingSystem.match_students_to_openings and stream_matches,
+# one student at a time, against the (specialization, location) buckets of
+# matching.geo.bucket_openings. It only reads the shared canonical ids, cities
+# and skills, so a matcher that has loaded those (load_terms, load_cities) can
+# use it without importing the models layer, as matching.jobs does.
+
+
+def student_matches(student, buckets, weighted, gpa_weight, location_weight, min_skill_overlap=0,
+                    top_k=None, radius_km=0, half_life_km=None):
+    # buckets: matching.geo.bucket_openings of the openings, so only the student's eligible
+    # (specialization, location) buckets are looked at
+    student_id, name, mobile, email, gpa, spec, preferred_locations, skills = student
+    # canonical ids, so "Riyadh", " riyadh" and "Riyad" are the same location; a location listed
+    # twice keeps the priority of its first mention, so its openings are not candidates twice
+    location_ranks = {}
+    for priority, loc in enumerate(LOCATIONS.id_list(preferred_locations)):
+        location_ranks.setdefault(loc, priority)
+    spec = SPECIALIZATIONS.id(spec)
+
+    if radius_km:
+        candidates = nearby_matches(student, location_ranks, buckets.get, spec, radius_km,
+                                    half_life_km or radius_km / 2, weighted, gpa_weight, location_weight,
+                                    min_skill_overlap, top_k)
+    else:
+        candidates = candidate_matches(student, location_ranks, buckets.get, spec, weighted, gpa_weight,
+                                       location_weight, min_skill_overlap, top_k)
+
+    # bounded selection: nsmallest keeps at most top_k candidates and, like a stable sort, keeps ties in order
+    if weighted:
+        best_matches = heapq.nsmallest(top_k or 1, candidates, key=lambda m: -m['score'])
+    else:
+        best_matches = heapq.nsmallest(top_k or 1, candidates,
+                                       key=lambda m: (m['priority'], m.get('distance_km', 0), -m['gpa']))
+
+    if best_matches:
+        if top_k:
+            for rank, match in enumerate(best_matches, start=1):
+                match["rank"] = rank
+        return best_matches
+    return [{
+        "student_name": name,
+        "gpa": gpa,
+        "opening_id": "N/A",
+        "location": "N/A",
+        "stipend": "N/A",
+        "priority": 99,
+        "message": "No openings match your criteria"
+    }]
+
+
+def candidate_matches(student, location_ranks, bucket, spec, weighted, gpa_weight, location_weight,
+                      min_skill_overlap=0, top_k=None):
+    # yields candidates lazily, one (specialization, location) bucket per preferred location
+    student_id, name, mobile, email, gpa, s, preferred_locations, skills = student
+    skill_mask = SKILLS.encode(skills) if min_skill_overlap else 0
+    for loc, priority in location_ranks.items():
+        eligible = bucket((spec, loc), ())
+        if min_skill_overlap:
+            eligible = (op for op in eligible if popcount(skill_mask & SKILLS.encode(op[4])) >= min_skill_overlap)
+        # the whole bucket ties at this priority, so only its first top_k can be picked
+        for opening in islice(eligible, top_k or 1):
+            opening_id, o_spec, o_loc, stipend, req_skills = opening
+            if weighted:
+                score = (gpa * gpa_weight) + ((3 - priority) * location_weight)
+            else:
+                score = None
+            yield {
+                "student_name": name,
+                "gpa": gpa,
+                "opening_id": opening_id,
+                "location": o_loc,
+                "stipend": stipend,
+                "priority": priority,
+                "score": score
+            }
+
+
+def nearby_matches(student, location_ranks, bucket, spec, radius_km, half_life_km, weighted, gpa_weight,
+                   location_weight, min_skill_overlap, top_k):
+    # openings in or around each preferred location (bucket lookups, no scan of all openings);
+    # an opening near several preferred locations is kept once, at its best score
+    student_id, name, mobile, email, gpa, s, preferred_locations, skills = student
+    skill_mask = SKILLS.encode(skills) if min_skill_overlap else 0
+    best = {}
+    for loc, priority in location_ranks.items():
+        for near, distance in CITIES.nearby(loc, radius_km):
+            eligible = bucket((spec, near), ())
+            if min_skill_overlap:
+                eligible = (op for op in eligible if popcount(skill_mask & SKILLS.encode(op[4])) >= min_skill_overlap)
+            # the whole bucket ties at this priority and distance, so only its first top_k can be picked
+            for opening in islice(eligible, top_k or 1):
+                opening_id, o_spec, o_loc, stipend, req_skills = opening
+                if weighted:
+                    score = (gpa * gpa_weight) + ((3 - priority) * location_weight * decay(distance, half_life_km))
+                else:
+                    score = None
+                kept = best.get(opening_id)
+                if kept is None or (weighted and score > kept["score"]):
+                    best[opening_id] = {
+                        "student_name": name,
+                        "gpa": gpa,
+                        "opening_id": opening_id,
+                        "location": o_loc,
+                        "stipend": stipend,
+                        "priority": priority,
+                        "score": score,
+                        "distance_km": round(distance, 1)
+                    }
+    return best.values()
@@ -0,0 +1,175 @@
+import sqlite3
+
+# =====================================
+# Canonical ids for locations and specializations
+# =====================================
+# Every raw string is cleaned once (whitespace collapsed, case folded, common
+# aliases resolved) and interned as a small integer id. Later lookups of the
+# same raw string are a single dict hit, so matchers compare ints instead of
+# re-cleaning strings. The canonical names and their ids are stored in the
+# canonical_terms table so ids stay the same from one run to the next, and
+# extra aliases can be added in canonical_aliases without touching the code.
+
+DEFAULT_LOCATION_ALIASES = {
+    "riyad": "riyadh",
+    "ar riyadh": "riyadh",
+    "الرياض": "riyadh",
+    "jeddah": "jeddah",
+    "jiddah": "jeddah",
+    "jidda": "jeddah",
+    "jedda": "jeddah",
+    "جدة": "jeddah",
+    "makkah": "mecca",
+    "makka": "mecca",
+    "مكة": "mecca",
+    "madinah": "medina",
+    "al madinah": "medina",
+    "madina": "medina",
+    "المدينة": "medina",
+    "ad dammam": "dammam",
+    "الدمام": "dammam",
+    "al khobar": "khobar",
+    "alkhobar": "khobar",
+    "الخبر": "khobar",
+    "ad diriyah": "diriyah",
+    "dir'iyah": "diriyah",
+    "al ahsa": "hofuf",
+    "al-ahsa": "hofuf",
+    "al hofuf": "hofuf",
+    "kharj": "al kharj",
+    "baha": "al baha",
+    "buraydah": "buraidah",
+    "jizan": "jazan",
+    "khamis mushayt": "khamis mushait",
+    "sakaka": "sakakah",
+}
+
+DEFAULT_SPECIALIZATION_ALIASES = {
+    "information technology": "it",
+    "i.t.": "it",
+    "cs": "computer science",
+    "comp sci": "computer science",
+    "se": "software engineering",
+    "software eng": "software engineering",
+    "cybersecurity": "cyber security",
+    "cyber-security": "cyber security",
+    "ds": "data science",
+    "human resources": "hr",
+    "accountancy": "accounting",
+}
+
+
+def normalize(text):
+    return " ".join(text.split()).casefold()
+
+
+class Canonicalizer:
+    def __init__(self, kind, aliases):
+        self.kind = kind
+        self.aliases = {normalize(alias): normalize(name) for alias, name in aliases.items()}
+        self.ids = {}         # canonical name -> id
+        self.names = []       # id -> canonical name
+        self.cache = {}       # raw string -> id
+        self.list_cache = {}  # raw comma separated string -> tuple of ids
+        self.saved = 0        # names[:saved] are already in canonical_terms
+
+    def canonical_name(self, text):
+        name = normalize(text)
+        return self.aliases.get(name, name)
+
+    def intern(self, name):
+        term_id = self.ids.get(name)
+        if term_id is None:
+            term_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return term_id
+
+    def id(self, text):
+        term_id = self.cache.get(text)
+        if term_id is None:
+            term_id = self.cache[text] = self.intern(self.canonical_name(text))
+        return term_id
+
+    def id_list(self, text):
+        """Ids of a comma separated list, in order (duplicates kept)"""
+        ids = self.list_cache.get(text)
+        if ids is None:
+            ids = self.list_cache[text] = tuple(self.id(part) for part in text.split(","))
+        return ids
+
+    def add_alias(self, alias, name):
+        self.aliases[normalize(alias)] = normalize(name)
+        self.cache.clear()
+        self.list_cache.clear()
+
+    # -------------------------------------
+    # Persistence
+    # -------------------------------------
+    def load(self, cursor):
+        cursor.execute("SELECT alias, name FROM canonical_aliases WHERE kind = ?", (self.kind,))
+        for alias, name in cursor.fetchall():
+            self.add_alias(alias, name)
+
+        cursor.execute("SELECT term_id, name FROM canonical_terms WHERE kind = ? ORDER BY term_id", (self.kind,))
+        stored = cursor.fetchall()
+        # only adopt the stored ids if nothing has been interned yet in this process
+        if not self.names:
+            for term_id, name in stored:
+                if term_id != len(self.names):
+                    break
+                self.intern(name)
+            self.saved = len(self.names)
+
+    def save(self, cursor):
+        cursor.executemany("INSERT OR IGNORE INTO canonical_terms (kind, term_id, name) VALUES (?, ?, ?)",
+                           [(self.kind, term_id, self.names[term_id]) for term_id in range(self.saved, len(self.names))])
+        self.saved = len(self.names)
+
+
+LOCATIONS = Canonicalizer("location", DEFAULT_LOCATION_ALIASES)
+SPECIALIZATIONS = Canonicalizer("specialization", DEFAULT_SPECIALIZATION_ALIASES)
+
+
+def create_tables(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS canonical_terms (
+        kind TEXT NOT NULL,
+        term_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        PRIMARY KEY (kind, term_id),
+        UNIQUE (kind, name)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS canonical_aliases (
+        kind TEXT NOT NULL,
+        alias TEXT NOT NULL,
+        name TEXT NOT NULL,
+        PRIMARY KEY (kind, alias)
+    )
+    """)
+
+
+def load_terms(conn):
+    from matching.taxonomy import TAXONOMY  # taxonomy builds on this module, so it is imported here
+    cursor = conn.cursor()
+    create_tables(cursor)
+    LOCATIONS.load(cursor)
+    SPECIALIZATIONS.load(cursor)
+    TAXONOMY.load(cursor)  # the specialization tree, by the ids just loaded
+
+
+def save_terms(conn):
+    cursor = conn.cursor()
+    create_tables(cursor)
+    LOCATIONS.save(cursor)
+    SPECIALIZATIONS.save(cursor)
+    conn.commit()
+
+
+def sync_terms(db_path):
+    """load_terms + save_terms for code that works with a path instead of a connection"""
+    conn = sqlite3.connect(db_path)
+    load_terms(conn)
+    save_terms(conn)
+    conn.close()
@@ -0,0 +1,276 @@
+import sqlite3
+from array import array
+
+import numpy as np
+
+from matching.canonical import LOCATIONS, SPECIALIZATIONS
+from matching.skills import SKILLS
+from matching.taxonomy import TAXONOMY
+
+# =====================================
+# Columnar feature store
+# =====================================
+# Loads students and openings into array-backed columns instead of one tuple
+# per row: NumPy arrays for ids, GPA and stipend, canonical ids for
+# specialization and location, preferred locations as one flat id array with
+# row offsets, skills as a packed bit matrix, and text as one UTF-8 buffer with
+# offsets. Rows are read with fetchmany and appended to array.array columns, so
+# the tuples of a batch are dropped as soon as it has been copied.
+#
+# A student costs a few dozen bytes this way, against several hundred as a
+# tuple of Python objects. Results can stay columnar too (MatchTable), and are
+# only turned into dicts one at a time when they are read.
+
+BATCH_SIZE = 5000
+
+
+class StringColumn:
+    """Strings stored as one UTF-8 buffer plus end offsets"""
+    def __init__(self):
+        self.buffer = bytearray()
+        self.ends = array("q")
+
+    def append(self, text):
+        self.buffer += str(text).encode("utf-8")
+        self.ends.append(len(self.buffer))
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, i):
+        start = self.ends[i - 1] if i else 0
+        return bytes(self.buffer[start:self.ends[i]]).decode("utf-8")
+
+    def tolist(self):
+        data = bytes(self.buffer)
+        return [data[start:end].decode("utf-8") for start, end in zip([0, *self.ends[:-1]], self.ends)]
+
+
+class RaggedColumn:
+    """A list of int lists stored as one flat array plus end offsets"""
+    def __init__(self):
+        self.values = array("i")
+        self.ends = array("q")
+
+    def append(self, items):
+        self.values.extend(items)
+        self.ends.append(len(self.values))
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, i):
+        start = self.ends[i - 1] if i else 0
+        return self.values[start:self.ends[i]]
+
+    def padded(self, fill=-1, dtype=np.int64):
+        """(rows, longest row) matrix, short rows padded with `fill`"""
+        ends = np.frombuffer(self.ends, dtype=np.int64) if len(self.ends) else np.zeros(0, dtype=np.int64)
+        values = np.frombuffer(self.values, dtype=np.int32) if len(self.values) else np.zeros(0, dtype=np.int32)
+        lengths = np.diff(ends, prepend=0)
+        matrix = np.full((len(ends), max(int(lengths.max(initial=0)), 1)), fill, dtype=dtype)
+        rows = np.repeat(np.arange(len(ends)), lengths)
+        matrix[rows, np.arange(len(values)) - np.repeat(ends - lengths, lengths)] = values
+        return matrix
+
+
+def pack_skill_ids(skill_ids):
+    """Packed (rows, bytes) uint8 bit matrix from a RaggedColumn of skill ids, lowest id in byte 0"""
+    ends = np.frombuffer(skill_ids.ends, dtype=np.int64) if len(skill_ids) else np.zeros(0, dtype=np.int64)
+    values = np.frombuffer(skill_ids.values, dtype=np.int32) if len(skill_ids.values) else np.zeros(0, dtype=np.int32)
+    packed = np.zeros((len(ends), max((len(SKILLS.names) + 7) // 8, 1)), dtype=np.uint8)
+    rows = np.repeat(np.arange(len(ends)), np.diff(ends, prepend=0))
+    np.bitwise_or.at(packed, (rows, values >> 3), (1 << (values & 7)).astype(np.uint8))
+    return packed
+
+
+def widen(packed, width):
+    """Pad a packed skill matrix with zero bytes up to `width` (skills interned after it was packed)"""
+    if packed.shape[1] >= width:
+        return packed
+    return np.hstack([packed, np.zeros((packed.shape[0], width - packed.shape[1]), dtype=np.uint8)])
+
+
+def skill_ids(text):
+    return [SKILLS.skill_id(skill) for skill in (part.strip().lower() for part in text.split(",")) if skill]
+
+
+class StudentFeatures:
+    def __init__(self):
+        self.student_id = StringColumn()
+        self.name = StringColumn()
+        self.gpa = array("d")
+        self.spec = array("i")
+        self.locations = RaggedColumn()  # canonical location ids in preference order
+        self.skill_ids = RaggedColumn()
+        self.skills = None               # packed bit matrix, filled by finish()
+
+    def add(self, student_id, name, gpa, specialization, preferred_locations, skills=None):
+        self.student_id.append(student_id)
+        self.name.append(name)
+        self.gpa.append(gpa)
+        self.spec.append(SPECIALIZATIONS.id(specialization))
+        self.locations.append(LOCATIONS.id_list(preferred_locations))
+        if skills is not None:
+            self.skill_ids.append(skill_ids(skills))
+
+    def finish(self):
+        self.gpa = np.frombuffer(self.gpa, dtype=np.float64)
+        self.spec = np.frombuffer(self.spec, dtype=np.int32)
+        if len(self.skill_ids):
+            self.skills = pack_skill_ids(self.skill_ids)
+            self.skill_ids = None
+        return self
+
+    def __len__(self):
+        return len(self.student_id)
+
+    def nbytes(self):
+        total = len(self.student_id.buffer) + len(self.name.buffer) + self.gpa.nbytes + self.spec.nbytes
+        total += (len(self.student_id.ends) + len(self.name.ends) + len(self.locations.ends)) * 8
+        total += len(self.locations.values) * 4
+        return total + (self.skills.nbytes if self.skills is not None else 0)
+
+
+class OpeningFeatures:
+    def __init__(self):
+        self.opening_id = array("q")
+        self.spec = array("i")
+        self.loc = array("i")
+        self.stipend = array("q")
+        self.capacity = array("i")
+        self.location = StringColumn()   # location as written on the opening, for output
+        self.skill_ids = RaggedColumn()
+        self.skills = None
+
+    def add(self, opening_id, specialization, location, stipend, required_skills, capacity=1):
+        self.opening_id.append(opening_id)
+        self.spec.append(SPECIALIZATIONS.id(specialization))
+        self.loc.append(LOCATIONS.id(location))
+        self.stipend.append(stipend)
+        self.capacity.append(capacity)
+        self.location.append(location)
+        self.skill_ids.append(skill_ids(required_skills))
+
+    def finish(self):
+        self.opening_id = np.frombuffer(self.opening_id, dtype=np.int64)
+        self.spec = np.frombuffer(self.spec, dtype=np.int32)
+        self.loc = np.frombuffer(self.loc, dtype=np.int32)
+        self.stipend = np.frombuffer(self.stipend, dtype=np.int64)
+        self.capacity = np.frombuffer(self.capacity, dtype=np.int32)
+        self.skills = pack_skill_ids(self.skill_ids)
+        self.skill_ids = None
+        return self
+
+    def __len__(self):
+        return len(self.opening_id)
+
+    def buckets(self):
+        """(specialization id, location id) -> opening rows in table order.
+
+        An opening is filed under every specialization the taxonomy relates to its own,
+        so a student's bucket also holds the openings of its ancestors and descendants.
+        """
+        buckets = {}
+        for row, (spec, loc) in enumerate(zip(self.spec.tolist(), self.loc.tolist())):
+            for related in TAXONOMY.related(spec):
+                buckets.setdefault((related, loc), []).append(row)
+        return buckets
+
+
+# -------------------------------------
+# Loading
+# -------------------------------------
+def has_column(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return column in [row[1] for row in cursor.fetchall()]
+
+
+def load_students(conn, skills=False, batch_size=BATCH_SIZE):
+    """skills=False leaves out the skill matrix for engines that do not filter on skills"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT student_id, name, gpa, specialization, preferred_locations{", skills" if skills else ""}
+        FROM students
+    """)
+    students = StudentFeatures()
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            students.add(*row)
+    return students.finish()
+
+
+def load_openings(conn, batch_size=BATCH_SIZE):
+    cursor = conn.cursor()
+    capacity = "capacity" if has_column(cursor, "openings", "capacity") else "1"
+    cursor.execute(f"""
+        SELECT opening_id, specialization, location, stipend, required_skills, {capacity}
+        FROM openings ORDER BY opening_id
+    """)
+    openings = OpeningFeatures()
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            openings.add(*row)
+    return openings.finish()
+
+
+def load_features(db_path, skills=False):
+    """Return (StudentFeatures, OpeningFeatures) for a database"""
+    conn = sqlite3.connect(db_path)
+    openings = load_openings(conn)
+    students = load_students(conn, skills)
+    conn.close()
+    if students.skills is not None:
+        openings.skills = widen(openings.skills, students.skills.shape[1])
+    return students, openings
+
+
+# -------------------------------------
+# Columnar results
+# -------------------------------------
+class MatchTable:
+    """Matches kept as arrays; rows are built as dicts (the usual match format) only when read"""
+    def __init__(self, students, openings, opening_row, priority, score, message="No openings match your criteria"):
+        self.students = students
+        self.openings = openings
+        self.opening_row = opening_row   # -1 when the student has no match
+        self.priority = priority
+        self.score = score               # None for unweighted runs
+        self.message = message
+
+    def __len__(self):
+        return len(self.opening_row)
+
+    def __getitem__(self, i):
+        row = int(self.opening_row[i])
+        if row < 0:
+            return {
+                "student_name": self.students.name[i],
+                "gpa": float(self.students.gpa[i]),
+                "opening_id": "N/A",
+                "location": "N/A",
+                "stipend": "N/A",
+                "priority": 99,
+                "message": self.message
+            }
+        return {
+            "student_name": self.students.name[i],
+            "gpa": float(self.students.gpa[i]),
+            "opening_id": int(self.openings.opening_id[row]),
+            "location": self.openings.location[row],
+            "stipend": int(self.openings.stipend[row]),
+            "priority": int(self.priority[i]),
+            "score": float(self.score[i]) if self.score is not None else None
+        }
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def matched(self):
+        return int((self.opening_row >= 0).sum())
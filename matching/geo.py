@@ -0,0 +1,156 @@
+import math
+
+import numpy as np
+
+from matching.canonical import LOCATIONS, SPECIALIZATIONS
+from matching.taxonomy import TAXONOMY
+
+# =====================================
+# Distance-based location matching
+# =====================================
+# Openings sit in a handful of cities, so the spatial index is built over the
+# cities rather than the openings: a KD-tree of city points (on the unit sphere,
+# so the straight-line radius maps exactly to a great-circle distance). A radius
+# query returns the cities within reach of a student's location together with
+# their distance, and the matchers then read the openings of those cities from
+# their usual (specialization, location) buckets. Results are cached per
+# (location, radius), so each lookup after the first is a dict hit no matter how
+# many openings there are.
+#
+# Cities are stored by canonical location name and answered by canonical id.
+# Extra cities or corrected coordinates can be stored in the city_coordinates
+# table.
+
+EARTH_RADIUS_KM = 6371.0
+
+# canonical name -> (latitude, longitude)
+CITY_COORDINATES = {
+    "riyadh": (24.7136, 46.6753),
+    "diriyah": (24.7343, 46.5750),
+    "al kharj": (24.1556, 47.3120),
+    "jeddah": (21.4858, 39.1925),
+    "mecca": (21.3891, 39.8579),
+    "medina": (24.5247, 39.5692),
+    "taif": (21.2703, 40.4158),
+    "rabigh": (22.7986, 39.0349),
+    "thuwal": (22.2833, 39.1000),
+    "yanbu": (24.0895, 38.0618),
+    "dammam": (26.4207, 50.0888),
+    "khobar": (26.2172, 50.1971),
+    "dhahran": (26.2361, 50.0393),
+    "qatif": (26.5196, 50.0115),
+    "jubail": (27.0046, 49.6460),
+    "hofuf": (25.3833, 49.5833),
+    "abha": (18.2164, 42.5053),
+    "khamis mushait": (18.3093, 42.7296),
+    "jazan": (16.8892, 42.5511),
+    "najran": (17.4917, 44.1322),
+    "al baha": (20.0129, 41.4677),
+    "tabuk": (28.3835, 36.5662),
+    "hail": (27.5114, 41.7208),
+    "buraidah": (26.3260, 43.9750),
+    "unaizah": (26.0843, 43.9935),
+    "arar": (30.9753, 41.0381),
+    "sakakah": (29.9697, 40.2064),
+}
+
+
+def unit_vector(latitude, longitude):
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_length(distance_km):
+    """Straight-line distance between two points on the unit sphere distance_km apart"""
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def great_circle_km(a, b):
+    """Distance between two unit vectors along the earth's surface"""
+    chord = math.dist(a, b)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def decay(distance_km, half_life_km):
+    """Location score multiplier: 1 at the preferred city, halved every half_life_km"""
+    return 0.5 ** (distance_km / half_life_km) if half_life_km else 1.0
+
+
+class CityIndex:
+    def __init__(self, coordinates=CITY_COORDINATES):
+        # keyed by name so building the index does not intern ids before load_terms() runs
+        self.points = {}   # canonical location name -> unit vector
+        self.tree = None
+        self.tree_names = []
+        self.cache = {}    # (location id, radius) -> ((location id, distance km), ...)
+        for name, (latitude, longitude) in coordinates.items():
+            self.add_city(name, latitude, longitude)
+
+    def add_city(self, name, latitude, longitude):
+        self.points[LOCATIONS.canonical_name(name)] = unit_vector(latitude, longitude)
+        self.tree = None
+        self.cache.clear()
+
+    def build(self):
+        from scipy.spatial import cKDTree  # only needed once a radius query is made
+        self.tree_names = list(self.points)
+        self.tree = cKDTree(np.array([self.points[name] for name in self.tree_names]).reshape(-1, 3))
+
+    def nearby(self, location_id, radius_km):
+        """Cities within radius_km of a location, closest first, as (location id, distance km)
+
+        The location itself always comes first at distance 0, even when it has no coordinates.
+        """
+        key = (location_id, radius_km)
+        found = self.cache.get(key)
+        if found is None:
+            found = [(location_id, 0.0)]
+            name = LOCATIONS.names[location_id]
+            origin = self.points.get(name)
+            if origin is not None and radius_km > 0:
+                if self.tree is None:
+                    self.build()
+                hits = self.tree.query_ball_point(origin, chord_length(radius_km))
+                near = sorted((great_circle_km(origin, self.points[self.tree_names[i]]), self.tree_names[i])
+                              for i in hits if self.tree_names[i] != name)
+                found += [(LOCATIONS.intern(city), distance) for distance, city in near if distance <= radius_km]
+            found = self.cache[key] = tuple(found)
+        return found
+
+
+def bucket_openings(openings):
+    """(specialization id, location id) -> openings in table order, filed under every related specialization"""
+    buckets = {}
+    for opening in openings:
+        loc = LOCATIONS.id(opening[2])
+        for spec in TAXONOMY.related(SPECIALIZATIONS.id(opening[1])):
+            buckets.setdefault((spec, loc), []).append(opening)
+    return buckets
+
+
+def create_city_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS city_coordinates (
+        name TEXT PRIMARY KEY,
+        latitude REAL NOT NULL CHECK(latitude BETWEEN -90 AND 90),
+        longitude REAL NOT NULL CHECK(longitude BETWEEN -180 AND 180)
+    )
+    """)
+    cursor.executemany("INSERT OR IGNORE INTO city_coordinates VALUES (?, ?, ?)",
+                       [(name, lat, lon) for name, (lat, lon) in CITY_COORDINATES.items()])
+
+
+def load_cities(conn):
+    """Add the cities stored in city_coordinates (if the table exists) to CITIES"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'city_coordinates'")
+    if cursor.fetchone() is None:
+        return
+    cursor.execute("SELECT name, latitude, longitude FROM city_coordinates")
+    for name, latitude, longitude in cursor.fetchall():
+        if CITIES.points.get(LOCATIONS.canonical_name(name)) != unit_vector(latitude, longitude):
+            CITIES.add_city(name, latitude, longitude)
+
+
+# shared by the matchers, like SKILLS and the canonical ids
+CITIES = CityIndex()
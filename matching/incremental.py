@@ -0,0 +1,177 @@
+import bisect
+import sqlite3
+
+from matching.canonical import LOCATIONS, SPECIALIZATIONS, load_terms, save_terms
+from matching.taxonomy import TAXONOMY
+from matching.vectorized import best_openings
+
+# =====================================
+# Incremental matching
+# =====================================
+# Keeps the current best match of every student and, when an opening or a
+# student profile changes, recomputes only the students that list the affected
+# (specialization, location) buckets. The matches follow the same rules as
+# MatchingSystem.match_students_to_openings: the first opening (by id) in the
+# best scoring preferred location. An opening sits in the bucket of every
+# specialization the taxonomy relates to its own.
+
+STUDENT_COLUMNS = "student_id, name, mobile_number, email, gpa, specialization, preferred_locations, skills"
+OPENING_COLUMNS = "opening_id, specialization, location, stipend, required_skills"
+
+
+class IncrementalMatcher:
+    def __init__(self, db_name='apprenticeship.db', weighted=False, gpa_weight=0.6, location_weight=0.4):
+        self.conn = sqlite3.connect(db_name)
+        self.cursor = self.conn.cursor()
+        load_terms(self.conn)
+        self.weighted = weighted
+        self.gpa_weight = gpa_weight
+        self.location_weight = location_weight
+
+        self.buckets = {}      # (specialization id, location id) -> openings sorted by id
+        self.opening_keys = {}  # opening_id -> the (specialization id, location id) buckets it is in
+        self.watchers = {}     # (specialization id, location id) -> student ids listing it
+        self.students = {}     # student_id -> student row
+        self.matches = {}      # student_id -> match dict
+        self.recomputed = 0    # students recomputed by the last delta
+        self.load()
+
+    def load(self):
+        self.buckets.clear()
+        self.opening_keys.clear()
+        self.watchers.clear()
+        self.students.clear()
+        self.matches.clear()
+
+        self.cursor.execute(f"SELECT {OPENING_COLUMNS} FROM openings ORDER BY opening_id")
+        for opening in self.cursor.fetchall():
+            keys = self.opening_keys[opening[0]] = self.opening_bucket_keys(opening)
+            for key in keys:
+                self.buckets.setdefault(key, []).append(opening)
+
+        self.cursor.execute(f"SELECT {STUDENT_COLUMNS} FROM students")
+        for student in self.cursor.fetchall():
+            self.add_student(student)
+
+    # -------------------------------------
+    # Matching a single student
+    # -------------------------------------
+    def opening_bucket_keys(self, opening):
+        loc = LOCATIONS.id(opening[2])
+        return [(spec, loc) for spec in TAXONOMY.related(SPECIALIZATIONS.id(opening[1]))]
+
+    def student_keys(self, student):
+        spec = SPECIALIZATIONS.id(student[5])
+        return [(spec, loc) for loc in LOCATIONS.id_list(student[6])]
+
+    def match_student(self, student):
+        student_id, name, mobile, email, gpa, spec, preferred_locations, skills = student
+        best, best_priority, best_score = None, 99, None
+        for priority, key in enumerate(self.student_keys(student)):
+            bucket = self.buckets.get(key)
+            if not bucket:
+                continue
+            if self.weighted:
+                score = (gpa * self.gpa_weight) + ((3 - priority) * self.location_weight)
+                if best is None or score > best_score:
+                    best, best_priority, best_score = bucket[0], priority, score
+            else:
+                best, best_priority = bucket[0], priority
+                break
+
+        if best is None:
+            return {
+                "student_name": name,
+                "gpa": gpa,
+                "opening_id": "N/A",
+                "location": "N/A",
+                "stipend": "N/A",
+                "priority": 99,
+                "message": "No openings match your criteria"
+            }
+        opening_id, o_spec, o_loc, stipend, req_skills = best
+        return {
+            "student_name": name,
+            "gpa": gpa,
+            "opening_id": opening_id,
+            "location": o_loc,
+            "stipend": stipend,
+            "priority": best_priority,
+            "score": best_score
+        }
+
+    def add_student(self, student):
+        self.students[student[0]] = student
+        for key in self.student_keys(student):
+            self.watchers.setdefault(key, set()).add(student[0])
+        self.matches[student[0]] = self.match_student(student)
+
+    def drop_student(self, student_id):
+        student = self.students.pop(student_id, None)
+        if student:
+            for key in self.student_keys(student):
+                self.watchers.get(key, set()).discard(student_id)
+        self.matches.pop(student_id, None)
+
+    def rematch_buckets(self, keys):
+        watching = set().union(*(self.watchers.get(key, ()) for key in keys))
+        for student_id in watching:
+            self.matches[student_id] = self.match_student(self.students[student_id])
+        self.recomputed = len(watching)
+
+    # -------------------------------------
+    # Deltas
+    # -------------------------------------
+    def opening_added(self, opening_id):
+        if opening_id in self.opening_keys:
+            return  # already picked up by load()
+        self.cursor.execute(f"SELECT {OPENING_COLUMNS} FROM openings WHERE opening_id = ?", (opening_id,))
+        opening = self.cursor.fetchone()
+        if not opening:
+            return
+        keys = self.opening_keys[opening_id] = self.opening_bucket_keys(opening)
+        for key in keys:
+            bisect.insort(self.buckets.setdefault(key, []), opening)
+        self.rematch_buckets(keys)
+
+    def opening_deleted(self, opening_id):
+        keys = self.opening_keys.pop(opening_id, None)
+        if keys is None:
+            return
+        for key in keys:
+            self.buckets[key] = [op for op in self.buckets[key] if op[0] != opening_id]
+        self.rematch_buckets(keys)
+
+    def student_changed(self, student_id):
+        self.drop_student(student_id)
+        self.cursor.execute(f"SELECT {STUDENT_COLUMNS} FROM students WHERE student_id = ?", (student_id,))
+        student = self.cursor.fetchone()
+        if student:
+            self.add_student(student)
+        self.recomputed = 1
+
+    # -------------------------------------
+    # Consistency check
+    # -------------------------------------
+    def verify(self):
+        """Compare the kept matches with a full recompute; returns the ids that differ"""
+        self.cursor.execute(f"SELECT {STUDENT_COLUMNS} FROM students")
+        students = self.cursor.fetchall()
+        self.cursor.execute(f"SELECT {OPENING_COLUMNS} FROM openings ORDER BY opening_id")
+        openings = self.cursor.fetchall()
+
+        gpa_weight, location_weight = (self.gpa_weight, self.location_weight) if self.weighted else (0.0, 1.0)
+        best_row, best_slot, scores = best_openings(students, openings, gpa_weight, location_weight)
+
+        current_ids = {student[0] for student in students}
+        mismatched = [student_id for student_id in self.matches if student_id not in current_ids]
+        for student, row in zip(students, best_row.tolist()):
+            expected = openings[row][0] if row >= 0 else "N/A"
+            kept = self.matches.get(student[0])
+            if kept is None or kept["opening_id"] != expected:
+                mismatched.append(student[0])
+        return mismatched
+
+    def close(self):
+        save_terms(self.conn)
+        self.conn.close()
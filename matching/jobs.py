@@ -0,0 +1,560 @@
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+import numpy as np
+
+from matching import runs
+from matching.candidates import student_matches
+from matching.canonical import load_terms
+from matching.features import StudentFeatures, load_openings
+from matching.geo import bucket_openings, load_cities
+from matching.runs import UNMATCHED, columns_from_matches, decode, decode_ids, encode, encode_ids, insert_run, narrow
+from matching.vectorized import best_openings_features
+
+# =====================================
+# Matching jobs
+# =====================================
+# A long matching run as a job: a background worker matches the students in
+# chunks of chunk_size, in student_id order, and after every chunk commits
+# the chunk's results (match_job_chunks, encoded like matching.runs columns)
+# together with the job's progress and the last student id done. So
+#
+#   - progress (students done, students per second) is in match_jobs, where
+#     the CLI polls it, from this process or another one;
+#   - cancelling is cooperative: cancel() marks the job 'cancelling' and the
+#     worker stops after the chunk it is on, keeping every chunk committed;
+#   - a cancelled, failed or killed job resumes after its last committed
+#     chunk (WHERE student_id > last_student_id, one seek on the primary key)
+#     instead of starting over.
+#
+# When the last chunk is done the chunks become one saved run (matching.runs),
+# which `python -m matching.runs diff` can compare with earlier runs.
+#
+# Statuses: queued -> running -> finished | cancelled | failed, with
+# running -> cancelling -> cancelled, and cancelled / failed -> running again
+# on resume. A job still 'running' whose heartbeat is older than STALE_AFTER
+# lost its worker (the process died) and can be resumed too.
+#
+# Every claim writes a new owner token to the job, and the worker checks it
+# in each chunk's transaction and before finishing. A worker that was only
+# slow (a chunk longer than STALE_AFTER) and has been taken over finds a
+# different owner at its next commit and stops, writing nothing, so two
+# workers never both write the job's chunks or its status.
+#
+# The job's matcher (openings, canonical ids, taxonomy and cities) is built
+# from a connection on the thread that starts the job; the worker thread
+# only reads those shared lookups, it never reloads or repoints them.
+#
+#   python -m matching.jobs run /path/to/apprenticeship.db --engine numpy --weighted
+#   python -m matching.jobs list /path/to/apprenticeship.db
+#   python -m matching.jobs resume /path/to/apprenticeship.db 3
+#   python -m matching.jobs cancel /path/to/apprenticeship.db 3
+#
+# The same operations are on the company dashboard's Matching Jobs tab, shown
+# when the app runs with APPRENTICESHIP_ADMIN=1.
+#
+# Students added behind the checkpoint while a job is paused are not picked
+# up by it, and resumed chunks are matched against the openings as they are
+# at resume time.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS match_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    students INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    last_student_id TEXT,
+    rate REAL,
+    heartbeat REAL,
+    finished TEXT,
+    run_id INTEGER,
+    error TEXT,
+    owner TEXT
+);
+
+CREATE TABLE IF NOT EXISTS match_job_chunks (
+    job_id INTEGER NOT NULL REFERENCES match_jobs(job_id),
+    chunk INTEGER NOT NULL,
+    students INTEGER NOT NULL,
+    student_ids BLOB NOT NULL,
+    opening_ids BLOB NOT NULL,
+    priorities BLOB NOT NULL,
+    scores BLOB,
+    PRIMARY KEY (job_id, chunk)
+) WITHOUT ROWID;
+"""
+
+ENGINES = {
+    "loop": "matching.candidates per student, as models.maching_system (weighted, min_skill_overlap, radius_km)",
+    "numpy": "vectorized best opening per chunk (weighted)",
+}
+RESUMABLE = ("queued", "cancelled", "failed")
+ACTIVE = ("running", "cancelling")
+STALE_AFTER = 60  # seconds without a committed chunk before a running job counts as abandoned
+
+JOB_COLUMNS = ["job_id", "created", "engine", "parameters", "chunk_size", "status", "students", "processed",
+               "last_student_id", "rate", "heartbeat", "finished", "run_id", "error"]
+
+
+class JobError(Exception):
+    pass
+
+
+def connect(db_path):
+    return sqlite3.connect(db_path, timeout=10)
+
+
+def install(conn):
+    cursor = conn.cursor()
+    cursor.executescript(SCHEMA)
+    # the claiming worker's token, for tables created before owners were recorded
+    cursor.execute("PRAGMA table_info(match_jobs)")
+    if "owner" not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE match_jobs ADD COLUMN owner TEXT")
+    conn.commit()
+    runs.install(conn)  # a finished job is saved as a run
+
+
+def now():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def count_students(cursor, after=None):
+    if after is None:
+        cursor.execute("SELECT COUNT(*) FROM students")
+    else:
+        cursor.execute("SELECT COUNT(*) FROM students WHERE student_id > ?", (after,))
+    return cursor.fetchone()[0]
+
+
+# -------------------------------------
+# Creating and controlling jobs
+# -------------------------------------
+def create_job(conn, engine="loop", chunk_size=5000, weighted=False, gpa_weight=0.6, location_weight=0.4,
+               min_skill_overlap=0, radius_km=0, half_life_km=None):
+    """Queue a matching job; returns its job_id"""
+    if engine not in ENGINES:
+        raise JobError(f"Unknown engine {engine!r}")
+    if chunk_size < 1:
+        raise JobError("chunk_size must be at least 1")
+    if engine == "numpy" and (min_skill_overlap or radius_km):
+        raise JobError("min_skill_overlap and radius_km are only supported by the loop engine")
+    parameters = {"weighted": weighted, "gpa_weight": gpa_weight, "location_weight": location_weight,
+                  "min_skill_overlap": min_skill_overlap, "radius_km": radius_km, "half_life_km": half_life_km}
+    install(conn)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO match_jobs (created, engine, parameters, chunk_size, students) VALUES (?, ?, ?, ?, ?)",
+                   (now(), engine, json.dumps(parameters, sort_keys=True), chunk_size, count_students(cursor)))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def get_job(conn, job_id):
+    """The match_jobs row of a job as a dict, with parameters decoded"""
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM match_jobs WHERE job_id = ?", (job_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise JobError(f"No matching job {job_id}")
+    job = dict(zip(JOB_COLUMNS, row))
+    job["parameters"] = json.loads(job["parameters"])
+    return job
+
+
+def list_jobs(conn, limit=20):
+    """Dicts of the latest jobs, newest first"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'match_jobs'")
+    if cursor.fetchone() is None:
+        return []
+    cursor.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM match_jobs ORDER BY job_id DESC LIMIT ?", (limit,))
+    jobs = [dict(zip(JOB_COLUMNS, row)) for row in cursor.fetchall()]
+    for job in jobs:
+        job["parameters"] = json.loads(job["parameters"])
+    return jobs
+
+
+def cancel(conn, job_id):
+    """Ask a job to stop; a queued job is cancelled at once, a running one after its current chunk.
+
+    Returns the job's new status.
+    """
+    cursor = conn.cursor()
+    cursor.execute("UPDATE match_jobs SET status = 'cancelled' WHERE job_id = ? AND status = 'queued'", (job_id,))
+    cursor.execute("UPDATE match_jobs SET status = 'cancelling' WHERE job_id = ? AND status = 'running'", (job_id,))
+    conn.commit()
+    return get_job(conn, job_id)["status"]
+
+
+def claim(conn, job_id, force=False):
+    """Mark a job running for a new worker; returns the worker's owner token.
+
+    Raises JobError when the job cannot be (re)started.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("SELECT status, heartbeat, last_student_id FROM match_jobs WHERE job_id = ?", (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise JobError(f"No matching job {job_id}")
+        status, heartbeat, last_student_id = row
+        abandoned = status in ACTIVE and (force or heartbeat is None or time.time() - heartbeat > STALE_AFTER)
+        if status not in RESUMABLE and not abandoned:
+            hint = " (use --force if its worker is gone)" if status in ACTIVE else ""
+            raise JobError(f"Job {job_id} is {status}{hint}")
+        # the total is recounted on every start, so the progress stays right when students were added meanwhile
+        cursor.execute("SELECT processed FROM match_jobs WHERE job_id = ?", (job_id,))
+        processed = cursor.fetchone()[0]
+        owner = uuid.uuid4().hex
+        cursor.execute("""
+            UPDATE match_jobs SET status = 'running', heartbeat = ?, rate = NULL, error = NULL, students = ?, owner = ?
+            WHERE job_id = ?
+        """, (time.time(), processed + count_students(cursor, last_student_id), owner, job_id))
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return owner
+
+
+def owns(cursor, job_id, owner):
+    """The job's status if `owner` still holds it, else None (another worker took it over)"""
+    cursor.execute("SELECT status, owner FROM match_jobs WHERE job_id = ?", (job_id,))
+    status, current = cursor.fetchone()
+    return status if current == owner else None
+
+
+# -------------------------------------
+# Matching one chunk
+# -------------------------------------
+class ChunkMatcher:
+    """Matches chunks of student rows against the openings loaded when the job (re)starts.
+
+    Built from `conn` on the thread that starts the job: the canonical ids, taxonomy and cities it
+    loads are shared with the rest of the process, so the worker thread only has to read them.
+    """
+    def __init__(self, conn, engine, parameters):
+        self.engine = engine
+        self.parameters = parameters
+        load_terms(conn)
+        if engine == "numpy":
+            self.openings = load_openings(conn)
+        else:
+            load_cities(conn)  # for radius_km
+            cursor = conn.cursor()
+            cursor.execute("SELECT opening_id, specialization, location, stipend, required_skills FROM openings")
+            openings = cursor.fetchall()
+            self.buckets = bucket_openings(openings)
+
+    def match(self, students):
+        """(opening_ids, priorities, scores) for rows shaped like models.student.view_students"""
+        if self.engine == "numpy":
+            return self.match_vectorized(students)
+        p = self.parameters
+        best = []
+        for student in students:
+            best.append(student_matches(
+                student, self.buckets, p["weighted"], p["gpa_weight"], p["location_weight"],
+                p["min_skill_overlap"], None, p["radius_km"], p["half_life_km"])[0])
+        return columns_from_matches(best)
+
+    def match_vectorized(self, students):
+        features = StudentFeatures()
+        for student_id, name, mobile, email, gpa, spec, preferred_locations, skills in students:
+            features.add(student_id, name, gpa, spec, preferred_locations)
+        features.finish()
+        weighted = self.parameters["weighted"]
+        # as in MatchingSystem.match_students_vectorized: any positive location weight gives the unweighted order
+        gpa_weight, location_weight = ((self.parameters["gpa_weight"], self.parameters["location_weight"])
+                                       if weighted else (0.0, 1.0))
+        best_row, best_slot, scores = best_openings_features(features, self.openings, gpa_weight, location_weight)
+        return (np.where(best_row >= 0, self.openings.opening_id[best_row], UNMATCHED),
+                np.where(best_row >= 0, best_slot, 99), scores if weighted else None)
+
+
+# -------------------------------------
+# The worker
+# -------------------------------------
+def begin(db_path, job_id, force=False):
+    """Claim a job and build its matcher on this thread; returns (owner, ChunkMatcher)"""
+    conn = connect(db_path)
+    install(conn)
+    try:
+        owner = claim(conn, job_id, force)
+        try:
+            job = get_job(conn, job_id)
+            return owner, ChunkMatcher(conn, job["engine"], job["parameters"])
+        except Exception as e:
+            conn.rollback()
+            fail(conn, job_id, owner, e)
+            raise
+    finally:
+        conn.close()
+
+
+def fail(conn, job_id, owner, error):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE match_jobs SET status = 'failed', error = ? WHERE job_id = ? AND owner = ?",
+                   ("".join(traceback.format_exception_only(type(error), error)).strip(), job_id, owner))
+    conn.commit()
+
+
+def run_job(db_path, job_id, progress=None, stop=None, force=False):
+    """Run (or resume) a job in this thread until it finishes, is cancelled or fails.
+
+    Returns its final status, or None when another worker took it over.
+    """
+    owner, matcher = begin(db_path, job_id, force)
+    return work(db_path, job_id, owner, matcher, progress, stop)
+
+
+def work(db_path, job_id, owner, matcher, progress=None, stop=None):
+    """The worker loop of a job claimed as `owner`.
+
+    progress, if given, is called with the job dict after every chunk. stop is an optional
+    threading.Event checked between chunks, for cancelling from the same process.
+    """
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    try:
+        job = get_job(conn, job_id)
+        cursor.execute("SELECT COALESCE(MAX(chunk) + 1, 0) FROM match_job_chunks WHERE job_id = ?", (job_id,))
+        chunk = cursor.fetchone()[0]
+        last_student_id, processed = job["last_student_id"], job["processed"]
+        start, done = time.perf_counter(), 0  # the rate is this session's, not diluted by time spent paused
+
+        while True:
+            cursor.execute("""
+                SELECT student_id, name, mobile_number, email, gpa, specialization, preferred_locations, skills
+                FROM students WHERE student_id > ? ORDER BY student_id LIMIT ?
+            """, ("" if last_student_id is None else last_student_id, job["chunk_size"]))
+            students = cursor.fetchall()
+            if not students:
+                break
+            opening_ids, priorities, scores = matcher.match(students)
+            student_ids = np.array([student[0] for student in students], dtype=str)
+            done += len(students)
+            processed += len(students)
+            last_student_id = students[-1][0]
+            rate = done / max(time.perf_counter() - start, 1e-9)
+
+            # the chunk and the checkpoint that skips it on resume commit together, while this worker owns the job
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                status = owns(cursor, job_id, owner)
+                if status is None:
+                    conn.rollback()
+                    return None
+                cursor.execute("INSERT INTO match_job_chunks VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                    job_id, chunk, len(students), encode_ids(student_ids)[1], encode(narrow(opening_ids)),
+                    encode(narrow(priorities)),
+                    encode(np.asarray(scores, dtype=np.float64)) if scores is not None else None))
+                cursor.execute("""
+                    UPDATE match_jobs SET processed = ?, last_student_id = ?, rate = ?, heartbeat = ?,
+                                          students = MAX(students, ?)
+                    WHERE job_id = ?
+                """, (processed, last_student_id, rate, time.time(), processed, job_id))
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            chunk += 1
+
+            if progress:
+                progress(get_job(conn, job_id))
+            if status == "cancelling" or (stop is not None and stop.is_set()):
+                cursor.execute("UPDATE match_jobs SET status = 'cancelled' WHERE job_id = ? AND owner = ?",
+                               (job_id, owner))
+                conn.commit()
+                return "cancelled"
+
+        # the run, the final status and the cleanup commit together, once
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if owns(cursor, job_id, owner) is None:
+                conn.rollback()
+                return None
+            run_id = finish(cursor, job_id, job)
+            cursor.execute("""
+                UPDATE match_jobs SET status = 'finished', finished = ?, run_id = ?, heartbeat = ? WHERE job_id = ?
+            """, (now(), run_id, time.time(), job_id))
+            cursor.execute("DELETE FROM match_job_chunks WHERE job_id = ?", (job_id,))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        if progress:
+            progress(get_job(conn, job_id))
+        return "finished"
+    except Exception as e:
+        conn.rollback()
+        fail(conn, job_id, owner, e)
+        raise
+    finally:
+        conn.close()
+
+
+def finish(cursor, job_id, job):
+    """Save the job's chunks as one run (matching.runs) in the caller's transaction; returns its run_id"""
+    cursor.execute("""
+        SELECT students, student_ids, opening_ids, priorities, scores FROM match_job_chunks
+        WHERE job_id = ? ORDER BY chunk
+    """, (job_id,))
+    student_ids, opening_ids, priorities, scores = [], [], [], []
+    for count, ids_blob, opening_blob, priority_blob, score_blob in cursor.fetchall():
+        student_ids.append(decode_ids(ids_blob, count))
+        opening_ids.append(decode(opening_blob).astype(np.int64))
+        priorities.append(decode(priority_blob).astype(np.int64))
+        scores.append(decode(score_blob) if score_blob is not None else None)
+    if not student_ids:
+        return None  # no students: nothing to save
+    parameters = dict(job["parameters"], engine=job["engine"])  # no job_id, so runs diff pairs jobs with the same settings
+    return insert_run(cursor, "job", parameters, np.concatenate(student_ids), np.concatenate(opening_ids),
+                      np.concatenate(priorities),
+                      None if any(score is None for score in scores) else np.concatenate(scores))
+
+
+class JobWorker(threading.Thread):
+    """Runs a claimed job in a background thread; cancel() stops it after the current chunk"""
+    def __init__(self, db_path, job_id, owner, matcher, progress=None):
+        super().__init__(name=f"match-job-{job_id}", daemon=True)
+        self.db_path = db_path
+        self.job_id = job_id
+        self.owner = owner
+        self.matcher = matcher
+        self.progress = progress
+        self.stop = threading.Event()
+        self.done = threading.Event()  # safer to wait on than join(), which Ctrl-C can cut short
+        self.status = None  # stays None when another worker takes the job over
+        self.error = None
+
+    def run(self):
+        try:
+            self.status = work(self.db_path, self.job_id, self.owner, self.matcher, self.progress, self.stop)
+        except Exception as e:
+            self.status, self.error = "failed", e
+        finally:
+            self.done.set()
+
+    def cancel(self):
+        self.stop.set()
+
+
+def start(db_path, job_id, progress=None, force=False):
+    """Start (or resume) a job in a background thread; returns the JobWorker.
+
+    The job is claimed and its matcher built before the thread starts, so a job that cannot run
+    raises here.
+    """
+    owner, matcher = begin(db_path, job_id, force)
+    worker = JobWorker(db_path, job_id, owner, matcher, progress)
+    worker.start()
+    return worker
+
+
+# -------------------------------------
+# CLI
+# -------------------------------------
+def describe(job):
+    students, processed = job["students"], job["processed"]
+    percent = f"{processed / students:6.1%}" if students else "   -  "
+    rate = f"{job['rate']:,.0f} students/s" if job["rate"] else "-"
+    run = f" run {job['run_id']}" if job["run_id"] is not None else ""
+    return f"{job['job_id']:5d} {job['status']:10s} {job['engine']:5s} {processed:,}/{students:,} {percent} {rate}{run}"
+
+
+def watch(db_path, job_id, force, interval):
+    """Run a job in a worker thread, printing progress; Ctrl-C cancels it after the current chunk"""
+    last = [0.0]
+
+    def progress(job):
+        if time.perf_counter() - last[0] >= interval:
+            last[0] = time.perf_counter()
+            print(describe(job), file=sys.stderr, flush=True)
+
+    worker = start(db_path, job_id, progress, force)
+    try:
+        while not worker.done.wait(0.2):
+            pass
+    except KeyboardInterrupt:
+        print("Cancelling after the current chunk...", file=sys.stderr, flush=True)
+        worker.cancel()
+        worker.done.wait()
+    if worker.error is not None:
+        print(f"Job {job_id} failed: {worker.error}", file=sys.stderr)
+        return 1
+    if worker.status is None:
+        print(f"Job {job_id} was taken over by another worker", file=sys.stderr)
+        return 1
+    conn = connect(db_path)
+    job = get_job(conn, job_id)
+    conn.close()
+    print(describe(job))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run matching as a resumable background job")
+    parser.add_argument("command", choices=["run", "submit", "resume", "cancel", "list"])
+    parser.add_argument("db_path")
+    parser.add_argument("job_id", nargs="?", type=int, help="resume/cancel: the job")
+    parser.add_argument("--engine", choices=list(ENGINES), default="loop",
+                        help="; ".join(f"{engine}: {text}" for engine, text in ENGINES.items()))
+    parser.add_argument("--chunk-size", type=int, default=5000, help="students per checkpoint")
+    parser.add_argument("--weighted", action="store_true")
+    parser.add_argument("--gpa-weight", type=float, default=0.6)
+    parser.add_argument("--location-weight", type=float, default=0.4)
+    parser.add_argument("--min-skill-overlap", type=int, default=0, help="loop engine")
+    parser.add_argument("--radius-km", type=float, default=0, help="loop engine")
+    parser.add_argument("--half-life-km", type=float, help="loop engine, with --radius-km")
+    parser.add_argument("--force", action="store_true", help="resume: take over a job whose worker seems alive")
+    parser.add_argument("--progress-interval", type=float, default=2.0, help="seconds between progress lines")
+    parser.add_argument("--limit", type=int, default=20, help="list: jobs to show")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db_path)
+    install(conn)
+    try:
+        if args.command in ("run", "submit"):
+            job_id = create_job(conn, args.engine, args.chunk_size, args.weighted, args.gpa_weight,
+                                args.location_weight, args.min_skill_overlap, args.radius_km, args.half_life_km)
+            print(f"Job {job_id} queued", file=sys.stderr)
+        elif args.command == "list":
+            for job in list_jobs(conn, args.limit):
+                print(describe(job) + (f" {job['error']}" if job["error"] else ""))
+            return 0
+        elif args.job_id is None:
+            parser.error(f"{args.command} needs a job id")
+        elif args.command == "cancel":
+            print(f"Job {args.job_id} is {cancel(conn, args.job_id)}")
+            return 0
+        else:
+            job_id = args.job_id
+    except JobError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    if args.command == "submit":
+        return 0
+    try:
+        return watch(args.db_path, job_id, args.force, args.progress_interval)
+    except JobError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,104 @@
 import sqlite3
+from itertools import islice
+import numpy as np
+from matching.canonical import LOCATIONS, SPECIALIZATIONS, load_terms, save_terms
+from matching.features import load_openings
+from matching.geo import CITIES, load_cities
+from matching.skills import SKILLS, packed_overlap
+from matching.streaming import iter_rows
 
 class MatchingSystem:
     def __init__(self, db_name='apprenticeship.db'):
         self.conn = sqlite3.connect(db_name)
         self.cursor = self.conn.cursor()
+        load_terms(self.conn)
+        load_cities(self.conn)
 
     def fetch_students(self):
-        self.cursor.execute("SELECT student_id, name, gpa, specialization, preferred_locations FROM students")
+        self.cursor.execute("SELECT student_id, name, gpa, specialization, preferred_locations, skills FROM students")
         return self.cursor.fetchall()
 
+    def iter_students(self, batch_size=1000):
+        # own cursor so matches can be written through self.conn while students are still being read
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT student_id, name, gpa, specialization, preferred_locations, skills FROM students")
+        return iter_rows(cursor, batch_size)
+
     def fetch_openings(self):
-        self.cursor.execute("SELECT opening_id, specialization, location, stipend FROM openings")
+        self.cursor.execute("SELECT opening_id, specialization, location, stipend, required_skills FROM openings")
         return self.cursor.fetchall()
 
-    def match_students(self):
-        students = self.fetch_students()
-        openings = self.fetch_openings()
-        matches = []
+    def build_opening_index(self, openings):
+        # (specialization id, location id) -> opening rows (into the feature store columns) in table order
+        return {key: np.array(rows) for key, rows in openings.buckets().items()}
 
-        for student in students:
-            student_id, name, gpa, spec, pref_locations = student
-            preferred_locations = [loc.strip() for loc in pref_locations.split(",")]
+    def packed_skills(self, skills, width):
+        # the student's skills as one packed row as wide as the openings' matrix
+        mask = SKILLS.encode(skills) & ((1 << 8 * width) - 1)  # skills no opening asks for can't overlap
+        return np.frombuffer(mask.to_bytes(width, "little"), dtype=np.uint8)
 
-            matching_openings = [op for op in openings if op[1] == spec and op[2] in preferred_locations]
+    def location_ranks(self, pref_locations):
+        # location id -> rank of its first appearance in the student's list
+        ranks = {}
+        for loc in LOCATIONS.id_list(pref_locations):
+            ranks.setdefault(loc, len(ranks))
+        return ranks
 
-            if matching_openings:
-                matching_openings.sort(key=lambda op: preferred_locations.index(op[2]))
-                best_opening = matching_openings[0]
-                matches.append((name, gpa, best_opening[0], best_opening[2], best_opening[3]))
-            else:
-                print(f"No match found for {name}.")
+    def bucket_rows(self, opening_index, openings, key, student_skills, min_skill_overlap):
+        # rows of one bucket, keeping only openings that share at least min_skill_overlap skills
+        rows = opening_index.get(key)
+        if rows is None:
+            return ()
+        if not min_skill_overlap:
+            return rows
+        return rows[packed_overlap(student_skills, openings.skills[rows]) >= min_skill_overlap]
+
+    def search_locations(self, location_ranks, radius_km):
+        # with a radius every preferred location also brings in the cities around it, closest first;
+        # a city within reach of several preferred locations is only searched at its best rank
+        if not radius_km:
+            return location_ranks
+        locations = {}
+        for loc in location_ranks:
+            for near, distance in CITIES.nearby(loc, radius_km):
+                locations.setdefault(near, None)
+        return locations
+
+    def match_students(self, min_skill_overlap=0, top_k=None, radius_km=0):
+        # min_skill_overlap > 0 also requires that many shared skills with the opening
+        # top_k returns up to K openings per student as (..., rank) tuples instead of only the best
+        # radius_km > 0 also matches openings in cities that close to a preferred location
+        return list(self.iter_matches(min_skill_overlap, top_k, radius_km=radius_km))
 
-        return matches
+    def iter_matches(self, min_skill_overlap=0, top_k=None, batch_size=1000, quiet=False, radius_km=0):
+        # streaming mode: students come in fetchmany batches and matches are yielded as they are found
+        # quiet=True skips the "No match found" line per unmatched student (batch runs count them instead)
+        # openings come from the columnar feature store; a match tuple is only built for the rows returned
+        openings = load_openings(self.conn)
+        opening_index = self.build_opening_index(openings)
+        opening_ids, stipends = openings.opening_id.tolist(), openings.stipend.tolist()
+
+        for student in self.iter_students(batch_size):
+            student_id, name, gpa, spec, pref_locations, skills = student
+            spec = SPECIALIZATIONS.id(spec)
+            location_ranks = self.location_ranks(pref_locations)
+            student_skills = self.packed_skills(skills, openings.skills.shape[1]) if min_skill_overlap else None
+
+            # locations come in rank order and each bucket in table order, so the K best are the first K candidates
+            candidates = (row for loc in self.search_locations(location_ranks, radius_km)  # dicts keep rank order
+                          for row in self.bucket_rows(opening_index, openings, (spec, loc), student_skills,
+                                                      min_skill_overlap))
+            best_rows = list(islice(candidates, top_k or 1))
+
+            if not best_rows:
+                if not quiet:
+                    print(f"No match found for {name}.")
+            elif top_k:
+                for rank, row in enumerate(best_rows, start=1):
+                    yield (name, gpa, opening_ids[row], openings.location[row], stipends[row], rank)
+            else:
+                row = best_rows[0]
+                yield (name, gpa, opening_ids[row], openings.location[row], stipends[row])
 
     def display_matches(self, matches):
         print("Student Name | GPA | Opening ID | Location | Stipend")
@@ -39,9 +106,12 @@ class MatchingSystem:
             print(f"{match[0]} | {match[1]} | {match[2]} | {match[3]} | {match[4]}")
 
     def close(self):
+        save_terms(self.conn)  # keep canonical ids stable for the next run
         self.conn.close()
 
 if __name__ == "__main__":
+    # for very large cohorts use matching.streaming:
+    # stream_to(system.iter_matches(top_k=top_k), TableSink(system.conn, columns=match_columns(True, top_k)))
     system = MatchingSystem()
     matches = system.match_students()
     system.display_matches(matches)
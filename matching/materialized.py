@@ -0,0 +1,282 @@
+import argparse
+import sqlite3
+
+from matching.canonical import LOCATIONS, SPECIALIZATIONS, load_terms
+from matching.skills import SKILLS
+from matching.taxonomy import TAXONOMY, create_table as create_taxonomy_table
+
+# =====================================
+# Materialized student_opening_matches table
+# =====================================
+# One row per (student, opening) pair that the opportunities tab would show:
+# same specialization (or one the taxonomy puts above or below it), opening
+# location in the student's preferred locations and at least one shared skill.
+# `applied` marks pairs the student already applied to.
+#
+# SQLite triggers keep the table current from any connection. Deletes and
+# applications are handled in SQL. Inserted or edited students and openings
+# need their comma separated fields parsed, so the triggers queue them in
+# student_opening_matches_dirty and refresh_pending() recomputes just those rows
+# before the table is read.
+#
+# Specializations and locations are compared by canonical id, so aliases match.
+# The candidate queries still go through the lower(trim(...)) indexes: they ask
+# for every stored spelling whose canonical id is one eligible for the row
+# being refreshed. Any change to specialization_taxonomy queues a full rebuild.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS student_opening_matches (
+    student_id TEXT NOT NULL,
+    opening_id INTEGER NOT NULL,
+    applied INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (student_id, opening_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_student_opening_matches_opening
+    ON student_opening_matches (opening_id);
+
+CREATE TABLE IF NOT EXISTS student_opening_matches_dirty (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_students_specialization_key ON students (lower(trim(specialization)));
+CREATE INDEX IF NOT EXISTS idx_openings_specialization_key ON openings (lower(trim(specialization)));
+CREATE INDEX IF NOT EXISTS idx_applications_student_opening ON applications (student_id, opening_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_student_insert AFTER INSERT ON students
+BEGIN
+    INSERT OR IGNORE INTO student_opening_matches_dirty VALUES ('student', NEW.student_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_student_update
+AFTER UPDATE OF student_id, specialization, preferred_locations, skills ON students
+BEGIN
+    DELETE FROM student_opening_matches WHERE student_id = OLD.student_id;
+    INSERT OR IGNORE INTO student_opening_matches_dirty VALUES ('student', NEW.student_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_student_delete AFTER DELETE ON students
+BEGIN
+    DELETE FROM student_opening_matches WHERE student_id = OLD.student_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_opening_insert AFTER INSERT ON openings
+BEGIN
+    INSERT OR IGNORE INTO student_opening_matches_dirty VALUES ('opening', NEW.opening_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_opening_update
+AFTER UPDATE OF opening_id, specialization, location, required_skills ON openings
+BEGIN
+    DELETE FROM student_opening_matches WHERE opening_id = OLD.opening_id;
+    INSERT OR IGNORE INTO student_opening_matches_dirty VALUES ('opening', NEW.opening_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_opening_delete AFTER DELETE ON openings
+BEGIN
+    DELETE FROM student_opening_matches WHERE opening_id = OLD.opening_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_taxonomy_insert AFTER INSERT ON specialization_taxonomy
+BEGIN
+    INSERT OR IGNORE INTO student_opening_matches_dirty VALUES ('taxonomy', '*');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_taxonomy_update AFTER UPDATE ON specialization_taxonomy
+BEGIN
+    INSERT OR IGNORE INTO student_opening_matches_dirty VALUES ('taxonomy', '*');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_taxonomy_delete AFTER DELETE ON specialization_taxonomy
+BEGIN
+    INSERT OR IGNORE INTO student_opening_matches_dirty VALUES ('taxonomy', '*');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_application_insert AFTER INSERT ON applications
+BEGIN
+    UPDATE student_opening_matches SET applied = 1
+    WHERE student_id = NEW.student_id AND opening_id = NEW.opening_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_matches_application_delete AFTER DELETE ON applications
+BEGIN
+    UPDATE student_opening_matches
+    SET applied = EXISTS (SELECT 1 FROM applications
+                          WHERE student_id = OLD.student_id AND opening_id = OLD.opening_id)
+    WHERE student_id = OLD.student_id AND opening_id = OLD.opening_id;
+END;
+"""
+
+
+def install(conn):
+    """Create the table, indexes and triggers; fills the table the first time"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'student_opening_matches'")
+    existed = cursor.fetchone() is not None
+    create_taxonomy_table(cursor)
+    cursor.executescript(SCHEMA)
+    if not existed:
+        rebuild(conn)
+
+
+# -------------------------------------
+# Python matcher (same rules as the opportunities tab)
+# -------------------------------------
+def spec_key(text):
+    return SPECIALIZATIONS.id(text)
+
+
+def location_keys(text):
+    return set(LOCATIONS.id_list(text))
+
+
+def eligible(student, opening):
+    """student: (student_id, specialization, preferred_locations, skills);
+    opening: (opening_id, specialization, location, required_skills)"""
+    return (TAXONOMY.eligible(spec_key(student[1]), spec_key(opening[1]))
+            and LOCATIONS.id(opening[2]) in location_keys(student[2])
+            and bool(SKILLS.encode(student[3]) & SKILLS.encode(opening[3])))
+
+
+def spec_spellings(cursor, table, spec_id):
+    """The lower(trim(specialization)) values in `table` whose canonical id is eligible for spec_id
+    (read from the index)"""
+    related = set(TAXONOMY.related(spec_id))
+    cursor.execute(f"SELECT DISTINCT lower(trim(specialization)) FROM {table}")
+    return [row[0] for row in cursor.fetchall() if spec_key(row[0]) in related]
+
+
+def rows_with_spec(cursor, columns, table, spec_id):
+    spellings = spec_spellings(cursor, table, spec_id)
+    if not spellings:
+        return []
+    cursor.execute(f"""
+        SELECT {columns} FROM {table}
+        WHERE lower(trim(specialization)) IN ({", ".join("?" * len(spellings))})
+    """, spellings)
+    return cursor.fetchall()
+
+
+def applied_pairs(cursor, where="", params=()):
+    cursor.execute(f"SELECT student_id, opening_id FROM applications {where}", params)
+    return set(cursor.fetchall())
+
+
+def compute_all(cursor):
+    """Every eligible (student_id, opening_id, applied) row, grouped by specialization"""
+    cursor.execute("SELECT opening_id, specialization, location, required_skills FROM openings")
+    openings_by_spec = {}
+    for opening in cursor.fetchall():
+        for spec in TAXONOMY.related(spec_key(opening[1])):
+            openings_by_spec.setdefault(spec, []).append(opening)
+
+    applied = applied_pairs(cursor)
+    cursor.execute("SELECT student_id, specialization, preferred_locations, skills FROM students")
+    rows = []
+    for student in cursor.fetchall():
+        for opening in openings_by_spec.get(spec_key(student[1]), ()):
+            if eligible(student, opening):
+                rows.append((student[0], opening[0], int((student[0], opening[0]) in applied)))
+    return rows
+
+
+# -------------------------------------
+# Maintenance
+# -------------------------------------
+def refresh_student(cursor, student_id):
+    cursor.execute("DELETE FROM student_opening_matches WHERE student_id = ?", (student_id,))
+    cursor.execute("SELECT student_id, specialization, preferred_locations, skills FROM students "
+                   "WHERE student_id = ?", (student_id,))
+    student = cursor.fetchone()
+    if not student:
+        return
+    openings = rows_with_spec(cursor, "opening_id, specialization, location, required_skills", "openings",
+                              spec_key(student[1]))
+    applied = applied_pairs(cursor, "WHERE student_id = ?", (student_id,))
+    cursor.executemany("INSERT OR REPLACE INTO student_opening_matches VALUES (?, ?, ?)", [
+        (student_id, opening[0], int((student_id, opening[0]) in applied))
+        for opening in openings if eligible(student, opening)
+    ])
+
+
+def refresh_opening(cursor, opening_id):
+    cursor.execute("DELETE FROM student_opening_matches WHERE opening_id = ?", (opening_id,))
+    cursor.execute("SELECT opening_id, specialization, location, required_skills FROM openings "
+                   "WHERE opening_id = ?", (opening_id,))
+    opening = cursor.fetchone()
+    if not opening:
+        return
+    students = rows_with_spec(cursor, "student_id, specialization, preferred_locations, skills", "students",
+                              spec_key(opening[1]))
+    applied = applied_pairs(cursor, "WHERE opening_id = ?", (opening_id,))
+    cursor.executemany("INSERT OR REPLACE INTO student_opening_matches VALUES (?, ?, ?)", [
+        (student[0], opening_id, int((student[0], opening_id) in applied))
+        for student in students if eligible(student, opening)
+    ])
+
+
+def refresh_pending(conn):
+    """Recompute the students and openings queued by the triggers"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT kind, id FROM student_opening_matches_dirty")
+    pending = cursor.fetchall()
+    if not pending:
+        return 0
+    if ("taxonomy", "*") in pending:
+        TAXONOMY.load(cursor)  # the tree changed, possibly in another process
+        rebuild(conn)
+        return len(pending)
+    with conn:
+        for kind, item_id in pending:
+            if kind == "student":
+                refresh_student(cursor, item_id)
+            else:
+                refresh_opening(cursor, int(item_id))
+        cursor.executemany("DELETE FROM student_opening_matches_dirty WHERE kind = ? AND id = ?", pending)
+    return len(pending)
+
+
+def rebuild(conn):
+    """Throw the table away and recompute every row"""
+    cursor = conn.cursor()
+    rows = compute_all(cursor)
+    with conn:
+        cursor.execute("DELETE FROM student_opening_matches")
+        cursor.execute("DELETE FROM student_opening_matches_dirty")
+        cursor.executemany("INSERT INTO student_opening_matches VALUES (?, ?, ?)", rows)
+    return len(rows)
+
+
+def verify(conn):
+    """Compare the table with a fresh run of the Python matcher; returns (missing, unexpected) rows"""
+    refresh_pending(conn)
+    cursor = conn.cursor()
+    expected = set(compute_all(cursor))
+    cursor.execute("SELECT student_id, opening_id, applied FROM student_opening_matches")
+    stored = set(cursor.fetchall())
+    return sorted(expected - stored), sorted(stored - expected)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the student_opening_matches table")
+    parser.add_argument("command", choices=["install", "rebuild", "verify"])
+    parser.add_argument("db_path")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    load_terms(conn)  # the taxonomy and aliases the matcher reads, as the UI has them
+    if args.command == "install":
+        install(conn)
+        print("student_opening_matches installed")
+    elif args.command == "rebuild":
+        print(f"Rebuilt student_opening_matches: {rebuild(conn)} rows")
+    else:
+        missing, unexpected = verify(conn)
+        print(f"Missing rows: {len(missing)} | Unexpected rows: {len(unexpected)}")
+        for row in missing[:20]:
+            print("missing", row)
+        for row in unexpected[:20]:
+            print("unexpected", row)
+    conn.close()
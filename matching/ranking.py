@@ -0,0 +1,244 @@
+import argparse
+import sqlite3
+
+from matching.canonical import LOCATIONS
+from matching.skills import SKILLS, coverage
+
+# =====================================
+# Applicant ranking index
+# =====================================
+# One row per application with a precomputed score, indexed by
+# (company, score) and (opening, score), so the applications tab reads a
+# ranked page straight off the index: no join over every applicant and no
+# sort on each click.
+#
+#   score = GPA_WEIGHT * gpa / 5
+#         + SKILL_WEIGHT * share of the opening's required skills the student has
+#         + LOCATION_WEIGHT * how high the opening's city is in the student's list
+#
+# Triggers keep it current the same way as student_opening_matches: deletes are
+# handled in SQL, new applications and edited students or openings are queued
+# in applicant_rankings_dirty and rescored by refresh_pending() before a page
+# is served.
+
+GPA_WEIGHT = 0.6
+SKILL_WEIGHT = 0.3
+LOCATION_WEIGHT = 0.1
+
+PAGE_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applicant_rankings (
+    application_id INTEGER PRIMARY KEY,
+    opening_id INTEGER NOT NULL,
+    company_name TEXT NOT NULL,
+    score REAL NOT NULL,
+    skill_coverage REAL NOT NULL,
+    location_priority INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_applicant_rankings_company
+    ON applicant_rankings (company_name, score DESC, application_id);
+CREATE INDEX IF NOT EXISTS idx_applicant_rankings_opening
+    ON applicant_rankings (opening_id, score DESC, application_id);
+
+CREATE TABLE IF NOT EXISTS applicant_rankings_dirty (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_applications_opening ON applications (opening_id);
+CREATE INDEX IF NOT EXISTS idx_applications_student_opening ON applications (student_id, opening_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_rankings_application_insert AFTER INSERT ON applications
+BEGIN
+    INSERT OR IGNORE INTO applicant_rankings_dirty VALUES ('application', NEW.application_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rankings_application_update
+AFTER UPDATE OF student_id, opening_id ON applications
+BEGIN
+    DELETE FROM applicant_rankings WHERE application_id = OLD.application_id;
+    INSERT OR IGNORE INTO applicant_rankings_dirty VALUES ('application', NEW.application_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rankings_application_delete AFTER DELETE ON applications
+BEGIN
+    DELETE FROM applicant_rankings WHERE application_id = OLD.application_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rankings_student_update
+AFTER UPDATE OF gpa, preferred_locations, skills ON students
+BEGIN
+    INSERT OR IGNORE INTO applicant_rankings_dirty VALUES ('student', NEW.student_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rankings_student_delete AFTER DELETE ON students
+BEGIN
+    DELETE FROM applicant_rankings
+    WHERE application_id IN (SELECT application_id FROM applications WHERE student_id = OLD.student_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rankings_opening_update
+AFTER UPDATE OF company_name, location, required_skills ON openings
+BEGIN
+    INSERT OR IGNORE INTO applicant_rankings_dirty VALUES ('opening', NEW.opening_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rankings_opening_delete AFTER DELETE ON openings
+BEGIN
+    DELETE FROM applicant_rankings WHERE opening_id = OLD.opening_id;
+END;
+"""
+
+# one row per application with everything the score needs
+SCORE_INPUTS = """
+    SELECT a.application_id, a.opening_id, o.company_name, s.gpa, s.skills, s.preferred_locations,
+           o.location, o.required_skills
+    FROM applications a
+    JOIN students s ON s.student_id = a.student_id
+    JOIN openings o ON o.opening_id = a.opening_id
+"""
+
+
+def install(conn):
+    """Create the table, indexes and triggers; ranks every application the first time"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'applicant_rankings'")
+    existed = cursor.fetchone() is not None
+    cursor.executescript(SCHEMA)
+    if not existed:
+        rebuild(conn)
+
+
+# -------------------------------------
+# Scoring
+# -------------------------------------
+def location_priority(preferred_locations, location):
+    """Position of the opening's city in the student's list, or None when it is not listed"""
+    ids = LOCATIONS.id_list(preferred_locations)
+    location_id = LOCATIONS.id(location)
+    return ids.index(location_id) if location_id in ids else None
+
+
+def score_row(row):
+    """SCORE_INPUTS row -> applicant_rankings row"""
+    application_id, opening_id, company_name, gpa, skills, preferred_locations, location, required_skills = row
+    skill_coverage = coverage(SKILLS.encode(skills), SKILLS.encode(required_skills))
+    priority = location_priority(preferred_locations, location)
+    location_points = max(3 - priority, 0) / 3 if priority is not None else 0.0
+    score = GPA_WEIGHT * gpa / 5 + SKILL_WEIGHT * skill_coverage + LOCATION_WEIGHT * location_points
+    return (application_id, opening_id, company_name, round(score, 6), round(skill_coverage, 4), priority)
+
+
+def rescore(cursor, where="", params=()):
+    cursor.execute(f"{SCORE_INPUTS} {where}", params)
+    cursor.executemany("INSERT OR REPLACE INTO applicant_rankings VALUES (?, ?, ?, ?, ?, ?)",
+                       [score_row(row) for row in cursor.fetchall()])
+
+
+# -------------------------------------
+# Maintenance
+# -------------------------------------
+def refresh_pending(conn):
+    """Rescore the applications, students and openings queued by the triggers"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT kind, id FROM applicant_rankings_dirty")
+    pending = cursor.fetchall()
+    if not pending:
+        return 0
+    with conn:
+        for kind, item_id in pending:
+            if kind == "application":
+                rescore(cursor, "WHERE a.application_id = ?", (int(item_id),))
+            elif kind == "student":
+                rescore(cursor, "WHERE a.student_id = ?", (item_id,))
+            else:
+                rescore(cursor, "WHERE a.opening_id = ?", (int(item_id),))
+        cursor.executemany("DELETE FROM applicant_rankings_dirty WHERE kind = ? AND id = ?", pending)
+    return len(pending)
+
+
+def rebuild(conn):
+    """Throw the rankings away and score every application again"""
+    cursor = conn.cursor()
+    with conn:
+        cursor.execute("DELETE FROM applicant_rankings")
+        cursor.execute("DELETE FROM applicant_rankings_dirty")
+        rescore(cursor)
+    cursor.execute("SELECT COUNT(*) FROM applicant_rankings")
+    return cursor.fetchone()[0]
+
+
+def verify(conn):
+    """Compare the stored scores with a fresh scoring run; returns the application ids that differ"""
+    refresh_pending(conn)
+    cursor = conn.cursor()
+    cursor.execute(SCORE_INPUTS)
+    expected = {row[0]: row for row in map(score_row, cursor.fetchall())}
+    cursor.execute("SELECT * FROM applicant_rankings")
+    stored = {row[0]: row for row in cursor.fetchall()}
+    return sorted(app_id for app_id in expected.keys() | stored.keys() if expected.get(app_id) != stored.get(app_id))
+
+
+# -------------------------------------
+# Serving
+# -------------------------------------
+def ranked_page(conn, company_name, page=0, page_size=PAGE_SIZE, opening_id=None):
+    """One page of applicants, best first.
+
+    Rows are (application_id, name, email, gpa, opening_id, specialization, location, status, score,
+    skill_coverage). The page is read off the ranking index, so only page_size rows are joined.
+    """
+    refresh_pending(conn)
+    cursor = conn.cursor()
+    if opening_id is None:
+        where, params = "company_name = ?", (company_name,)
+    else:
+        where, params = "opening_id = ? AND company_name = ?", (opening_id, company_name)
+    # the inner query skips to the page on the covering index alone; only the page's rows are joined
+    cursor.execute(f"""
+        SELECT r.application_id, s.name, s.email, s.gpa, o.opening_id, o.specialization, o.location, a.status,
+               r.score, r.skill_coverage
+        FROM (SELECT application_id FROM applicant_rankings
+              WHERE {where}
+              ORDER BY score DESC, application_id
+              LIMIT ? OFFSET ?) page
+        JOIN applicant_rankings r ON r.application_id = page.application_id
+        JOIN applications a ON a.application_id = r.application_id
+        JOIN students s ON s.student_id = a.student_id
+        JOIN openings o ON o.opening_id = r.opening_id
+        ORDER BY r.score DESC, r.application_id
+    """, params + (page_size, page * page_size))
+    return cursor.fetchall()
+
+
+def applicant_count(conn, company_name, opening_id=None):
+    refresh_pending(conn)  # like ranked_page, so applications still queued by the triggers are counted
+    cursor = conn.cursor()
+    if opening_id is None:
+        cursor.execute("SELECT COUNT(*) FROM applicant_rankings WHERE company_name = ?", (company_name,))
+    else:
+        cursor.execute("SELECT COUNT(*) FROM applicant_rankings WHERE opening_id = ?", (opening_id,))
+    return cursor.fetchone()[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the applicant_rankings table")
+    parser.add_argument("command", choices=["install", "rebuild", "verify"])
+    parser.add_argument("db_path")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    if args.command == "install":
+        install(conn)
+        print("applicant_rankings installed")
+    elif args.command == "rebuild":
+        print(f"Ranked {rebuild(conn)} applications")
+    else:
+        mismatched = verify(conn)
+        print(f"Applications with a stale score: {len(mismatched)}")
+        for application_id in mismatched[:20]:
+            print(application_id)
+    conn.close()
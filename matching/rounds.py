@@ -0,0 +1,347 @@
+import argparse
+import sqlite3
+import sys
+import time
+import traceback
+
+from matching import ranking, seats
+from matching.stable import StableMatching
+
+# =====================================
+# Application rounds
+# =====================================
+# Intake runs in rounds. A round has an open and a close time (local time,
+# "YYYY-MM-DD HH:MM:SS"), and while any round is defined applications can only
+# be submitted while one is open; each application records its round.
+#
+# At close the round's applications are frozen: triggers refuse to change or
+# delete them until the round has been matched. A scheduler outside the GUI
+# then runs the round's matching job (the stable matching round of
+# matching.stable, over that round's pending applications):
+#
+#   python -m matching.rounds create /path/to/apprenticeship.db "Spring 2025" "2025-03-01 08:00" "2025-03-15 23:59"
+#   python -m matching.rounds serve /path/to/apprenticeship.db      # or `tick` from cron
+#   python -m matching.rounds jobs /path/to/apprenticeship.db
+#
+# The job writes every result to applications.status and marks the round
+# matched in one transaction, so a crash leaves either the whole round matched
+# or none of it. A placed student's other applications are declined, and so
+# are the round's applications of students accepted before it; a student
+# the round could not place is waitlisted (matching.seats) at every opening
+# they applied to, at their applicant score, so a seat freed later goes to
+# them instead of nobody. Each job's phase timings go to round_jobs. A job that fails
+# leaves its round 'failed' (still frozen) until `retry`.
+#
+# Round statuses: scheduled -> matched | failed, failed -> scheduled on retry.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS application_rounds (
+    round_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    opens_at TEXT NOT NULL,
+    closes_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'scheduled',
+    matched_at TEXT,
+    CHECK (opens_at < closes_at)
+);
+
+CREATE INDEX IF NOT EXISTS idx_application_rounds_closes ON application_rounds (closes_at);
+
+CREATE TABLE IF NOT EXISTS round_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    round_id INTEGER NOT NULL REFERENCES application_rounds(round_id),
+    started_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    applications INTEGER,
+    accepted INTEGER,
+    fetch_seconds REAL,
+    solve_seconds REAL,
+    write_seconds REAL,
+    total_seconds REAL,
+    error TEXT
+);
+"""
+
+NOW = "datetime('now', 'localtime')"
+NO_OPEN_ROUND = "No application round is open"
+ROUND_FROZEN = "Applications of a closed round are frozen until it has been matched"
+
+TRIGGERS = f"""
+CREATE INDEX IF NOT EXISTS idx_applications_round ON applications (round_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_rounds_application_open
+BEFORE INSERT ON applications
+WHEN EXISTS (SELECT 1 FROM application_rounds)
+ AND NOT EXISTS (SELECT 1 FROM application_rounds WHERE opens_at <= {NOW} AND closes_at > {NOW})
+BEGIN
+    SELECT RAISE(ABORT, '{NO_OPEN_ROUND}');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rounds_application_round AFTER INSERT ON applications
+WHEN NEW.round_id IS NULL
+BEGIN
+    UPDATE applications SET round_id = (SELECT round_id FROM application_rounds
+                                        WHERE opens_at <= {NOW} AND closes_at > {NOW})
+    WHERE application_id = NEW.application_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rounds_application_frozen
+BEFORE UPDATE ON applications
+WHEN EXISTS (SELECT 1 FROM application_rounds WHERE round_id = OLD.round_id
+             AND closes_at <= {NOW} AND status IN ('scheduled', 'failed'))
+BEGIN
+    SELECT RAISE(ABORT, '{ROUND_FROZEN}');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rounds_application_frozen_delete
+BEFORE DELETE ON applications
+WHEN EXISTS (SELECT 1 FROM application_rounds WHERE round_id = OLD.round_id
+             AND closes_at <= {NOW} AND status IN ('scheduled', 'failed'))
+BEGIN
+    SELECT RAISE(ABORT, '{ROUND_FROZEN}');
+END;
+"""
+
+
+class RoundError(Exception):
+    pass
+
+
+def now():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def install(conn):
+    cursor = conn.cursor()
+    cursor.executescript(SCHEMA)
+    # the round an application was submitted in, for databases created before rounds
+    cursor.execute("PRAGMA table_info(applications)")
+    if "round_id" not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE applications ADD COLUMN round_id INTEGER REFERENCES application_rounds(round_id)")
+    cursor.executescript(TRIGGERS)
+    conn.commit()
+    seats.install(conn)  # unplaced applicants go on the openings' waitlists
+
+
+def timestamp(text):
+    """Normalize 'YYYY-MM-DD HH:MM[:SS]' so timestamps compare as text"""
+    for pattern in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.strptime(text.strip(), pattern))
+        except ValueError:
+            pass
+    raise RoundError(f"Not a timestamp: {text!r} (expected YYYY-MM-DD HH:MM[:SS])")
+
+
+# -------------------------------------
+# Rounds
+# -------------------------------------
+def create_round(conn, name, opens_at, closes_at):
+    opens_at, closes_at = timestamp(opens_at), timestamp(closes_at)
+    if opens_at >= closes_at:
+        raise RoundError("A round has to close after it opens")
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM application_rounds WHERE opens_at < ? AND closes_at > ?", (closes_at, opens_at))
+    overlapping = cursor.fetchone()
+    if overlapping:
+        raise RoundError(f"Overlaps round {overlapping[0]!r}")
+    cursor.execute("INSERT INTO application_rounds (name, opens_at, closes_at) VALUES (?, ?, ?)",
+                   (name, opens_at, closes_at))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def list_rounds(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT r.round_id, r.name, r.opens_at, r.closes_at, r.status, r.matched_at, COUNT(a.application_id)
+        FROM application_rounds r LEFT JOIN applications a ON a.round_id = r.round_id
+        GROUP BY r.round_id ORDER BY r.opens_at
+    """)
+    return cursor.fetchall()
+
+
+def due_rounds(conn):
+    """Closed rounds still waiting for their matching job, oldest first"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT round_id FROM application_rounds
+        WHERE status = 'scheduled' AND closes_at <= ?
+        ORDER BY closes_at
+    """, (now(),))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def retry(conn, round_id):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE application_rounds SET status = 'scheduled' WHERE round_id = ? AND status = 'failed'",
+                   (round_id,))
+    conn.commit()
+    return cursor.rowcount == 1
+
+
+# -------------------------------------
+# Matching job
+# -------------------------------------
+def run_job(db_path, round_id):
+    """Match one closed round; returns its round_jobs metrics, or None when another worker took it"""
+    matching = StableMatching(db_path)
+    conn, cursor = matching.conn, matching.cursor
+    started_at, start = now(), time.perf_counter()
+    metrics = {"round_id": round_id, "started_at": started_at, "status": "succeeded"}
+    try:
+        ranking.refresh_pending(conn)  # current applicant scores for the waitlists
+        # the write lock first, so the round is claimed once and its applications read as the job writes them
+        cursor.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError:
+        matching.close()
+        return None  # another writer held the database; the next tick tries again
+    try:
+        cursor.execute("SELECT status, closes_at FROM application_rounds WHERE round_id = ?", (round_id,))
+        row = cursor.fetchone()
+        if row is None or row[0] != "scheduled" or row[1] > started_at:
+            conn.rollback()
+            return None
+        cursor.execute("UPDATE application_rounds SET status = 'matching' WHERE round_id = ?", (round_id,))
+        # students accepted elsewhere take no part in the round; close their applications in it
+        cursor.execute("""
+            UPDATE applications SET status = 'declined'
+            WHERE round_id = ? AND status = 'pending'
+              AND student_id IN (SELECT student_id FROM applications WHERE status = 'accepted')
+        """, (round_id,))
+
+        applications = matching.fetch_applications(round_id)
+        free_seats = matching.fetch_free_seats()
+        fetched = time.perf_counter()
+        accepted_rows = matching.run_round(applications, free_seats)
+        solved = time.perf_counter()
+        placed = {applications[row][1] for row in accepted_rows}
+        cursor.executemany("UPDATE applications SET status = ? WHERE application_id = ?",
+                           [(status, application_id) for (status, application_id), application
+                            in zip(matching.result_rows(applications, accepted_rows), applications)
+                            if application[1] in placed])
+        seats.waitlist(cursor, [(application[2], application[0]) for application in applications
+                                if application[1] not in placed])
+        cursor.execute("UPDATE application_rounds SET status = 'matched', matched_at = ? WHERE round_id = ?",
+                       (now(), round_id))
+        written = time.perf_counter()
+
+        metrics.update(applications=len(applications), accepted=len(accepted_rows),
+                       fetch_seconds=round(fetched - start, 4), solve_seconds=round(solved - fetched, 4),
+                       write_seconds=round(written - solved, 4), total_seconds=round(written - start, 4))
+        record_job(cursor, metrics)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        metrics.update(status="failed", total_seconds=round(time.perf_counter() - start, 4),
+                       error="".join(traceback.format_exception_only(type(e), e)).strip())
+        cursor.execute("UPDATE application_rounds SET status = 'failed' WHERE round_id = ? AND status = 'scheduled'",
+                       (round_id,))
+        record_job(cursor, metrics)
+        conn.commit()
+    finally:
+        matching.close()
+    return metrics
+
+
+def record_job(cursor, metrics):
+    columns = ["round_id", "started_at", "status", "applications", "accepted", "fetch_seconds", "solve_seconds",
+               "write_seconds", "total_seconds", "error"]
+    cursor.execute(f"INSERT INTO round_jobs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                   [metrics.get(column) for column in columns])
+
+
+def tick(db_path):
+    """Run the matching job of every round that has closed; returns their metrics"""
+    conn = sqlite3.connect(db_path, timeout=10)
+    install(conn)
+    rounds = due_rounds(conn)
+    conn.close()
+    results = []
+    for round_id in rounds:
+        metrics = run_job(db_path, round_id)
+        if metrics is not None:
+            results.append(metrics)
+    return results
+
+
+def seconds_to_next_close(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(closes_at) FROM application_rounds WHERE status = 'scheduled' AND closes_at > ?",
+                   (now(),))
+    next_close = cursor.fetchone()[0]
+    conn.close()
+    if next_close is None:
+        return None
+    return max(time.mktime(time.strptime(next_close, "%Y-%m-%d %H:%M:%S")) - time.time(), 0)
+
+
+def serve(db_path, interval=60.0):
+    """Check for closed rounds every `interval` seconds (sooner when one is about to close)"""
+    while True:
+        for metrics in tick(db_path):
+            print(format_metrics(metrics), flush=True)
+        wait = seconds_to_next_close(db_path)
+        time.sleep(interval if wait is None else min(interval, wait + 1))
+
+
+def job_history(conn, limit=20):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT j.job_id, j.round_id, r.name, j.started_at, j.status, j.applications, j.accepted,
+               j.fetch_seconds, j.solve_seconds, j.write_seconds, j.total_seconds, j.error
+        FROM round_jobs j JOIN application_rounds r ON r.round_id = j.round_id
+        ORDER BY j.job_id DESC LIMIT ?
+    """, (limit,))
+    return cursor.fetchall()
+
+
+def format_metrics(metrics):
+    if metrics["status"] != "succeeded":
+        return f"round {metrics['round_id']}: failed after {metrics['total_seconds']}s: {metrics['error']}"
+    return (f"round {metrics['round_id']}: {metrics['accepted']}/{metrics['applications']} accepted in "
+            f"{metrics['total_seconds']}s (fetch {metrics['fetch_seconds']}s, solve {metrics['solve_seconds']}s, "
+            f"write {metrics['write_seconds']}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Application rounds and their matching jobs")
+    parser.add_argument("command", choices=["create", "list", "tick", "serve", "jobs", "retry"])
+    parser.add_argument("db_path")
+    parser.add_argument("args", nargs="*", help="create: NAME OPENS_AT CLOSES_AT; retry: ROUND_ID")
+    parser.add_argument("--interval", type=float, default=60.0, help="serve: seconds between checks")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path, timeout=10)
+    install(conn)
+    try:
+        if args.command == "create":
+            if len(args.args) != 3:
+                parser.error("create needs NAME OPENS_AT CLOSES_AT")
+            print(f"Created round {create_round(conn, *args.args)}")
+        elif args.command == "list":
+            for round_id, name, opens_at, closes_at, status, matched_at, count in list_rounds(conn):
+                print(f"{round_id:4d} {name:20s} {opens_at} -> {closes_at} {status:9s} {count:,} applications")
+        elif args.command == "jobs":
+            for job in job_history(conn):
+                print(*job)
+        elif args.command == "retry":
+            if len(args.args) != 1:
+                parser.error("retry needs ROUND_ID")
+            print("Rescheduled" if retry(conn, int(args.args[0])) else "Round is not failed")
+        elif args.command == "tick":
+            results = tick(args.db_path)
+            for metrics in results:
+                print(format_metrics(metrics))
+            sys.exit(1 if any(metrics["status"] != "succeeded" for metrics in results) else 0)
+        else:
+            try:
+                serve(args.db_path, args.interval)
+            except KeyboardInterrupt:
+                pass
+    except RoundError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
@@ -0,0 +1,301 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+import time
+import zlib
+
+import numpy as np
+
+# =====================================
+# Versioned match runs
+# =====================================
+# Unless keep_runs is cleared (the benchmark clears it), every run of
+# MatchingSystem.match_students_to_openings, stream_matches and the global
+# assignment is saved as a numbered run, instead of only living in
+# self.matches until the next run replaces it. A run keeps one entry per
+# student: the opening it got (-1 for none), the preferred-location rank it got
+# it at and its score (the rank-1 match of a top_k run), so
+#
+#   python -m matching.runs list /path/to/apprenticeship.db
+#   python -m matching.runs diff /path/to/apprenticeship.db 12 13
+#
+# lists only the students whose opening changed between two runs, and emails
+# or badges can go out for that delta instead of to the whole cohort. Given
+# one run (or none: the latest), diff compares it with the run before it that
+# has the same mode and parameters, so a change of weights is not a change of
+# placements. Nothing is deleted by itself; prune keeps the newest N runs.
+#
+# Runs are stored column by column, sorted by student id. Every column is a
+# NumPy array in the narrowest integer type that fits, compressed with zlib.
+# The student id column rarely changes between runs, so it is stored once per
+# distinct cohort (match_run_students, keyed by its digest) and shared by the
+# runs over it. Diffing two runs is a vectorized merge of the sorted ids.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS match_run_students (
+    digest TEXT PRIMARY KEY,
+    students INTEGER NOT NULL,
+    student_ids BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS match_runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    students_digest TEXT NOT NULL REFERENCES match_run_students(digest),
+    students INTEGER NOT NULL,
+    matched INTEGER NOT NULL,
+    opening_ids BLOB NOT NULL,
+    priorities BLOB NOT NULL,
+    scores BLOB
+);
+"""
+
+UNMATCHED = -1
+SEPARATOR = "\0"  # between student ids in the encoded id column
+
+
+def install(conn):
+    cursor = conn.cursor()
+    cursor.executescript(SCHEMA)
+    conn.commit()
+
+
+# -------------------------------------
+# Column encoding
+# -------------------------------------
+def narrow(values):
+    """Integers in the smallest dtype that holds them"""
+    values = np.asarray(values, dtype=np.int64)
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if not len(values) or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    return values
+
+
+def encode(array):
+    """dtype (e.g. '<i4'), ':', then the zlib-compressed raw bytes"""
+    array = np.ascontiguousarray(array)
+    return array.dtype.str.encode("ascii") + b":" + zlib.compress(array.tobytes(), 6)
+
+
+def decode(blob):
+    dtype, _, data = bytes(blob).partition(b":")
+    return np.frombuffer(zlib.decompress(data), dtype=np.dtype(dtype.decode("ascii")))
+
+
+def encode_ids(student_ids):
+    text = SEPARATOR.join(student_ids.tolist()).encode("utf-8")
+    return hashlib.sha1(text).hexdigest(), zlib.compress(text, 6)
+
+
+def decode_ids(blob, count):
+    if not count:
+        return np.array([], dtype=str)
+    return np.array(zlib.decompress(blob).decode("utf-8").split(SEPARATOR), dtype=str)
+
+
+def run_row(match):
+    """(opening_id, priority, score) of one match dict, as a run stores it"""
+    opening_id = UNMATCHED if match["opening_id"] == "N/A" else match["opening_id"]
+    return opening_id, match["priority"], match.get("score", float("nan"))  # unmatched rows have no score
+
+
+def columns_from_rows(rows):
+    """(opening_ids, priorities, scores) of run_row() tuples, one per student; scores is None for unweighted runs"""
+    opening_ids = [row[0] for row in rows]
+    priorities = [row[1] for row in rows]
+    scores = [row[2] for row in rows]
+    if any(score is None for score in scores):
+        scores = None
+    return opening_ids, priorities, scores
+
+
+def columns_from_matches(matches):
+    """(opening_ids, priorities, scores) of match dicts, one per student; scores is None for unweighted runs"""
+    return columns_from_rows([run_row(match) for match in matches])
+
+
+# -------------------------------------
+# Saving and loading
+# -------------------------------------
+class MatchRun:
+    """One saved run: the columns sorted by student id"""
+    def __init__(self, run_id, created, mode, parameters, student_ids, opening_ids, priorities, scores):
+        self.run_id = run_id
+        self.created = created
+        self.mode = mode
+        self.parameters = parameters
+        self.student_ids = student_ids
+        self.opening_ids = opening_ids
+        self.priorities = priorities
+        self.scores = scores  # None for unweighted runs
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def matched(self):
+        return int((self.opening_ids != UNMATCHED).sum())
+
+    def assignment(self, student_id):
+        """The opening id a student got in this run, or None"""
+        i = int(np.searchsorted(self.student_ids, student_id))
+        if i < len(self) and self.student_ids[i] == student_id and self.opening_ids[i] != UNMATCHED:
+            return int(self.opening_ids[i])
+        return None
+
+
+def insert_run(cursor, mode, parameters, student_ids, opening_ids, priorities, scores=None):
+    """save_run() inside the caller's transaction (the tables have to be installed)"""
+    student_ids = np.array(student_ids, dtype=str)
+    order = np.argsort(student_ids, kind="stable")
+    student_ids = student_ids[order]
+    opening_ids = np.asarray(opening_ids, dtype=np.int64)[order]
+    digest, ids_blob = encode_ids(student_ids)
+
+    cursor.execute("INSERT OR IGNORE INTO match_run_students VALUES (?, ?, ?)", (digest, len(student_ids), ids_blob))
+    cursor.execute("""
+        INSERT INTO match_runs (created, mode, parameters, students_digest, students, matched,
+                                opening_ids, priorities, scores)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (time.strftime("%Y-%m-%dT%H:%M:%S"), mode, json.dumps(parameters, sort_keys=True), digest,
+          len(student_ids), int((opening_ids != UNMATCHED).sum()), encode(narrow(opening_ids)),
+          encode(narrow(np.asarray(priorities)[order])),
+          encode(np.asarray(scores, dtype=np.float64)[order]) if scores is not None else None))
+    return cursor.lastrowid
+
+
+def save_run(conn, mode, parameters, student_ids, opening_ids, priorities, scores=None):
+    """Save one run (columns in the same student order); returns its run_id"""
+    install(conn)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        run_id = insert_run(cursor, mode, parameters, student_ids, opening_ids, priorities, scores)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return run_id
+
+
+def load_run(conn, run_id):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT r.run_id, r.created, r.mode, r.parameters, s.student_ids, r.students, r.opening_ids, r.priorities, r.scores
+        FROM match_runs r JOIN match_run_students s ON s.digest = r.students_digest
+        WHERE r.run_id = ?
+    """, (run_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"No match run {run_id}")
+    run_id, created, mode, parameters, ids_blob, count, opening_ids, priorities, scores = row
+    return MatchRun(run_id, created, mode, json.loads(parameters), decode_ids(ids_blob, count),
+                    decode(opening_ids).astype(np.int64), decode(priorities).astype(np.int64),
+                    decode(scores) if scores is not None else None)
+
+
+def list_runs(conn, limit=20):
+    """(run_id, created, mode, parameters, students, matched) of the latest runs, newest first"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'match_runs'")
+    if cursor.fetchone() is None:
+        return []
+    cursor.execute("""
+        SELECT run_id, created, mode, parameters, students, matched FROM match_runs
+        ORDER BY run_id DESC LIMIT ?
+    """, (limit,))
+    return cursor.fetchall()
+
+
+def previous_run_id(conn, run_id):
+    """The latest run before run_id with the same mode and parameters, or None"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT MAX(p.run_id) FROM match_runs r JOIN match_runs p ON p.mode = r.mode AND p.parameters = r.parameters
+        WHERE r.run_id = ? AND p.run_id < r.run_id
+    """, (run_id,))
+    return cursor.fetchone()[0]
+
+
+def prune(conn, keep):
+    """Delete all but the newest `keep` runs, and the id columns no run uses any more; returns runs deleted"""
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("""
+        DELETE FROM match_runs WHERE run_id NOT IN (SELECT run_id FROM match_runs ORDER BY run_id DESC LIMIT ?)
+    """, (keep,))
+    deleted = cursor.rowcount
+    cursor.execute("DELETE FROM match_run_students WHERE digest NOT IN (SELECT students_digest FROM match_runs)")
+    conn.commit()
+    return deleted
+
+
+# -------------------------------------
+# Diffing
+# -------------------------------------
+def diff_runs(old, new):
+    """(student_id, old opening id, new opening id) for every student whose opening changed, by student id.
+
+    None stands for "no opening", including students present in only one of the runs.
+    """
+    _, old_common, new_common = np.intersect1d(old.student_ids, new.student_ids, assume_unique=True,
+                                               return_indices=True)
+    moved = old.opening_ids[old_common] != new.opening_ids[new_common]
+    old_rows, new_rows = old_common[moved], new_common[moved]
+
+    # students in only one run count as changed when they had an opening there
+    only_old = np.setdiff1d(np.flatnonzero(old.opening_ids != UNMATCHED), old_common, assume_unique=True)
+    only_new = np.setdiff1d(np.flatnonzero(new.opening_ids != UNMATCHED), new_common, assume_unique=True)
+
+    student_ids = np.concatenate([old.student_ids[old_rows], old.student_ids[only_old], new.student_ids[only_new]])
+    before = np.concatenate([old.opening_ids[old_rows], old.opening_ids[only_old],
+                             np.full(len(only_new), UNMATCHED, dtype=np.int64)])
+    after = np.concatenate([new.opening_ids[new_rows], np.full(len(only_old), UNMATCHED, dtype=np.int64),
+                            new.opening_ids[only_new]])
+    order = np.argsort(student_ids, kind="stable")
+    return [(student_id, None if a == UNMATCHED else a, None if b == UNMATCHED else b)
+            for student_id, a, b in zip(student_ids[order].tolist(), before[order].tolist(), after[order].tolist())]
+
+
+def diff(conn, old_run_id, new_run_id):
+    return diff_runs(load_run(conn, old_run_id), load_run(conn, new_run_id))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List, diff or prune saved match runs")
+    parser.add_argument("command", choices=["list", "diff", "prune"])
+    parser.add_argument("db_path")
+    parser.add_argument("runs", nargs="*", type=int,
+                        help="diff: OLD NEW run ids (default: the latest run, or NEW, and the run before it with "
+                             "the same mode and parameters)")
+    parser.add_argument("--limit", type=int, default=20, help="list: runs to show")
+    parser.add_argument("--keep", type=int, default=10, help="prune: newest runs to keep")
+    parser.add_argument("--json", action="store_true", help="diff: one JSON object per changed student")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    if args.command == "list":
+        for run_id, created, mode, parameters, students, matched in list_runs(conn, args.limit):
+            print(f"{run_id:6d} {created} {mode:8s} {matched:,}/{students:,} matched {parameters}")
+    elif args.command == "prune":
+        print(f"Deleted {prune(conn, args.keep)} runs")
+    else:
+        runs = args.runs or [row[0] for row in list_runs(conn, 1)]
+        if len(runs) == 1:
+            runs = [previous_run_id(conn, runs[0]), runs[0]]
+        if len(runs) != 2 or runs[0] is None:
+            print("Need two runs to diff", file=sys.stderr)
+            sys.exit(1)
+        changes = diff(conn, *runs)
+        for student_id, before, after in changes:
+            if args.json:
+                print(json.dumps({"student_id": student_id, "old_opening_id": before, "new_opening_id": after}))
+            else:
+                print(f"{student_id}: {before if before is not None else '-'} -> {after if after is not None else '-'}")
+        print(f"{len(changes)} students changed between runs {runs[0]} and {runs[1]}", file=sys.stderr)
+    conn.close()
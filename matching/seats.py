@@ -0,0 +1,247 @@
+import argparse
+import sqlite3
+
+from matching import ranking
+
+# =====================================
+# Seats and waitlists
+# =====================================
+# An opening has openings.capacity seats. Accepting an application takes a free
+# seat, or puts the application on the opening's waitlist when every seat is
+# taken. The waitlist is ordered by the company's applicant score (the one in
+# applicant_rankings) and lives in opening_waitlist, whose primary key is
+# (opening_id, score DESC, application_id): the next candidate is the first
+# key of the opening, one B-tree seek.
+#
+# Declining an application or the student withdrawing it frees its seat, and
+# the best waitlisted application is promoted straight away. Every operation
+# runs inside BEGIN IMMEDIATE, so two dashboards working on the same opening
+# take turns on the write lock instead of both seeing the same free seat.
+#
+# Statuses: pending -> accepted | waitlisted | declined | withdrawn, and
+# waitlisted -> accepted when a seat frees up. matching.stable and
+# matching.rounds write the same ones: a round declines the applications it
+# does not place, or waitlists them.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS opening_waitlist (
+    opening_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    application_id INTEGER NOT NULL UNIQUE,
+    PRIMARY KEY (opening_id, score DESC, application_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_applications_opening_status ON applications (opening_id, status);
+
+CREATE TRIGGER IF NOT EXISTS trg_waitlist_application_status
+AFTER UPDATE OF status ON applications WHEN NEW.status != 'waitlisted'
+BEGIN
+    DELETE FROM opening_waitlist WHERE application_id = NEW.application_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_waitlist_application_delete AFTER DELETE ON applications
+BEGIN
+    DELETE FROM opening_waitlist WHERE application_id = OLD.application_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_waitlist_score AFTER INSERT ON applicant_rankings
+BEGIN
+    UPDATE opening_waitlist SET score = NEW.score WHERE application_id = NEW.application_id;
+END;
+"""
+
+ACCEPTABLE = ("pending", "waitlisted")  # statuses accept() can move on
+
+
+class SeatError(Exception):
+    pass
+
+
+def connect(db_path):
+    # waits for another dashboard's write transaction instead of failing with "database is locked"
+    return sqlite3.connect(db_path, timeout=10)
+
+
+def install(conn):
+    ranking.install(conn)
+    cursor = conn.cursor()
+    cursor.executescript(SCHEMA)
+    conn.commit()
+
+
+# -------------------------------------
+# Inside the write transaction
+# -------------------------------------
+def application(cursor, application_id):
+    cursor.execute("""
+        SELECT a.opening_id, a.status, o.capacity
+        FROM applications a JOIN openings o ON o.opening_id = a.opening_id
+        WHERE a.application_id = ?
+    """, (application_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise SeatError(f"Application {application_id} does not exist")
+    return row
+
+
+def free_seats(cursor, opening_id, capacity):
+    cursor.execute("SELECT COUNT(*) FROM applications WHERE opening_id = ? AND status = 'accepted'", (opening_id,))
+    return capacity - cursor.fetchone()[0]
+
+
+def promote(cursor, opening_id, capacity):
+    """Fill free seats from the top of the waitlist; returns the promoted application ids"""
+    promoted = []
+    for _ in range(max(free_seats(cursor, opening_id, capacity), 0)):
+        cursor.execute("""
+            SELECT application_id FROM opening_waitlist
+            WHERE opening_id = ?
+            ORDER BY score DESC, application_id
+            LIMIT 1
+        """, (opening_id,))
+        row = cursor.fetchone()
+        if row is None:
+            break
+        cursor.execute("UPDATE applications SET status = 'accepted' WHERE application_id = ?", row)
+        promoted.append(row[0])
+    return promoted
+
+
+def waitlist(cursor, applications):
+    """Waitlist (opening_id, application_id) pairs at their applicant scores"""
+    cursor.executemany("UPDATE applications SET status = 'waitlisted' WHERE application_id = ?",
+                       [(application_id,) for _, application_id in applications])
+    cursor.executemany("""
+        INSERT OR REPLACE INTO opening_waitlist
+        SELECT ?, COALESCE((SELECT score FROM applicant_rankings WHERE application_id = ?), 0.0), ?
+    """, [(opening_id, application_id, application_id) for opening_id, application_id in applications])
+
+
+def transaction(conn, work):
+    """Run work(cursor) under BEGIN IMMEDIATE; commits on success, rolls back on any error"""
+    ranking.refresh_pending(conn)  # waitlist scores follow applicant_rankings
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        result = work(cursor)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return result
+
+
+# -------------------------------------
+# Operations
+# -------------------------------------
+def accept(conn, application_id):
+    """Accept into a free seat, or waitlist when the opening is full; returns 'accepted' or 'waitlisted'"""
+    def work(cursor):
+        opening_id, status, capacity = application(cursor, application_id)
+        if status == "accepted":
+            return "accepted"
+        if status not in ACCEPTABLE:
+            raise SeatError(f"Application {application_id} is {status}")
+        if free_seats(cursor, opening_id, capacity) > 0:
+            cursor.execute("UPDATE applications SET status = 'accepted' WHERE application_id = ?", (application_id,))
+            return "accepted"
+        waitlist(cursor, [(opening_id, application_id)])
+        return "waitlisted"
+    return transaction(conn, work)
+
+
+def release(conn, application_id, status):
+    """Mark an application declined or withdrawn and promote into the seat it held; returns promoted ids"""
+    def work(cursor):
+        opening_id, old_status, capacity = application(cursor, application_id)
+        if old_status in ("declined", "withdrawn"):
+            return []
+        cursor.execute("UPDATE applications SET status = ? WHERE application_id = ?", (status, application_id))
+        return promote(cursor, opening_id, capacity) if old_status == "accepted" else []
+    return transaction(conn, work)
+
+
+def decline(conn, application_id):
+    """The company turns the application down"""
+    return release(conn, application_id, "declined")
+
+
+def withdraw(conn, application_id):
+    """The student takes the application back"""
+    return release(conn, application_id, "withdrawn")
+
+
+def set_capacity(conn, opening_id, capacity):
+    """Change an opening's seat count; extra seats are filled from the waitlist (fewer seats revoke nobody)"""
+    if capacity < 1:
+        raise SeatError("An opening needs at least one seat")
+
+    def work(cursor):
+        cursor.execute("UPDATE openings SET capacity = ? WHERE opening_id = ?", (capacity, opening_id))
+        return promote(cursor, opening_id, capacity)
+    return transaction(conn, work)
+
+
+def waitlist_position(conn, application_id):
+    """1-based place in the opening's waitlist, or None when the application is not waitlisted"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(*) + 1 FROM opening_waitlist w, opening_waitlist me
+        WHERE me.application_id = ? AND w.opening_id = me.opening_id
+          AND (w.score > me.score OR (w.score = me.score AND w.application_id < me.application_id))
+    """, (application_id,))
+    position = cursor.fetchone()[0]
+    cursor.execute("SELECT 1 FROM opening_waitlist WHERE application_id = ?", (application_id,))
+    return position if cursor.fetchone() else None
+
+
+def contacts(conn, application_ids):
+    """(application_id, student name, student email, company name) for notifying promoted students"""
+    cursor = conn.cursor()
+    found = []
+    for application_id in application_ids:
+        cursor.execute("""
+            SELECT a.application_id, s.name, s.email, o.company_name
+            FROM applications a
+            JOIN students s ON s.student_id = a.student_id
+            JOIN openings o ON o.opening_id = a.opening_id
+            WHERE a.application_id = ?
+        """, (application_id,))
+        found.extend(cursor.fetchall())
+    return found
+
+
+def verify(conn):
+    """Openings with more accepted applications than seats, or a waitlist out of step with the statuses"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT o.opening_id FROM openings o
+        JOIN applications a ON a.opening_id = o.opening_id AND a.status = 'accepted'
+        GROUP BY o.opening_id HAVING COUNT(*) > o.capacity
+    """)
+    problems = [("over capacity", row[0]) for row in cursor.fetchall()]
+    cursor.execute("""
+        SELECT a.application_id FROM applications a
+        LEFT JOIN opening_waitlist w ON w.application_id = a.application_id
+        WHERE (a.status = 'waitlisted') != (w.application_id IS NOT NULL)
+    """)
+    problems += [("waitlist mismatch", row[0]) for row in cursor.fetchall()]
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seats and waitlists of openings")
+    parser.add_argument("command", choices=["install", "verify"])
+    parser.add_argument("db_path")
+    args = parser.parse_args()
+
+    conn = connect(args.db_path)
+    if args.command == "install":
+        install(conn)
+        print("Seat tables and triggers installed")
+    else:
+        problems = verify(conn)
+        print(f"Problems: {len(problems)}")
+        for problem in problems[:20]:
+            print(*problem)
+    conn.close()
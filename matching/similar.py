@@ -0,0 +1,173 @@
+import sqlite3
+import zlib
+from itertools import islice
+
+import numpy as np
+
+from matching.canonical import SPECIALIZATIONS, load_terms
+
+# =====================================
+# Similar openings (MinHash + LSH)
+# =====================================
+# Finds openings in the same specialization whose required skills overlap the
+# most with a given opening, without comparing it against the whole table.
+#
+# Every opening gets a MinHash signature of NUM_HASHES values over its skill set
+# (skills stripped and lower cased, hashed with crc32 so signatures are the same
+# in every process). The signature is cut into BANDS bands of ROWS values, and
+# each (specialization, band, band values), hashed to one 64-bit key, is a
+# bucket: two openings share a bucket with probability 1 - (1 - J**ROWS)**BANDS
+# for skill-set Jaccard J, about 0.5 at J = 0.5 and almost 1 above 0.75. A
+# query unions the opening's buckets, keeps at most MAX_CANDIDATES candidates
+# and ranks them by their exact Jaccard similarity.
+#
+# Like IncrementalMatcher, the index lives in memory and is told about openings
+# added or deleted through CompanyDashboard (opening_added / opening_deleted).
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+MAX_CANDIDATES = 500
+PRIME = (1 << 31) - 1
+SEED = 20240601
+
+# h(x) = (a * x + b) mod PRIME; a * x stays below 2**63 for 32-bit x
+HASH_A, HASH_B = np.random.default_rng(SEED).integers(1, PRIME, (2, NUM_HASHES), dtype=np.uint64)
+# odd multipliers that fold a band, its number and the specialization into one 64-bit bucket key
+MIX = np.random.default_rng(SEED + 1).integers(1, 1 << 62, ROWS + 2, dtype=np.uint64) | np.uint64(1)
+
+
+def skill_set(text):
+    return frozenset(skill for skill in (part.strip().lower() for part in (text or "").split(",")) if skill)
+
+
+def skill_hashes(skills):
+    """(len(skills), NUM_HASHES) matrix of every hash function applied to every skill"""
+    x = np.array([zlib.crc32(skill.encode("utf-8")) for skill in skills], dtype=np.uint64)
+    return (HASH_A[None, :] * x[:, None] + HASH_B[None, :]) % PRIME
+
+
+def signature(skills):
+    """MinHash signature of a skill set, or None for an empty one"""
+    if not skills:
+        return None
+    return skill_hashes(sorted(skills)).min(axis=0).astype(np.uint32)
+
+
+def band_keys(specs, signatures):
+    """(n, BANDS) bucket keys; a collision only adds a candidate, which the exact Jaccard ranks"""
+    bands = signatures.astype(np.uint64).reshape(len(signatures), BANDS, ROWS)
+    with np.errstate(over="ignore"):
+        keys = (bands * MIX[:ROWS]).sum(axis=2)  # wraps modulo 2**64
+        keys += np.arange(BANDS, dtype=np.uint64) * MIX[ROWS]
+        keys += np.asarray(specs, dtype=np.uint64)[:, None] * MIX[ROWS + 1]
+    return keys
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class SimilarOpenings:
+    def __init__(self, db_name='apprenticeship.db'):
+        self.conn = sqlite3.connect(db_name)
+        self.cursor = self.conn.cursor()
+        load_terms(self.conn)
+        self.openings = {}  # opening_id -> (specialization id, skill set, signature)
+        # band key (specialization, band, band values) -> opening id, or a set of them once shared;
+        # most buckets hold one opening, and plain ints keep a million of them out of the garbage collector
+        self.buckets = {}
+        self.load()
+
+    def load(self):
+        self.openings.clear()
+        self.buckets.clear()
+        self.cursor.execute("SELECT opening_id, specialization, required_skills FROM openings ORDER BY opening_id")
+        rows = [(opening_id, SPECIALIZATIONS.id(spec), skill_set(skills))
+                for opening_id, spec, skills in self.cursor.fetchall()]
+
+        # hash every distinct skill once, then each signature is a min over that opening's rows
+        names = sorted({skill for _, _, skills in rows for skill in skills})
+        column = {skill: i for i, skill in enumerate(names)}
+        hashes = skill_hashes(names).astype(np.uint32) if names else None
+        filled = [row for row in rows if row[2]]
+        if filled:
+            flat = np.fromiter((column[skill] for _, _, skills in filled for skill in skills), dtype=np.int64)
+            starts = np.cumsum([0] + [len(skills) for _, _, skills in filled[:-1]])
+            signatures = np.minimum.reduceat(hashes[flat], starts, axis=0)
+            keys = band_keys([spec for _, spec, _ in filled], signatures).tolist()
+            for (opening_id, spec, skills), sig, opening_keys in zip(filled, signatures, keys):
+                self.insert(opening_id, spec, skills, sig, opening_keys)
+        for opening_id, spec, skills in rows:
+            if not skills:
+                self.openings[opening_id] = (spec, skills, None)
+
+    def bucket_keys(self, spec, sig):
+        return band_keys([spec], sig[None, :])[0].tolist()
+
+    def insert(self, opening_id, spec, skills, sig, keys=None):
+        self.openings[opening_id] = (spec, skills, sig)
+        buckets = self.buckets
+        for key in keys or self.bucket_keys(spec, sig):
+            members = buckets.get(key)
+            if members is None:
+                buckets[key] = opening_id
+            elif type(members) is int:
+                buckets[key] = {members, opening_id}
+            else:
+                members.add(opening_id)
+
+    # -------------------------------------
+    # Deltas
+    # -------------------------------------
+    def opening_added(self, opening_id):
+        self.cursor.execute("SELECT specialization, required_skills FROM openings WHERE opening_id = ?", (opening_id,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return
+        self.opening_deleted(opening_id)
+        skills = skill_set(row[1])
+        sig = signature(skills)
+        if sig is None:
+            self.openings[opening_id] = (SPECIALIZATIONS.id(row[0]), skills, None)
+        else:
+            self.insert(opening_id, SPECIALIZATIONS.id(row[0]), skills, sig)
+
+    def opening_deleted(self, opening_id):
+        found = self.openings.pop(opening_id, None)
+        if found is None or found[2] is None:
+            return
+        for key in self.bucket_keys(found[0], found[2]):
+            members = self.buckets.get(key)
+            if members == opening_id:
+                del self.buckets[key]
+            elif type(members) is set:
+                members.discard(opening_id)
+                if len(members) == 1:
+                    self.buckets[key] = members.pop()
+
+    # -------------------------------------
+    # Queries
+    # -------------------------------------
+    def similar(self, opening_id, k=5):
+        """Up to k (opening_id, Jaccard similarity) pairs for openings like opening_id, most similar first"""
+        found = self.openings.get(opening_id)
+        if found is None or found[2] is None:
+            return []
+        spec, skills, sig = found
+        candidates = set()
+        for key in self.bucket_keys(spec, sig):
+            members = self.buckets.get(key)
+            if type(members) is set:
+                candidates.update(islice(members, MAX_CANDIDATES))
+                if len(candidates) > MAX_CANDIDATES:
+                    break
+            elif members is not None:
+                candidates.add(members)
+        candidates.discard(opening_id)
+        scored = [(jaccard(skills, self.openings[other][1]), other) for other in candidates]
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return [(other, score) for score, other in scored[:k]]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,70 @@
+import numpy as np
+
+# =====================================
+# Skill vocabulary and bitset encoding
+# =====================================
+# Every distinct skill (stripped, lower case) gets an integer id, and a skill
+# list becomes an int with those bits set. Overlap and coverage are then one
+# AND plus a popcount. Encoded masks are cached by their source text, so an
+# opening's required_skills string is only parsed the first time it is seen.
+# For bulk work, masks can be packed into a NumPy uint8 bit matrix.
+
+POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+class SkillVocabulary:
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.cache = {}
+
+    def skill_id(self, skill):
+        if skill not in self.ids:
+            self.ids[skill] = len(self.names)
+            self.names.append(skill)
+        return self.ids[skill]
+
+    def encode(self, text):
+        """Turn a comma separated skill list into a bitmask"""
+        mask = self.cache.get(text)
+        if mask is None:
+            mask = 0
+            for skill in text.split(","):
+                skill = skill.strip().lower()
+                if skill:
+                    mask |= 1 << self.skill_id(skill)
+            self.cache[text] = mask
+        return mask
+
+    def decode(self, mask):
+        return [name for bit, name in enumerate(self.names) if mask >> bit & 1]
+
+    def pack(self, masks):
+        """Pack bitmasks into a (len(masks), bytes) uint8 matrix, lowest skill id in byte 0"""
+        width = max((len(self.names) + 7) // 8, 1)
+        data = b"".join(mask.to_bytes(width, "little") for mask in masks)
+        return np.frombuffer(data, dtype=np.uint8).reshape(len(masks), width)
+
+
+def popcount(x):
+    """Number of set bits (int.bit_count() needs Python 3.10)"""
+    return bin(x).count("1")
+
+
+def overlap(mask_a, mask_b):
+    return popcount(mask_a & mask_b)
+
+
+def coverage(student_mask, required_mask):
+    """Share of the required skills the student has (1.0 when nothing is required)"""
+    required = popcount(required_mask)
+    return popcount(student_mask & required_mask) / required if required else 1.0
+
+
+def packed_overlap(packed_student, packed_openings):
+    """Overlap counts of one packed student row against every packed opening row"""
+    return POPCOUNT[packed_openings & packed_student].sum(axis=1, dtype=np.int64)
+
+
+# shared by the matchers and the dashboards so ids stay the same within a process
+SKILLS = SkillVocabulary()
@@ -0,0 +1,350 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import sys
+import time
+
+import numpy as np
+
+from matching.canonical import LOCATIONS, SPECIALIZATIONS, load_terms, save_terms
+from matching.features import (OpeningFeatures, RaggedColumn, StringColumn, StudentFeatures, load_features,
+                               load_openings, load_students, widen)
+from matching.skills import SKILLS
+
+# =====================================
+# Feature store snapshots
+# =====================================
+# Saves the prepared matching data (the student and opening feature columns and
+# the canonical location, specialization and skill names their ids refer to)
+# to one binary file, and maps it back in without parsing:
+#
+#   python -m matching.snapshot save /path/to/apprenticeship.db
+#   python -m matching.snapshot check /path/to/apprenticeship.db
+#
+# Layout: MAGIC, format version and header length, a JSON header, then every
+# array as raw bytes at a 64-byte aligned offset. Loading maps the file and
+# wraps each array with np.frombuffer, so a cold start costs one header parse
+# and the pages are only read when a column is used.
+#
+# A snapshot records a fingerprint of the database: the max rowid of students
+# and openings, plus change counters bumped by triggers on every insert,
+# update and delete of both tables (installed by the first save). PRAGMA
+# data_version cannot be used for this, since it is per connection and starts
+# over in every process. A snapshot whose fingerprint, format version or alias
+# lists differ from the current ones is stale, and cached_features() rebuilds
+# it. Ids are taken from canonical_terms, as the matchers do, so a snapshot
+# saved by one process means the same thing in the next.
+#
+# Every save writes a new file (<path>.<version>) and then switches <path>, a
+# small pointer file naming the current one. A file another process still has
+# mapped is never replaced (Windows refuses to), only left behind; older
+# versions are deleted once nothing maps them any more, at a later save.
+
+MAGIC = b"MATCHSNP"
+SNAPSHOT_VERSION = 1
+ALIGNMENT = 64
+PREFIX = struct.Struct("<8sII")  # magic, format version, header length
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matching_data_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO matching_data_versions VALUES ('students', 0), ('openings', 0);
+"""
+
+TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_snapshot_{table}_{event} AFTER {event} ON {table}
+BEGIN
+    UPDATE matching_data_versions SET version = version + 1 WHERE table_name = '{table}';
+END;
+"""
+
+
+def default_path(db_path):
+    return db_path + ".snapshot"
+
+
+def data_file(path):
+    """The snapshot file the pointer at `path` names (`path` itself for a pre-pointer snapshot), or None"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(MAGIC) + 256)
+    except FileNotFoundError:
+        return None
+    if head.startswith(MAGIC):
+        return path
+    return os.path.join(os.path.dirname(path), head.decode("utf-8").strip())
+
+
+def versions(path):
+    """The versioned snapshot files saved under `path`"""
+    folder, name = os.path.split(path)
+    pattern = re.compile(re.escape(name) + r"\.[0-9a-f]+$")
+    return [os.path.join(folder, entry) for entry in os.listdir(folder or ".") if pattern.match(entry)]
+
+
+def switch_pointer(path, target):
+    partial = path + ".pointer.partial"
+    with open(partial, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(target) + "\n")
+    for attempt in range(5):
+        try:
+            os.replace(partial, path)
+            return
+        except PermissionError:  # a reader has the pointer open this instant (Windows)
+            if attempt == 4:
+                raise
+            time.sleep(0.05)
+
+
+def install(conn):
+    """Create the change counters and their triggers"""
+    cursor = conn.cursor()
+    cursor.executescript(SCHEMA + "".join(TRIGGER.format(table=table, event=event)
+                                          for table in ("students", "openings")
+                                          for event in ("INSERT", "UPDATE", "DELETE")))
+    conn.commit()
+
+
+def fingerprint(conn):
+    """What a snapshot has to agree with; None when the change counters are not installed"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'matching_data_versions'")
+    if cursor.fetchone() is None:
+        return None
+    found = {}
+    for table in ("students", "openings"):
+        cursor.execute(f"SELECT MAX(rowid) FROM {table}")  # a seek; COUNT(*) would scan the table
+        found[table] = cursor.fetchone()[0]
+    cursor.execute("SELECT table_name, version FROM matching_data_versions ORDER BY table_name")
+    found["versions"] = dict(cursor.fetchall())
+    return found
+
+
+def aliases_digest():
+    """The aliases decide which id a raw string gets, so a snapshot is only valid under the same ones"""
+    text = json.dumps([sorted(LOCATIONS.aliases.items()), sorted(SPECIALIZATIONS.aliases.items())])
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# -------------------------------------
+# Writing
+# -------------------------------------
+def feature_arrays(students, openings):
+    arrays = {
+        "students.student_id.buffer": students.student_id.buffer,
+        "students.student_id.ends": students.student_id.ends,
+        "students.name.buffer": students.name.buffer,
+        "students.name.ends": students.name.ends,
+        "students.gpa": students.gpa,
+        "students.spec": students.spec,
+        "students.locations.values": students.locations.values,
+        "students.locations.ends": students.locations.ends,
+        "openings.opening_id": openings.opening_id,
+        "openings.spec": openings.spec,
+        "openings.loc": openings.loc,
+        "openings.stipend": openings.stipend,
+        "openings.capacity": openings.capacity,
+        "openings.location.buffer": openings.location.buffer,
+        "openings.location.ends": openings.location.ends,
+        "openings.skills": openings.skills,
+    }
+    if students.skills is not None:
+        arrays["students.skills"] = students.skills
+    return {name: np.asarray(array) if not isinstance(array, bytearray) else np.frombuffer(array, dtype=np.uint8)
+            for name, array in arrays.items()}
+
+
+def save(db_path, path=None, skills=False):
+    """Build the features from the database and write them to a snapshot; returns the path"""
+    path = path or default_path(db_path)
+    conn = sqlite3.connect(db_path)
+    load_terms(conn)
+    install(conn)
+    # fingerprint and features come from the same read transaction
+    conn.execute("BEGIN")
+    found = fingerprint(conn)
+    openings = load_openings(conn)
+    students = load_students(conn, skills)
+    conn.rollback()
+    save_terms(conn)
+    conn.close()
+    if students.skills is not None:
+        openings.skills = widen(openings.skills, students.skills.shape[1])
+
+    arrays = feature_arrays(students, openings)
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "fingerprint": found,
+        "aliases": aliases_digest(),
+        "skills": skills,
+        "vocabulary": {"location": LOCATIONS.names, "specialization": SPECIALIZATIONS.names, "skill": SKILLS.names},
+        "arrays": {},
+    }
+    # offsets are relative to the end of the header, so they do not depend on its own length
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    encoded = json.dumps(header).encode("utf-8")
+    encoded += b" " * (-(PREFIX.size + len(encoded)) % ALIGNMENT)
+    # a new file per save: readers keep mapping the old one until they load again
+    target = f"{path}.{time.time_ns():x}"
+    with open(target, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, SNAPSHOT_VERSION, len(encoded)))
+        f.write(encoded)
+        for array in arrays.values():
+            data = np.ascontiguousarray(array).tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % ALIGNMENT))
+    switch_pointer(path, target)
+
+    for old in versions(path):
+        if old != target:
+            try:
+                os.remove(old)
+            except OSError:
+                pass  # still mapped by a reader (Windows); removed by a later save
+    return path
+
+
+# -------------------------------------
+# Reading
+# -------------------------------------
+def read_header(path):
+    with open(path, "rb") as f:
+        prefix = f.read(PREFIX.size)
+        if len(prefix) < PREFIX.size:
+            raise ValueError(f"{path} is not a matching snapshot")
+        magic, version, length = PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a matching snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} has snapshot format {version}, expected {SNAPSHOT_VERSION}")
+        return json.loads(f.read(length)), PREFIX.size + length
+
+
+def stale_reason(db_path, path):
+    """Why the snapshot cannot be used for the database, or None when it is current"""
+    target = data_file(path)
+    if target is None or not os.path.exists(target):
+        return "no snapshot"
+    try:
+        header, _ = read_header(target)
+    except ValueError as e:
+        return str(e)
+    if header["aliases"] != aliases_digest():
+        return "location or specialization aliases changed"
+    conn = sqlite3.connect(db_path)
+    try:
+        found = fingerprint(conn)
+    finally:
+        conn.close()
+    if found != header["fingerprint"]:
+        return "students or openings changed"
+    return None
+
+
+def adopt_vocabulary(header):
+    """Intern the snapshot's names so its ids mean the same here; False if this process already disagrees"""
+    for vocabulary, names in ((LOCATIONS, header["vocabulary"]["location"]),
+                              (SPECIALIZATIONS, header["vocabulary"]["specialization"])):
+        if names[:len(vocabulary.names)] != vocabulary.names[:len(names)]:
+            return False
+        for name in names[len(vocabulary.names):]:
+            vocabulary.intern(name)
+    names = header["vocabulary"]["skill"]
+    if names[:len(SKILLS.names)] != SKILLS.names[:len(names)]:
+        return False
+    for name in names[len(SKILLS.names):]:
+        SKILLS.skill_id(name)
+    return True
+
+
+def load(path):
+    """Map a snapshot; returns (header, StudentFeatures, OpeningFeatures) backed by the file"""
+    target = data_file(path)
+    if target is None:
+        raise ValueError(f"No snapshot at {path}")
+    header, start = read_header(target)
+    if not adopt_vocabulary(header):
+        raise ValueError(f"{path} was written with different canonical ids than this process uses")
+
+    with open(target, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count,
+                                     offset=start + spec["offset"]).reshape(spec["shape"])
+
+    def strings(prefix):
+        column = StringColumn()
+        column.buffer, column.ends = arrays[prefix + ".buffer"], arrays[prefix + ".ends"]
+        return column
+
+    students = StudentFeatures()
+    students.student_id = strings("students.student_id")
+    students.name = strings("students.name")
+    students.gpa = arrays["students.gpa"]
+    students.spec = arrays["students.spec"]
+    students.locations = RaggedColumn()
+    students.locations.values = arrays["students.locations.values"]
+    students.locations.ends = arrays["students.locations.ends"]
+    students.skill_ids = None
+    students.skills = arrays.get("students.skills")
+
+    openings = OpeningFeatures()
+    for column in ("opening_id", "spec", "loc", "stipend", "capacity", "skills"):
+        setattr(openings, column, arrays["openings." + column])
+    openings.location = strings("openings.location")
+    openings.skill_ids = None
+    return header, students, openings
+
+
+def cached_features(db_path, path=None, skills=False):
+    """load_features() through a snapshot: mapped when current, rebuilt and saved when stale.
+
+    path=None skips the snapshot and reads the database directly.
+    """
+    if path is None:
+        return load_features(db_path, skills)
+    if stale_reason(db_path, path) is None:
+        try:
+            header, students, openings = load(path)
+            if not skills or header["skills"]:
+                return students, openings
+        except ValueError:
+            pass
+    save(db_path, path, skills)
+    _, students, openings = load(path)
+    return students, openings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Save or check a matching feature snapshot")
+    parser.add_argument("command", choices=["save", "check"])
+    parser.add_argument("db_path")
+    parser.add_argument("--path", help="snapshot file (default: <db_path>.snapshot)")
+    parser.add_argument("--skills", action="store_true", help="include the students' skill matrix")
+    args = parser.parse_args()
+    path = args.path or default_path(args.db_path)
+
+    if args.command == "save":
+        start = time.perf_counter()
+        save(args.db_path, path, args.skills)
+        target = data_file(path)
+        print(f"Saved {target} ({os.path.getsize(target) / 2**20:.1f} MB) in {time.perf_counter() - start:.2f}s")
+    else:
+        reason = stale_reason(args.db_path, path)
+        print(f"{path}: {reason or 'current'}")
+        sys.exit(1 if reason else 0)
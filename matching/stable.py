@@ -0,0 +1,124 @@
+import heapq
+import sqlite3
+import time
+
+# =====================================
+# Stable matching round (deferred acceptance)
+# =====================================
+# Students propose to the openings they applied to, best ranked first
+# (preference_rank, then the order they applied in). Each opening ranks its
+# applicants the way CompanyDashboard.load_applications lists them: GPA
+# descending, earlier application first on ties. Openings hold up to their
+# free seats and bump their worst held applicant when a better one proposes.
+#
+# SQLite returns the applications grouped by student in proposal order and
+# ranks them inside each opening with a window function. Preferences then live
+# in flat lists indexed by application row, so every proposal looks up the
+# opening's rank of that applicant in O(1).
+
+
+class StableMatching:
+    def __init__(self, db_name='apprenticeship.db'):
+        self.conn = sqlite3.connect(db_name)
+        self.cursor = self.conn.cursor()
+
+    def fetch_applications(self, round_id=None):
+        # pending applications of students that are not already accepted somewhere,
+        # grouped by student in proposal order, each with its rank inside the opening
+        # (only those of one application round when round_id is given)
+        self.cursor.execute(f"""
+            SELECT a.application_id, a.student_id, a.opening_id,
+                   ROW_NUMBER() OVER (PARTITION BY a.opening_id ORDER BY s.gpa DESC, a.application_id) - 1
+            FROM applications a
+            JOIN students s ON a.student_id = s.student_id
+            JOIN openings o ON a.opening_id = o.opening_id
+            WHERE a.status = 'pending'
+              AND a.student_id NOT IN (SELECT student_id FROM applications WHERE status = 'accepted')
+              {"AND a.round_id = ?" if round_id is not None else ""}
+            ORDER BY a.student_id, a.preference_rank IS NULL, a.preference_rank, a.application_id
+        """, (round_id,) if round_id is not None else ())
+        return self.cursor.fetchall()
+
+    def fetch_free_seats(self):
+        self.cursor.execute("""
+            SELECT o.opening_id, o.capacity - COUNT(a.application_id)
+            FROM openings o
+            LEFT JOIN applications a ON a.opening_id = o.opening_id AND a.status = 'accepted'
+            GROUP BY o.opening_id
+        """)
+        return dict(self.cursor.fetchall())
+
+    def build_preferences(self, applications):
+        """Split the ordered rows into per-student proposal ranges and per-application company ranks"""
+        # rows arrive grouped by student, so student i proposes rows offsets[i] .. offsets[i + 1] - 1
+        offsets = []
+        previous_student = None
+        for row, application in enumerate(applications):
+            if application[1] != previous_student:
+                offsets.append(row)
+                previous_student = application[1]
+        offsets.append(len(applications))
+
+        opening_ids = [application[2] for application in applications]
+        company_rank = [application[3] for application in applications]
+        return opening_ids, offsets, company_rank
+
+    def run_round(self, applications, free_seats):
+        """Return the set of application rows that end up accepted"""
+        opening_ids, offsets, company_rank = self.build_preferences(applications)
+        student_count = len(offsets) - 1
+
+        next_choice = offsets[:-1]
+        held = {}  # opening_id -> max-heap of (-company rank, application row, student)
+        free = list(range(student_count))
+
+        while free:
+            student = free.pop()
+            if next_choice[student] == offsets[student + 1]:
+                continue  # student ran out of applications
+            row = next_choice[student]
+            next_choice[student] += 1
+
+            opening_id = opening_ids[row]
+            seats = free_seats.get(opening_id, 0)
+            heap = held.setdefault(opening_id, [])
+            if len(heap) < seats:
+                heapq.heappush(heap, (-company_rank[row], row, student))
+            elif heap and -heap[0][0] > company_rank[row]:
+                bumped = heapq.heapreplace(heap, (-company_rank[row], row, student))[2]
+                free.append(bumped)
+            else:
+                free.append(student)
+
+        return {row for heap in held.values() for _, row, _ in heap}
+
+    def result_rows(self, applications, accepted_rows):
+        # (status, application_id): matched applications are accepted, the rest of the round declined
+        # (the statuses of matching.seats)
+        return [("accepted" if row in accepted_rows else "declined", application[0])
+                for row, application in enumerate(applications)]
+
+    def write_results(self, applications, accepted_rows):
+        # one transaction for the whole round
+        with self.conn:
+            self.cursor.executemany("UPDATE applications SET status = ? WHERE application_id = ?",
+                                    self.result_rows(applications, accepted_rows))
+
+    def match(self):
+        start = time.perf_counter()
+        applications = self.fetch_applications()
+        accepted_rows = self.run_round(applications, self.fetch_free_seats())
+        self.write_results(applications, accepted_rows)
+        return {
+            "applications": len(applications),
+            "accepted": len(accepted_rows),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def close(self):
+        self.conn.close()
+
+if __name__ == "__main__":
+    matching = StableMatching()
+    print(matching.match())
+    matching.close()
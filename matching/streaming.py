@@ -0,0 +1,102 @@
+import csv
+import json
+from itertools import islice
+
+# =====================================
+# Streaming helpers
+# =====================================
+# Cursor batches in, matches out as a generator, and sinks that write each
+# batch as it arrives, so nothing holds the whole cohort in memory.
+
+MATCH_COLUMNS = ["student_name", "gpa", "opening_id", "location", "stipend", "priority", "score"]
+# column order of the tuples yielded by matching.matcher.MatchingSystem.iter_matches
+TUPLE_MATCH_COLUMNS = ["student_name", "gpa", "opening_id", "location", "stipend"]
+
+
+def match_columns(tuples=False, top_k=None):
+    """Columns of the matches a run yields: dicts (models.maching_system) or tuples (matching.matcher),
+    plus the rank that top_k runs add"""
+    return (TUPLE_MATCH_COLUMNS if tuples else MATCH_COLUMNS) + (["rank"] if top_k else [])
+
+
+def iter_rows(cursor, batch_size=1000):
+    """Yield the rows of an executed cursor, fetched batch_size at a time"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def as_row(match, columns):
+    # matches are dicts (models.maching_system) or tuples in column order (matching.matcher)
+    if isinstance(match, dict):
+        return tuple(match.get(column) for column in columns)
+    return tuple(match)
+
+
+class JsonlSink:
+    """One JSON object per line"""
+    def __init__(self, path, columns=MATCH_COLUMNS, buffering=1 << 20):
+        self.file = open(path, "w", encoding="utf-8", buffering=buffering)
+        self.columns = columns
+
+    def write_many(self, matches):
+        self.file.write("".join(json.dumps(dict(zip(self.columns, as_row(match, self.columns)))) + "\n"
+                                for match in matches))
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink:
+    """CSV with a header row; each batch is one writerows call"""
+    def __init__(self, path, columns=MATCH_COLUMNS, buffering=1 << 20):
+        self.file = open(path, "w", encoding="utf-8", newline="", buffering=buffering)
+        self.columns = columns
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write_many(self, matches):
+        self.writer.writerows(as_row(match, self.columns) for match in matches)
+
+    def close(self):
+        self.file.close()
+
+
+class TableSink:
+    """Insert matches into a SQLite table, one transaction per batch"""
+    def __init__(self, conn, table="match_results", columns=MATCH_COLUMNS):
+        self.conn = conn
+        self.table = table
+        self.columns = columns
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})")
+        self.insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+    def write_many(self, matches):
+        with self.conn:
+            self.conn.executemany(self.insert, [as_row(match, self.columns) for match in matches])
+
+    def close(self):
+        pass
+
+
+def stream_to(matches, sink, batch_size=1000, progress=None):
+    """Drain a match generator into a sink batch by batch; returns the number written.
+
+    progress, if given, is called with the running total after every batch.
+    """
+    written = 0
+    matches = iter(matches)
+    try:
+        while True:
+            batch = list(islice(matches, batch_size))
+            if not batch:
+                break
+            sink.write_many(batch)
+            written += len(batch)
+            if progress:
+                progress(written)
+    finally:
+        sink.close()  # also on failure, so the caller can delete a partial file (Windows won't while it is open)
+    return written
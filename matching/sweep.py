@@ -0,0 +1,232 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from matching.canonical import LOCATIONS, SPECIALIZATIONS, sync_terms
+from matching.snapshot import cached_features
+from matching.taxonomy import TAXONOMY
+
+# =====================================
+# What-if weight sweep
+# =====================================
+# Scores many (gpa_weight, location_weight) pairs against one load of the
+# feature store, instead of calling match_students_to_openings once per pair:
+#
+#   python -m matching.sweep /path/to/apprenticeship.db --gpa-weights 0 0.2 0.4 0.6 0.8 1 \
+#       --location-weights 0 0.1 0.2 0.4 0.8
+#
+# Without seat limits the weights barely matter: every student takes their
+# best slot, which is the first preferred location with an opening whenever
+# location_weight >= 0, so placements and GPA do not move. Seats are what make
+# the weights trade GPA against location rank, so the sweep runs the round the
+# way stable.py does: students propose to their (specialization, location)
+# buckets in preference order, and each bucket holds its openings.capacity
+# seats for the best scores among its proposers, bumping the weakest when a
+# better one arrives. When the taxonomy relates other specializations to the
+# student's, each preferred location lists those buckets too, right after the
+# student's own and at the same location rank.
+#
+# All configurations run side by side: the state is a configs x students
+# array, every round is a handful of array operations over all of them, and a
+# bucket of configuration c is the key c * buckets + bucket. Configurations
+# are processed in chunks of CHUNK_CELLS cells so memory stays flat.
+
+CHUNK_CELLS = 2_000_000
+
+
+class SweepFeatures:
+    """Candidate buckets, slots and seats, built once and shared by every configuration"""
+    def __init__(self, students, openings):
+        loc_count = len(LOCATIONS.names) or 1
+        opening_keys = openings.spec.astype(np.int64) * loc_count + openings.loc
+        bucket_keys, bucket_of_opening = np.unique(opening_keys, return_inverse=True)
+        self.seats = np.bincount(bucket_of_opening, weights=openings.capacity,
+                                 minlength=len(bucket_keys)).astype(np.int64)
+        self.gpa = students.gpa
+        self.gpa_values, self.gpa_level = np.unique(self.gpa, return_inverse=True)
+
+        # students x (slots x related specializations) -> bucket index, -1 where no opening has that
+        # specialization and location; column slot * width + j is the j-th related specialization at a slot
+        priority = students.locations.padded(dtype=np.int64)
+        related = related_specializations(max(len(SPECIALIZATIONS.names), 1))
+        width = related.shape[1]
+        spec = students.spec.astype(np.int64)
+        options = np.where(((spec >= 0) & (spec < len(related)))[:, None], related[np.clip(spec, 0, len(related) - 1)], -1)
+        keys = (options[:, None, :] * loc_count + priority[:, :, None]).reshape(len(spec), -1)
+        found = np.searchsorted(bucket_keys, keys)
+        valid = ((options[:, None, :] >= 0) & (priority[:, :, None] >= 0)
+                 & (priority[:, :, None] < loc_count)).reshape(keys.shape) & (found < len(bucket_keys))
+        valid &= bucket_keys[np.minimum(found, len(bucket_keys) - 1)] == keys
+        bucket = np.where(valid, found, -1)
+
+        # preference lists with the empty slots squeezed out, in slot order (location_weight >= 0)
+        # and in reverse (a negative location_weight makes the last listed city score highest)
+        slots = priority.shape[1]
+        self.prefs = np.empty((2,) + bucket.shape, dtype=np.int32)
+        self.pref_slots = np.empty((2,) + bucket.shape, dtype=np.int32)
+        for direction, order in enumerate((np.arange(slots), np.arange(slots)[::-1])):
+            columns = (order[:, None] * width + np.arange(width)).ravel()
+            ordered, ordered_valid = bucket[:, columns], valid[:, columns]
+            squeeze = np.argsort(~ordered_valid, axis=1, kind="stable")
+            self.prefs[direction] = np.take_along_axis(ordered, squeeze, axis=1)
+            self.pref_slots[direction] = columns[squeeze] // width
+
+    def __len__(self):
+        return len(self.gpa)
+
+
+def related_specializations(count):
+    """(count, width) matrix: row s is TAXONOMY.related(s) padded with -1"""
+    rows = [TAXONOMY.related(spec) for spec in range(count)]
+    related = np.full((count, max(map(len, rows))), -1, dtype=np.int64)
+    for spec, row in enumerate(rows):
+        related[spec, :len(row)] = row
+    return related
+
+
+def prepare(db_path, snapshot=None):
+    sync_terms(db_path)  # canonical ids and the specialization taxonomy
+    students, openings = cached_features(db_path, snapshot)
+    return SweepFeatures(students, openings)
+
+
+def run_chunk(features, gpa_weights, location_weights, seats):
+    """Deferred acceptance for a chunk of configurations; returns (held bucket key, held slot) per config x student"""
+    configs, students = len(gpa_weights), len(features)
+    buckets = len(seats)
+    slots = features.prefs.shape[2]
+    direction = (location_weights < 0).astype(np.intp)
+
+    # a score only depends on (config, GPA value, slot): rank those once so every round sorts integers
+    scores = (gpa_weights[:, None, None] * features.gpa_values[None, :, None]
+              + location_weights[:, None, None] * (3 - np.arange(slots)))
+    levels, ranks = np.unique(scores, return_inverse=True)
+    priority = (len(levels) - 1 - ranks).reshape(scores.shape)  # 0 = best score
+    # folding the student into the sort key lets the (much faster) unstable sort settle ties
+    unique_keys = (configs * buckets + 1) * len(levels) * configs * students < np.iinfo(np.int64).max
+
+    position = np.zeros(configs * students, dtype=np.int32)   # index into the student's preference list
+    held_key = np.full(configs * students, -1, dtype=np.int64)
+    held_priority = np.zeros(configs * students, dtype=np.int64)
+    held_slot = np.full(configs * students, -1, dtype=np.int32)
+    touched = np.zeros(configs * buckets + 1, dtype=bool)      # last cell stands in for "holds nothing"
+
+    proposing = np.arange(configs * students)
+    while proposing.size:
+        proposing = proposing[position[proposing] < slots]
+        config, student = np.divmod(proposing, students)
+        d, p = direction[config], position[proposing]
+        bucket = features.prefs[d, student, p]
+        live = bucket >= 0
+        proposing, config, student, bucket = proposing[live], config[live], student[live], bucket[live]
+        if not proposing.size:
+            break
+        slot = features.pref_slots[d[live], student, p[live]]
+        key = config * buckets + bucket
+        held_key[proposing] = key
+        held_priority[proposing] = priority[config, features.gpa_level[student], slot]
+        held_slot[proposing] = slot
+
+        # each bucket that got a proposal is contested again between its holders and the newcomers
+        touched[key] = True
+        entrants = np.flatnonzero(touched[np.where(held_key >= 0, held_key, configs * buckets)])
+        touched[key] = False
+
+        # by bucket, best score first, earlier student first on ties
+        entrant_key = held_key[entrants]
+        sort_key = entrant_key * len(levels) + held_priority[entrants]
+        if unique_keys:
+            order = np.argsort(sort_key * (configs * students) + entrants)
+        else:
+            order = np.argsort(sort_key, kind="stable")
+        sorted_key = entrant_key[order]
+        starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+        rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+
+        proposing = entrants[order[rank >= seats[sorted_key % buckets]]]
+        held_key[proposing] = -1
+        held_slot[proposing] = -1
+        position[proposing] += 1
+
+    return held_key.reshape(configs, students), held_slot.reshape(configs, students)
+
+
+def sweep(features, weights, capacities=True):
+    """Metrics for every (gpa_weight, location_weight) pair in `weights`, in the same order.
+
+    capacities=False lets every bucket take every student, which places each one
+    where match_students_to_openings(weighted=True) does.
+    """
+    weights = np.asarray(weights, dtype=np.float64).reshape(-1, 2)
+    students = len(features)
+    seats = features.seats if capacities else np.full(len(features.seats), max(students, 1), dtype=np.int64)
+    total_seats = int(features.seats.sum())
+    chunk = max(CHUNK_CELLS // max(students, 1), 1)
+
+    results = []
+    for start in range(0, len(weights), chunk):
+        gpa_weights, location_weights = weights[start:start + chunk].T
+        held_key, held_slot = run_chunk(features, gpa_weights, location_weights, seats)
+        placed = held_key >= 0
+        counts = placed.sum(axis=1)
+        gpa_totals = (placed * features.gpa).sum(axis=1)
+        slot_totals = np.where(placed, held_slot, 0).sum(axis=1)
+        for gpa_weight, location_weight, count, gpa_total, slot_total in zip(
+                gpa_weights.tolist(), location_weights.tolist(), counts.tolist(), gpa_totals.tolist(),
+                slot_totals.tolist()):
+            results.append({
+                "gpa_weight": gpa_weight,
+                "location_weight": location_weight,
+                "students": students,
+                "seats": total_seats,
+                "placed": count,
+                "unmatched": students - count,
+                "fill_rate": round(count / total_seats, 4) if capacities and total_seats else None,
+                "match_rate": round(count / students, 4) if students else 0.0,
+                "average_gpa_placed": round(gpa_total / count, 4) if count else None,
+                "average_priority": round(slot_total / count, 4) if count else None,
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare matching outcomes across a grid of score weights")
+    parser.add_argument("db_path")
+    parser.add_argument("--gpa-weights", type=float, nargs="+", default=[0.0, 0.2, 0.4, 0.6, 0.8, 1.0])
+    parser.add_argument("--location-weights", type=float, nargs="+", default=[0.0, 0.1, 0.2, 0.4, 0.6, 0.8])
+    parser.add_argument("--no-capacity", action="store_true", help="ignore openings.capacity (every bucket takes everyone)")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--snapshot", help="read the features through this matching.snapshot file")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db_path):
+        print(f"Database not found: {args.db_path}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    features = prepare(args.db_path, args.snapshot)
+    loaded = time.perf_counter()
+    results = sweep(features, list(itertools.product(args.gpa_weights, args.location_weights)), not args.no_capacity)
+    done = time.perf_counter()
+
+    print(f"{'gpa_w':>6} {'loc_w':>6} {'placed':>9} {'unmatched':>9} {'fill':>7} {'avg_gpa':>8} {'avg_prio':>8}")
+    for row in results:
+        fill = f"{row['fill_rate']:.2%}" if row["fill_rate"] is not None else "-"
+        print(f"{row['gpa_weight']:>6.2f} {row['location_weight']:>6.2f} {row['placed']:>9,} {row['unmatched']:>9,} "
+              f"{fill:>7} {row['average_gpa_placed'] or 0:>8.3f} {row['average_priority'] or 0:>8.3f}")
+    print(f"{len(results)} configurations, {len(features):,} students: "
+          f"features {loaded - start:.2f}s, sweep {done - loaded:.2f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+import argparse
+import bisect
+import sqlite3
+import sys
+
+from matching.canonical import SPECIALIZATIONS, load_terms, save_terms
+
+# =====================================
+# Specialization taxonomy
+# =====================================
+# Specializations form a tree (IT > Software > Backend), and a student and an
+# opening match on specialization when one is the other, an ancestor of it or
+# a descendant of it: a "Software" student is eligible for "Backend" openings
+# and for general "IT" ones, but not for "Networking" ones under IT.
+#
+# The tree is stored as materialized paths: every node is one row whose path
+# is the canonical names from the root down, each followed by SEPARATOR
+# ("it>software>backend>"). The primary key is that path, so a subtree is one
+# range scan of the key (path >= 'it>' AND path < 'it?') and a node's
+# ancestors are the prefixes of its own path, no recursive query needed.
+#
+# TAXONOMY keeps the tree in memory by canonical specialization id (loaded by
+# canonical.load_terms): eligible() walks the ancestors of both ids, O(depth),
+# and related() lists every id eligible for one, which the bucket-based
+# matchers use to file an opening under each specialization that may take it.
+# A specialization outside the tree is only related to itself, so without a
+# taxonomy every matcher behaves exactly as with plain id equality.
+#
+#   python -m matching.taxonomy add /path/to/apprenticeship.db "IT > Software > Backend"
+#   python -m matching.taxonomy show /path/to/apprenticeship.db
+
+SEPARATOR = ">"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS specialization_taxonomy (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    depth INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class TaxonomyError(Exception):
+    pass
+
+
+def create_table(cursor):
+    cursor.execute(SCHEMA)
+
+
+def prefix_range(path):
+    """Bounds of the key range holding `path` and everything below it"""
+    return path, path[:-1] + chr(ord(SEPARATOR) + 1)
+
+
+def display(path):
+    return " > ".join(path.split(SEPARATOR)[:-1])
+
+
+class Taxonomy:
+    def __init__(self):
+        self.paths = []        # every path, sorted (the same order as the primary key)
+        self.path_of = {}      # specialization id -> path
+        self.id_of = {}        # path -> specialization id
+        self.ancestor_ids = {}  # specialization id -> ids of its ancestors, root first
+        self.related_cache = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def load(self, cursor):
+        create_table(cursor)
+        cursor.execute("SELECT path FROM specialization_taxonomy ORDER BY path")
+        paths = [row[0] for row in cursor.fetchall()]
+        path_of, id_of, ancestor_ids = {}, {}, {}
+        for path in paths:
+            ids = tuple(SPECIALIZATIONS.intern(name) for name in path.split(SEPARATOR)[:-1])
+            path_of[ids[-1]] = path
+            id_of[path] = ids[-1]
+            ancestor_ids[ids[-1]] = ids[:-1]
+        # built aside and swapped in, so another thread matching meanwhile never sees a half-loaded tree
+        self.paths, self.path_of, self.id_of, self.ancestor_ids = paths, path_of, id_of, ancestor_ids
+        self.related_cache = {}
+
+    def ancestors(self, spec_id):
+        return self.ancestor_ids.get(spec_id, ())
+
+    def eligible(self, student_spec, opening_spec):
+        """Same specialization, or one an ancestor of the other"""
+        return (student_spec == opening_spec or student_spec in self.ancestor_ids.get(opening_spec, ())
+                or opening_spec in self.ancestor_ids.get(student_spec, ()))
+
+    def descendants(self, spec_id):
+        path = self.path_of.get(spec_id)
+        if path is None:
+            return ()
+        low, high = prefix_range(path)
+        start, stop = bisect.bisect_right(self.paths, low), bisect.bisect_left(self.paths, high)
+        return tuple(self.id_of[self.paths[i]] for i in range(start, stop))
+
+    def related(self, spec_id):
+        """spec_id first, then its ancestors (nearest first) and its descendants (in path order)"""
+        found = self.related_cache.get(spec_id)
+        if found is None:
+            found = self.related_cache[spec_id] = ((spec_id,) + self.ancestors(spec_id)[::-1]
+                                                   + self.descendants(spec_id))
+        return found
+
+
+TAXONOMY = Taxonomy()
+
+
+# -------------------------------------
+# Editing the tree
+# -------------------------------------
+def split_path(text):
+    names = [SPECIALIZATIONS.canonical_name(part) for part in text.split(SEPARATOR)]
+    if not all(names):
+        raise TaxonomyError(f"Empty specialization in {text!r}")
+    return names
+
+
+def node_path(cursor, name):
+    cursor.execute("SELECT path FROM specialization_taxonomy WHERE name = ?", (SPECIALIZATIONS.canonical_name(name),))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def add_path(conn, text):
+    """Add "IT > Software > Backend" (and any missing ancestors); a specialization can only sit in one place"""
+    cursor = conn.cursor()
+    create_table(cursor)
+    names = split_path(text)
+    path = ""
+    for depth, name in enumerate(names):
+        path += name + SEPARATOR
+        existing = node_path(cursor, name)
+        if existing is None:
+            cursor.execute("INSERT INTO specialization_taxonomy VALUES (?, ?, ?)", (path, name, depth))
+        elif existing != path:
+            conn.rollback()
+            raise TaxonomyError(f"{name!r} is already placed at {display(existing)}")
+    conn.commit()
+    load_terms(conn)
+    save_terms(conn)
+    return path
+
+
+def remove(conn, name):
+    """Remove a specialization and everything below it; returns the number of nodes removed"""
+    cursor = conn.cursor()
+    create_table(cursor)
+    path = node_path(cursor, name)
+    if path is None:
+        raise TaxonomyError(f"{name!r} is not in the taxonomy")
+    cursor.execute("DELETE FROM specialization_taxonomy WHERE path >= ? AND path < ?", prefix_range(path))
+    removed = cursor.rowcount
+    conn.commit()
+    load_terms(conn)
+    return removed
+
+
+def subtree(cursor, name=None):
+    """(path, depth) rows of a node and its descendants in tree order (the whole tree when name is None)"""
+    if name is None:
+        cursor.execute("SELECT path, depth FROM specialization_taxonomy ORDER BY path")
+        return cursor.fetchall()
+    path = node_path(cursor, name)
+    if path is None:
+        return []
+    cursor.execute("SELECT path, depth FROM specialization_taxonomy WHERE path >= ? AND path < ? ORDER BY path",
+                   prefix_range(path))
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Edit or show the specialization taxonomy")
+    parser.add_argument("command", choices=["add", "remove", "show", "check"])
+    parser.add_argument("db_path")
+    parser.add_argument("args", nargs="*", help='add: "IT > Software > Backend"; remove/show: NAME; '
+                                                "check: STUDENT_SPEC OPENING_SPEC")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    load_terms(conn)
+    TAXONOMY.load(conn.cursor())  # run as __main__, this module's TAXONOMY is not the one load_terms fills
+    try:
+        if args.command == "add":
+            for text in args.args:
+                print(f"Added {display(add_path(conn, text))}")
+        elif args.command == "remove":
+            for name in args.args:
+                print(f"Removed {remove(conn, name)} specializations")
+        elif args.command == "show":
+            for path, depth in subtree(conn.cursor(), args.args[0] if args.args else None):
+                print("  " * depth + path.split(SEPARATOR)[-2])
+        else:
+            if len(args.args) != 2:
+                parser.error("check needs STUDENT_SPEC OPENING_SPEC")
+            student, opening = (SPECIALIZATIONS.id(text) for text in args.args)
+            print("eligible" if TAXONOMY.eligible(student, opening) else "not eligible")
+    except TaxonomyError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
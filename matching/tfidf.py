@@ -0,0 +1,166 @@
+import argparse
+import math
+import sqlite3
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from matching.features import skill_ids
+from matching.skills import SKILLS
+from matching.snapshot import fingerprint
+
+# =====================================
+# TF-IDF skill similarity
+# =====================================
+# Ranks openings by how well a student's skills fit them instead of treating
+# any shared skill as a match. Every opening's required_skills becomes a sparse
+# row weighted by inverse document frequency (a skill half the openings ask
+# for counts for less than a rare one) and scaled to unit length, and the fit
+# of a student and an opening is the cosine of their vectors: 1 for the exact
+# skill set, lower the more skills either side has that the other does not.
+#
+# Everything stays in scipy.sparse CSR form. Students are scored in batches of
+# sparse products, each batch sized so its result has at most MAX_BATCH_NNZ
+# non-zeros, so 100k openings never turn into a dense students x openings
+# matrix.
+#
+# The index over the openings table is cached per database and rebuilt when
+# the openings change (matching.snapshot's change counters).
+
+MAX_BATCH_NNZ = 5_000_000
+
+
+class SkillIndex:
+    def __init__(self, opening_ids, required_skills):
+        """opening_ids and required_skills (comma separated text) in matching order"""
+        self.opening_ids = np.asarray(opening_ids, dtype=np.int64)
+        self.rows = {opening_id: row for row, opening_id in enumerate(self.opening_ids.tolist())}
+        skill_lists = [sorted(set(skill_ids(text or ""))) for text in required_skills]
+        self.width = len(SKILLS.names)
+
+        indices = np.fromiter((skill for skills in skill_lists for skill in skills), dtype=np.int32)
+        indptr = np.zeros(len(skill_lists) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(skills) for skills in skill_lists])
+        self.document_frequency = np.bincount(indices, minlength=self.width)
+        # smoothed idf, as if one extra opening asked for every skill once
+        self.idf = np.log((1 + len(skill_lists)) / (1 + self.document_frequency)) + 1
+        self.unseen_idf = math.log(1 + len(skill_lists)) + 1
+
+        self.matrix = normalized(csr_matrix((self.idf[indices], indices, indptr),
+                                            shape=(len(skill_lists), max(self.width, 1))))
+        self.transposed = self.matrix.T.tocsr()
+
+    def __len__(self):
+        return len(self.opening_ids)
+
+    def vectorize(self, skill_texts):
+        """Unit-length TF-IDF rows for student skill lists (skills no opening asks for still count in the norm)"""
+        data, indices, indptr, norms = [], [], [0], []
+        for text in skill_texts:
+            skills = sorted(set(skill_ids(text or "")))
+            known = [skill for skill in skills if skill < self.width]
+            weights = self.idf[known]
+            unseen = len(skills) - len(known)
+            norm = math.sqrt(float(weights @ weights) + unseen * self.unseen_idf ** 2)
+            data.extend((weights / norm).tolist() if norm else [])
+            indices.extend(known)
+            indptr.append(len(indices))
+        return csr_matrix((np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr)),
+                          shape=(len(skill_texts), max(self.width, 1)))
+
+    def fit(self, skills, opening_ids):
+        """Cosine fit of one student's skills with each of opening_ids (0 for unknown openings)"""
+        student = self.vectorize([skills])
+        rows = [self.rows.get(opening_id, -1) for opening_id in opening_ids]
+        known = [row for row in rows if row >= 0]
+        scores = (self.matrix[known] @ student.T).toarray().ravel() if known else []
+        found = dict(zip(known, scores))
+        return [float(found.get(row, 0.0)) for row in rows]
+
+    def batches(self, students):
+        """Split a student matrix into row ranges whose product with the index stays under MAX_BATCH_NNZ"""
+        # a student's row of the product has at most as many non-zeros as openings sharing one of its skills
+        student_rows = np.repeat(np.arange(students.shape[0]), np.diff(students.indptr))
+        bound = np.bincount(student_rows, weights=self.document_frequency[students.indices],
+                            minlength=students.shape[0])
+        bound = np.minimum(bound, len(self))
+
+        start, total = 0, 0
+        for i, size in enumerate(bound.tolist()):
+            if total and total + size > MAX_BATCH_NNZ:
+                yield start, i
+                start, total = i, 0
+            total += size
+        if start < students.shape[0]:
+            yield start, students.shape[0]
+
+    def top_k(self, students, k=10):
+        """For each row of a vectorize() matrix: (opening ids, fits) of its k best openings, best first"""
+        for start, stop in self.batches(students):
+            product = (students[start:stop] @ self.transposed).tocsr()
+            for i in range(stop - start):
+                begin, end = product.indptr[i], product.indptr[i + 1]
+                scores, rows = product.data[begin:end], product.indices[begin:end]
+                if len(scores) > k:
+                    # everything tied with the k-th best stays in, so ties go to the lower opening id
+                    keep = scores >= -np.partition(-scores, k - 1)[k - 1]
+                    scores, rows = scores[keep], rows[keep]
+                order = np.lexsort((self.opening_ids[rows], -scores))[:k]
+                yield self.opening_ids[rows[order]], scores[order]
+
+
+def normalized(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return csr_matrix(matrix.multiply(1 / norms[:, None]))
+
+
+def build_index(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT opening_id, required_skills FROM openings ORDER BY opening_id")
+    rows = cursor.fetchall()
+    return SkillIndex([row[0] for row in rows], [row[1] for row in rows])
+
+
+# db path -> (openings fingerprint, SkillIndex)
+INDEXES = {}
+
+
+def cached_index(db_path):
+    """The SkillIndex of a database, rebuilt only after openings were added, edited or deleted"""
+    conn = sqlite3.connect(db_path)
+    try:
+        found = fingerprint(conn)
+        key = (found["openings"], found["versions"].get("openings")) if found else None
+        cached = INDEXES.get(db_path)
+        if key is None or cached is None or cached[0] != key:
+            cached = INDEXES[db_path] = (key, build_index(conn))
+    finally:
+        conn.close()
+    return cached[1]
+
+
+def rank_by_fit(index, skills, openings):
+    """Sort opening rows (opening_id first) by fit, best first; returns (fit, row) pairs"""
+    fits = index.fit(skills, [row[0] for row in openings])
+    return sorted(zip(fits, openings), key=lambda pair: (-pair[0], pair[1][0]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Best-fitting openings per student by TF-IDF skill similarity")
+    parser.add_argument("db_path")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--limit", type=int, help="only the first N students")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    index = build_index(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT student_id, skills FROM students ORDER BY student_id"
+                   + (" LIMIT ?" if args.limit else ""), (args.limit,) if args.limit else ())
+    students = cursor.fetchall()
+    conn.close()
+
+    matrix = index.vectorize([row[1] for row in students])
+    for (student_id, _), (opening_ids, fits) in zip(students, index.top_k(matrix, args.top_k)):
+        print(student_id, " ".join(f"{opening_id}:{fit:.3f}" for opening_id, fit in zip(opening_ids.tolist(), fits.tolist())))
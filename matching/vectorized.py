@@ -0,0 +1,98 @@
+import numpy as np
+
+from matching.canonical import LOCATIONS, SPECIALIZATIONS
+from matching.taxonomy import TAXONOMY
+
+# =====================================
+# Vectorized scoring engine (NumPy)
+# =====================================
+# Every opening in the same (specialization, location) bucket gets the same
+# score for a student, so the only candidate per preference slot is the first
+# opening of that bucket. The engine builds a students x slots location-priority
+# matrix, scores all slots at once and takes each student's argmax.
+# Specializations and locations are coded by their canonical ids; a student's
+# (specialization, location) bucket also holds the openings of the
+# specializations the taxonomy relates to it, so its candidate is the first
+# opening among all of those.
+
+
+def encode_openings(openings):
+    """Keep the first opening of every (specialization id, location id) bucket"""
+    first = {}
+    for row, opening in enumerate(openings):
+        loc = LOCATIONS.id(opening[2])
+        for spec in TAXONOMY.related(SPECIALIZATIONS.id(opening[1])):
+            first.setdefault((spec, loc), row)
+
+    first_opening = np.full((len(SPECIALIZATIONS.names) or 1, len(LOCATIONS.names) or 1), -1, dtype=np.int64)
+    for (spec, loc), row in first.items():
+        first_opening[spec, loc] = row
+    return first_opening
+
+
+def encode_students(students, first_opening):
+    """Load GPA, specialization ids and the location-priority matrix into arrays"""
+    spec_count, loc_count = first_opening.shape
+    location_lists = [LOCATIONS.id_list(student[6]) for student in students]
+    slots = max((len(locs) for locs in location_lists), default=1)
+
+    gpa = np.fromiter((student[4] for student in students), dtype=np.float64, count=len(students))
+    spec = np.fromiter((SPECIALIZATIONS.id(student[5]) for student in students), dtype=np.int64, count=len(students))
+    spec[spec >= spec_count] = -1  # interned after the openings, so no opening has it
+    priority = np.full((len(students), slots), -1, dtype=np.int64)
+    for i, locs in enumerate(location_lists):
+        priority[i, :len(locs)] = locs
+    priority[priority >= loc_count] = -1
+    return gpa, spec, priority
+
+
+def best_openings(students, openings, gpa_weight=0.6, location_weight=0.4):
+    """Return (opening row, priority, score) arrays; opening row is -1 when a student has no match"""
+    first_opening = encode_openings(openings)
+    gpa, spec, priority = encode_students(students, first_opening)
+    return score_slots(gpa, spec, priority, first_opening, gpa_weight, location_weight)
+
+
+def best_openings_features(students, openings, gpa_weight=0.6, location_weight=0.4):
+    """best_openings for a matching.features StudentFeatures/OpeningFeatures pair (no per-row Python objects)"""
+    spec_count, loc_count = len(SPECIALIZATIONS.names) or 1, len(LOCATIONS.names) or 1
+    keys = openings.spec.astype(np.int64) * loc_count + openings.loc
+    buckets, first_rows = np.unique(keys, return_index=True)
+    # int32 codes and rows keep the students x slots temporaries at half the size
+    first_opening = np.full(spec_count * loc_count, -1, dtype=np.int32)
+    first_opening[buckets] = first_rows
+    first_opening = widen_related(first_opening.reshape(spec_count, loc_count))
+
+    spec = students.spec.copy()
+    spec[spec >= spec_count] = -1
+    priority = students.locations.padded(dtype=np.int32)
+    priority[priority >= loc_count] = -1
+    return score_slots(students.gpa, spec, priority, first_opening, gpa_weight, location_weight)
+
+
+def widen_related(first_opening):
+    """first_opening[spec, loc] taken over every specialization related to spec (the lowest row wins)"""
+    if not len(TAXONOMY):
+        return first_opening
+    missing = np.iinfo(first_opening.dtype).max
+    rows = np.where(first_opening >= 0, first_opening, missing)
+    widened = rows.copy()
+    for spec in range(len(rows)):
+        related = [other for other in TAXONOMY.related(spec) if other < len(rows)]
+        if len(related) > 1:
+            widened[spec] = rows[related].min(axis=0)
+    return np.where(widened == missing, -1, widened).astype(first_opening.dtype)
+
+
+def score_slots(gpa, spec, priority, first_opening, gpa_weight, location_weight):
+    valid = (spec[:, None] >= 0) & (priority >= 0)
+    candidates = np.where(valid, first_opening[np.maximum(spec, 0)[:, None], np.maximum(priority, 0)], -1)
+
+    slot_weight = (3 - np.arange(priority.shape[1])) * location_weight
+    scores = gpa[:, None] * gpa_weight + slot_weight[None, :]
+    scores[candidates < 0] = -np.inf
+
+    best_slot = np.argmax(scores, axis=1)
+    rows = np.arange(len(gpa))
+    best_row = candidates[rows, best_slot]
+    return best_row, best_slot, scores[rows, best_slot]
@@ -33,10 +33,16 @@ CREATE TABLE IF NOT EXISTS openings (
     location TEXT NOT NULL,
     stipend INTEGER NOT NULL CHECK(stipend > 0),
     required_skills TEXT NOT NULL,
+    capacity INTEGER NOT NULL DEFAULT 1 CHECK(capacity > 0),
     FOREIGN KEY (company_id) REFERENCES companies(company_id)
 )
 """)
 
+# older databases were created before openings had a seat count
+cursor.execute("PRAGMA table_info(openings)")
+if "capacity" not in [column[1] for column in cursor.fetchall()]:
+    cursor.execute("ALTER TABLE openings ADD COLUMN capacity INTEGER NOT NULL DEFAULT 1 CHECK(capacity > 0)")
+
 conn.commit()
 conn.close()
 
@@ -79,14 +85,14 @@ def get_all_companies():
     return result
 
 # E. Main opening functions
-def add_opening(company_id, specialization, location, stipend, required_skills):
+def add_opening(company_id, specialization, location, stipend, required_skills, capacity=1):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     cursor.execute("""
     INSERT INTO openings (
-        company_id, specialization, location, stipend, required_skills
-    ) VALUES (?, ?, ?, ?, ?)
-    """, (company_id, specialization, location, stipend, required_skills))
+        company_id, specialization, location, stipend, required_skills, capacity
+    ) VALUES (?, ?, ?, ?, ?, ?)
+    """, (company_id, specialization, location, stipend, required_skills, capacity))
     conn.commit()
     conn.close()
 
@@ -105,11 +111,19 @@ def delete_opening(opening_id):
     conn.commit()
     conn.close()
 
+# عدد المقاعد لكل فرصة
+def get_opening_capacities():
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT opening_id, capacity FROM openings")
+    result = dict(cursor.fetchall())
+    conn.close()
+    return result
+
 def view_openings():
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM openings")
+    cursor.execute("SELECT opening_id, specialization, location, stipend, required_skills FROM openings")
     rows = cursor.fetchall()
-    for row in rows:
-        print(row)
     conn.close()
+    return rows
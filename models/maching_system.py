@@ -1,49 +1,172 @@
 import sqlite3
-from models.student import view_students
-from models.company import view_openings
+import numpy as np
+from models.student import db_path, view_students, iter_students
+from models.company import view_openings, get_opening_capacities
+from matching.assignment import assign_globally
+from matching.parallel import match_in_parallel
+from matching.features import MatchTable
+from matching.runs import UNMATCHED, columns_from_matches, columns_from_rows, run_row, save_run
+from matching.snapshot import cached_features
+from matching.vectorized import best_openings_features
+from matching import candidates
+from matching.canonical import load_terms, save_terms
+from matching.geo import bucket_openings, load_cities
+from matching.sweep import SweepFeatures, sweep
 
 class MatchingSystem:
-    def __init__(self):
-        self.matches = []
+    def __init__(self, conn=None):
+        # conn: load the canonical ids and city coordinates through this connection instead of db_path
+        self.matches = []       # match dicts of the loop, parallel and global runs
+        self.match_table = None  # the last numpy run, kept columnar (a MatchTable)
+        self.solve_stats = {}
+        self.snapshot_path = None  # set to read the numpy engine's features from a matching.snapshot file
+        self.keep_runs = True  # every run goes to match_runs (matching.runs) so runs can be diffed; clear to skip
+        self.last_run_id = None
+        own_conn = conn is None
+        if own_conn:
+            conn = sqlite3.connect(db_path)
+        load_terms(conn)  # reuse the canonical location/specialization ids of earlier runs
+        save_terms(conn)
+        load_cities(conn)
+        if own_conn:
+            conn.close()
+
+    def match_students_to_openings(self, weighted=False, gpa_weight=0.6, location_weight=0.4, engine="loop", workers=1,
+                                   min_skill_overlap=0, top_k=None, radius_km=0, half_life_km=None):
+        # top_k returns each student's K best openings (ranked 1..K) instead of only the best one
+        # radius_km > 0 also matches openings in cities that close to a preferred location; the location
+        # part of the weighted score halves every half_life_km (default radius_km / 2)
+        if (min_skill_overlap or top_k or radius_km) and (engine != "loop" or workers > 1):
+            raise ValueError("min_skill_overlap, top_k and radius_km are only supported by the single-process loop engine")
+        if engine not in ("loop", "numpy"):
+            raise ValueError(f"Unknown engine {engine!r}: use 'loop' or 'numpy' "
+                             "(the global assignment is assign_students_to_openings)")
+        if engine == "numpy" and workers > 1:
+            raise ValueError("workers > 1 is only supported by the loop engine (the numpy engine runs in one process)")
+
+        parameters = {"weighted": weighted, "gpa_weight": gpa_weight, "location_weight": location_weight,
+                      "workers": workers, "min_skill_overlap": min_skill_overlap, "top_k": top_k,
+                      "radius_km": radius_km, "half_life_km": half_life_km}
+        if engine == "numpy":
+            return self.match_students_vectorized(weighted, gpa_weight, location_weight, parameters)
 
-    def match_students_to_openings(self, weighted=False, gpa_weight=0.6, location_weight=0.4):
         students = view_students()
         openings = view_openings()
 
         if not students or not openings:
             return "No data available", []
 
+        if workers > 1:
+            return self.match_students_parallel(students, openings, workers, weighted, gpa_weight, location_weight,
+                                                parameters)
+
+        buckets = bucket_openings(openings)
+
+        best = []  # each student's rank-1 match, for the saved run
         for student in students:
-            student_id, name, mobile, email, gpa, spec, preferred_locations, skills = student
-            location_list = [loc.strip() for loc in preferred_locations.split(',')]
-
-            relevant_openings = [op for op in openings if op[1] == spec]
-            student_matches = []
-
-            for priority, loc in enumerate(location_list):
-                for opening in relevant_openings:
-                    opening_id, o_spec, o_loc, stipend, req_skills = opening
-                    if o_loc == loc:
-                        if weighted:
-                            score = (gpa * gpa_weight) + ((3 - priority) * location_weight)
-                        else:
-                            score = None
-                        student_matches.append({
-                            "student_name": name,
-                            "gpa": gpa,
-                            "opening_id": opening_id,
-                            "location": o_loc,
-                            "stipend": stipend,
-                            "priority": priority,
-                            "score": score
-                        })
-
-            if student_matches:
-                if weighted:
-                    best_match = sorted(student_matches, key=lambda m: -m['score'])[0]
-                else:
-                    best_match = sorted(student_matches, key=lambda m: (m['priority'], -m['gpa']))[0]
-                self.matches.append(best_match)
+            student_matches = self.student_matches(student, buckets, weighted, gpa_weight, location_weight,
+                                                   min_skill_overlap, top_k, radius_km, half_life_km)
+            self.matches.extend(student_matches)
+            best.append(student_matches[0])
+
+        self.save_run("loop", parameters, [student[0] for student in students], *columns_from_matches(best))
+        return "success", self.matches
+
+    def stream_matches(self, weighted=False, gpa_weight=0.6, location_weight=0.4, min_skill_overlap=0, top_k=None,
+                       batch_size=1000, radius_km=0, half_life_km=None):
+        # streaming mode: students are read in fetchmany batches and matches are yielded one by one,
+        # so memory stays at the openings plus one batch however large the students table grows
+        buckets = bucket_openings(view_openings())
+
+        student_ids, best = [], []  # each student's rank-1 match as a run row, when the run is kept
+        for student in iter_students(batch_size):
+            student_matches = self.student_matches(student, buckets, weighted, gpa_weight, location_weight,
+                                                   min_skill_overlap, top_k, radius_km, half_life_km)
+            if self.keep_runs:
+                student_ids.append(student[0])
+                best.append(run_row(student_matches[0]))
+            yield from student_matches
+
+        # saved as a loop run: the same matches as match_students_to_openings with these parameters
+        if student_ids:
+            self.save_run("loop", {"weighted": weighted, "gpa_weight": gpa_weight, "location_weight": location_weight,
+                                   "workers": 1, "min_skill_overlap": min_skill_overlap, "top_k": top_k,
+                                   "radius_km": radius_km, "half_life_km": half_life_km},
+                          student_ids, *columns_from_rows(best))
+
+    def student_matches(self, student, buckets, weighted, gpa_weight, location_weight, min_skill_overlap=0,
+                        top_k=None, radius_km=0, half_life_km=None):
+        # matching.candidates: shared with the matching jobs, which do not import the models
+        return candidates.student_matches(student, buckets, weighted, gpa_weight, location_weight, min_skill_overlap,
+                                          top_k, radius_km, half_life_km)
+
+    def match_students_vectorized(self, weighted, gpa_weight, location_weight, parameters=None):
+        # reads students and openings into the columnar feature store and keeps the results as arrays
+        # (a MatchTable, returned and kept in self.match_table), so no tuple or dict is held per student;
+        # self.matches stays the list of dicts of the other engines
+        students, openings = cached_features(db_path, self.snapshot_path)
+        if not len(students) or not len(openings):
+            return "No data available", []
+
+        # the unweighted sort (priority, -gpa) picks the same slot as any positive location weight
+        if not weighted:
+            gpa_weight, location_weight = 0.0, 1.0
+        best_row, best_slot, scores = best_openings_features(students, openings, gpa_weight, location_weight)
+
+        table = MatchTable(students, openings, best_row, best_slot, scores if weighted else None)
+        self.save_run("numpy", parameters or {"weighted": weighted, "gpa_weight": gpa_weight,
+                                              "location_weight": location_weight},
+                      students.student_id.tolist(),
+                      np.where(best_row >= 0, openings.opening_id[best_row], UNMATCHED),
+                      np.where(best_row >= 0, best_slot, 99), scores if weighted else None)
+        self.match_table = table
+        return "success", table
+
+    def sweep_weights(self, weights, capacities=True):
+        # what-if mode: metrics (fill rate, average GPA placed, unmatched...) for every
+        # (gpa_weight, location_weight) pair in one pass over features loaded once
+        students, openings = cached_features(db_path, self.snapshot_path)
+        return sweep(SweepFeatures(students, openings), weights, capacities)
+
+    def match_students_parallel(self, students, openings, workers, weighted, gpa_weight, location_weight,
+                                parameters=None):
+        placements = match_in_parallel(students, openings, workers, weighted, gpa_weight, location_weight)
+        self.record_placements(students, openings, placements)
+        self.save_run("parallel", parameters or {}, [student[0] for student in students],
+                      *columns_from_matches(self.matches[-len(students):]))
+        return "success", self.matches
+
+    def assign_students_to_openings(self, gpa_weight=0.6, location_weight=0.4):
+        # global mode: respects openings.capacity and maximizes the total weighted score
+        students = view_students()
+        openings = view_openings()
+
+        if not students or not openings:
+            return "No data available", []
+
+        placements, self.solve_stats = assign_globally(
+            students, openings, get_opening_capacities(), gpa_weight, location_weight)
+        self.record_placements(students, openings, placements, "No open seats match your criteria")
+        self.save_run("global", {"gpa_weight": gpa_weight, "location_weight": location_weight},
+                      [student[0] for student in students], *columns_from_matches(self.matches[-len(students):]))
+        return "success", self.matches
+
+    def record_placements(self, students, openings, placements, message="No openings match your criteria"):
+        # placements[i] is (opening row, priority, score) or None for students[i]
+        for student, placement in zip(students, placements):
+            name, gpa = student[1], student[4]
+            if placement:
+                row, priority, score = placement
+                opening_id, o_spec, o_loc, stipend, req_skills = openings[row]
+                self.matches.append({
+                    "student_name": name,
+                    "gpa": gpa,
+                    "opening_id": opening_id,
+                    "location": o_loc,
+                    "stipend": stipend,
+                    "priority": priority,
+                    "score": score
+                })
             else:
                 self.matches.append({
                     "student_name": name,
@@ -52,20 +175,26 @@ class MatchingSystem:
                     "location": "N/A",
                     "stipend": "N/A",
                     "priority": 99,
-                    "message": "No openings match your criteria"
+                    "message": message
                 })
 
-        return "success", self.matches
+    def save_run(self, mode, parameters, student_ids, opening_ids, priorities, scores):
+        # one versioned result set per run; matching.runs diffs them so only changed students are notified
+        if not self.keep_runs:
+            return
+        conn = sqlite3.connect(db_path)
+        self.last_run_id = save_run(conn, mode, parameters, student_ids, opening_ids, priorities, scores)
+        conn.close()
 
-    def display_matches(self):
+    def display_matches(self, matches=None):
         print("Student Name | GPA | Opening ID | Location | Stipend")
-        for match in self.matches:
+        for match in self.matches if matches is None else matches:
             print(f"{match['student_name']} | {match['gpa']} | {match['opening_id']} | {match['location']} | {match['stipend']}")
 
 if __name__ == "__main__":
     matcher = MatchingSystem()
-    status, matches = matcher.match_students_to_openings(weighted=True)  # Set to False if you don't want weighted logic
+    status, matches = matcher.match_students_to_openings(weighted=True)  # Set to False if you don't want weighted logic, engine="numpy" for large cohorts
     if status == "success":
-        matcher.display_matches()
+        matcher.display_matches(matches)
     else:
         print(status)
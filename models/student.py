@@ -5,6 +5,8 @@
 import os
 import sqlite3
 
+from matching.streaming import iter_rows
+
 db_path = os.path.abspath(
     os.path.join(
         os.path.dirname(__file__),
@@ -72,6 +74,30 @@ def get_all_students():
     conn.close()
     return result
 
+def view_students():
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT student_id, name, mobile_number, email, gpa, specialization, preferred_locations, skills
+    FROM students
+    """)
+    result = cursor.fetchall()
+    conn.close()
+    return result
+
+# نفس view_students لكن على دفعات (fetchmany) بدل fetchall
+def iter_students(batch_size=1000):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT student_id, name, mobile_number, email, gpa, specialization, preferred_locations, skills
+    FROM students
+    """)
+    try:
+        yield from iter_rows(cursor, batch_size)
+    finally:
+        conn.close()
+
 def get_student_by_email_and_password(email, password):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -3,23 +3,45 @@ import sys
 import os
 import sqlite3
 import random
+import queue
+import threading
 
 
 from PyQt5.QtWidgets import *
 from PyQt5.uic import loadUi
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from functools import partial
 
 import smtplib                                   # for the emails
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from matching.canonical import LOCATIONS, load_terms, save_terms
+from matching.geo import create_city_table
+from matching.incremental import IncrementalMatcher
+from matching.skills import SKILLS
+from matching.materialized import install as install_match_table, refresh_pending
+from matching.ranking import PAGE_SIZE, applicant_count, install as install_rankings, ranked_page
+from matching.snapshot import install as install_change_counters
+from matching.similar import SimilarOpenings
+from matching import jobs, seats
+from matching.rounds import NO_OPEN_ROUND, ROUND_FROZEN, install as install_rounds
+from matching.tfidf import cached_index, rank_by_fit
+
 
 # -------------------------------------
 # Database Path Configuration
 # -------------------------------------
 db_path = os.path.abspath(os.path.join(os.path.dirname(__file__),'database', 'apprenticeship.db'))
 
+# -------------------------------------
+# Admin Features
+# -------------------------------------
+# There is no admin role yet: the Matching Jobs tab (matching over every student) only shows
+# on the company dashboard when the app is started with APPRENTICESHIP_ADMIN=1
+admin_jobs = os.environ.get("APPRENTICESHIP_ADMIN") == "1"
+
 # =====================================
 # Authentication Setup (MC4 Role)
 # =====================================
@@ -199,10 +221,16 @@ CREATE TABLE IF NOT EXISTS openings (
     location TEXT NOT NULL,
     stipend INTEGER NOT NULL CHECK(stipend > 0),
     required_skills TEXT NOT NULL,
+    capacity INTEGER NOT NULL DEFAULT 1 CHECK(capacity > 0),
     FOREIGN KEY (company_name) REFERENCES companies(company_name)
 )
 """)
 
+# Seat count for databases created before openings had a capacity
+cursor.execute("PRAGMA table_info(openings)")
+if "capacity" not in [column[1] for column in cursor.fetchall()]:
+    cursor.execute("ALTER TABLE openings ADD COLUMN capacity INTEGER NOT NULL DEFAULT 1 CHECK(capacity > 0)")
+
 # Applications Table
 cursor.execute("""
 CREATE TABLE IF NOT EXISTS applications (
@@ -210,11 +238,43 @@ CREATE TABLE IF NOT EXISTS applications (
     student_id TEXT NOT NULL,
     opening_id INTEGER NOT NULL,
     status TEXT DEFAULT 'pending',
+    preference_rank INTEGER,
     FOREIGN KEY (student_id) REFERENCES students(student_id),
     FOREIGN KEY (opening_id) REFERENCES openings(opening_id)
 )
 """)
 
+# Student's own ranking of the openings they applied to (1 = first choice), used by the stable matching round
+cursor.execute("PRAGMA table_info(applications)")
+if "preference_rank" not in [column[1] for column in cursor.fetchall()]:
+    cursor.execute("ALTER TABLE applications ADD COLUMN preference_rank INTEGER")
+
+# Canonical location/specialization ids from earlier runs (the matchers compare these ids)
+load_terms(conn)
+
+# City coordinates for radius matching; add rows here for cities the built-in list lacks
+create_city_table(cursor)
+
+# Materialized student/opening matches used by the opportunities tab (kept current by triggers)
+install_match_table(conn)
+save_terms(conn)
+
+# Precomputed applicant scores for the company applications tab (kept current by triggers)
+install_rankings(conn)
+
+# Seats and ranked waitlists for accepting applications (opening_waitlist)
+seats.install(conn)
+
+# Application rounds: applications are taken while a round is open and frozen once it closes,
+# until `python -m matching.rounds serve` has run its matching job
+install_rounds(conn)
+
+# Change counters on students/openings, used to tell when cached indexes (skill fit, snapshots) are stale
+install_change_counters(conn)
+
+# Background matching jobs: progress and checkpoints, so a stopped run resumes where it left off
+jobs.install(conn)
+
 
 conn.commit()
 conn.close()
@@ -246,6 +306,55 @@ def send_email(to_email, subject, body):
         print(f"Failed to send email: {str(e)}")
 
 
+# =====================================
+# Incremental matching (kept up to date by the dashboards)
+# =====================================
+
+# Building the matcher loads every student and opening, so it is built on its own thread, which then
+# owns it (and its connection); the dashboards only queue deltas, applied in order once it is built.
+# Every delta re-reads its row, so one queued while the matcher is still loading is harmless.
+
+incremental_updates = queue.Queue()
+incremental_thread = None
+
+def incremental_worker():
+    matcher = IncrementalMatcher(db_path)
+    while True:
+        method, key = incremental_updates.get()
+        try:
+            getattr(matcher, method)(key)
+        except Exception as e:
+            print(f"Incremental matching failed on {method}({key!r}): {str(e)}")
+
+def queue_incremental_update(method, key):
+    # method is an IncrementalMatcher delta: opening_added, opening_deleted or student_changed
+    global incremental_thread
+    if incremental_thread is None:
+        incremental_thread = threading.Thread(target=incremental_worker, name="incremental-matcher", daemon=True)
+        incremental_thread.start()
+    incremental_updates.put((method, key))
+
+
+def notify_promoted(application_ids):
+    # a seat opened up: tell the students promoted from the waitlist
+    if not application_ids:
+        return
+    conn = seats.connect(db_path)
+    for _, name, email, company_name in seats.contacts(conn, application_ids):
+        send_email(to_email=email, subject="A seat opened up for you",
+                   body=f"Hi {name}, a seat opened up and you have been accepted for {company_name}.")
+    conn.close()
+
+
+similar_openings = None
+
+def get_similar_openings():
+    global similar_openings
+    if similar_openings is None:
+        similar_openings = SimilarOpenings(db_path)
+    return similar_openings
+
+
 # =====================================
 # Login Window UI (LoginDialog)
 # =====================================
@@ -343,6 +452,7 @@ class StudentSignup(QDialog):
 
         try:
             student_auth.add_student(student_id, name, mobile, email, password, gpa, specialization, locations, skills)
+            queue_incremental_update("student_changed", student_id)
             QMessageBox.information(self, "Success", "Student registered successfully")
 
             send_email(to_email=email,subject="Confirming Register", body=f"Hello {name}, Welcom to our apprenticeship system")
@@ -472,6 +582,7 @@ class StudentDashboard(QMainWindow):
         self.student_oppourtunities_button.clicked.connect(self.open_oppourtunities_tab)
         self.student_logout_button.clicked.connect(self.logout)
         self.save_changes_button.clicked.connect(self.save_changes)
+        self.student_rank_by_fit_checkbox.toggled.connect(self.load_opportunities)
         
 
     def open_info_tab(self):
@@ -576,6 +687,7 @@ class StudentDashboard(QMainWindow):
             cursor.execute(f"UPDATE students SET {updates} WHERE student_id = ?", values)
             conn.commit()
             conn.close()
+            queue_incremental_update("student_changed", self.current_student_id)
             QMessageBox.information(self, "Success", "Your information has been updated successfully!")
             self.load_student_info()
         except Exception as e:
@@ -593,59 +705,70 @@ class StudentDashboard(QMainWindow):
             QMessageBox.warning(self, "Error", "Student info not found.")
             return
 
-        specialization = student[6].strip().lower()
-        skills = set(s.strip().lower() for s in student[8].split(","))
-        locations = set(l.strip().lower() for l in student[7].split(","))
+        skills = SKILLS.encode(student[8])
+        locations = set(LOCATIONS.id_list(student[7]))
 
         if not skills or not locations:
             QMessageBox.warning(self, "Error", "Your profile is incomplete.")
             return
 
-        # the oppertunities that the student applied to
-        cursor.execute("SELECT opening_id FROM applications WHERE student_id = ?", (self.current_student_id,))
-        applied = set(row[0] for row in cursor.fetchall())
-
-        # all oppertunities
-        cursor.execute("SELECT opening_id, company_name, specialization, location, stipend, required_skills FROM openings")
-        openings = cursor.fetchall()
+        # eligible openings the student has not applied to, from the materialized matches table
+        refresh_pending(conn)
+        cursor.execute("""
+            SELECT o.opening_id, o.company_name, o.specialization, o.location, o.stipend, o.required_skills
+            FROM student_opening_matches m
+            JOIN openings o ON o.opening_id = m.opening_id
+            WHERE m.student_id = ? AND m.applied = 0
+            ORDER BY m.opening_id
+        """, (self.current_student_id,))
+        matching = cursor.fetchall()
         conn.close()
 
-        matching = []
-        for opening in openings:
-            opening_id, company_name, required_specialization, required_location, stipend_amount, required_skills_text = opening
-
-            if opening_id in applied:
-                continue
-
-            if required_specialization.strip().lower() != specialization:
-                continue
+        # TF-IDF cosine of the student's skills and each opening's required skills, best fit first
+        ranked = rank_by_fit(cached_index(db_path), student[8], matching)
+        if not self.student_rank_by_fit_checkbox.isChecked():
+            ranked.sort(key=lambda pair: pair[1][0])
 
-            if required_location.strip().lower() not in locations:
-                continue
-
-            required_skills_set = set(skill.strip().lower() for skill in required_skills_text.split(","))
-            if not skills & required_skills_set:
-                continue
-
-            matching.append(opening)
-
-        headers = ["Company", "Specialization", "Location", "Stipend", "Required Skills", "Apply"]
-        self.student_oppourtunities_table.setRowCount(len(matching))
+        headers = ["Company", "Specialization", "Location", "Stipend", "Required Skills", "Fit", "Apply", "Similar"]
+        self.student_oppourtunities_table.setRowCount(len(ranked))
         self.student_oppourtunities_table.setColumnCount(len(headers))
         self.student_oppourtunities_table.setHorizontalHeaderLabels(headers)
 
-        for row, data in enumerate(matching):
+        for row, (fit, data) in enumerate(ranked):
             for col in range(1, 6):  
                 self.student_oppourtunities_table.setItem(row, col - 1, QTableWidgetItem(str(data[col])))
+            self.student_oppourtunities_table.setItem(row, 5, QTableWidgetItem(f"{fit:.0%}"))
 
             btn = QPushButton("Apply")
             btn.clicked.connect(partial(self.apply_to_opening, data[0]))
-            self.student_oppourtunities_table.setCellWidget(row, 5, btn)
+            self.student_oppourtunities_table.setCellWidget(row, 6, btn)
+
+            similar_btn = QPushButton("Similar")
+            similar_btn.clicked.connect(partial(self.show_similar_openings, data[0]))
+            self.student_oppourtunities_table.setCellWidget(row, 7, similar_btn)
 
         self.student_oppourtunities_table.resizeColumnsToContents()
         self.student_oppourtunities_table.horizontalHeader().setStretchLastSection(True)
 
 
+    def show_similar_openings(self, opening_id):
+        # openings of the same specialization with the most overlapping required skills (MinHash/LSH index)
+        similar = get_similar_openings().similar(opening_id, 5)
+        if not similar:
+            QMessageBox.information(self, "Similar Openings", "No similar openings found.")
+            return
+
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        lines = []
+        for other_id, similarity in similar:
+            cursor.execute("SELECT company_name, specialization, location, stipend FROM openings WHERE opening_id = ?", (other_id,))
+            opening = cursor.fetchone()
+            if opening:
+                lines.append(f"{opening[0]} - {opening[1]} - {opening[2]} - stipend {opening[3]} ({similarity:.0%} skill overlap)")
+        conn.close()
+        QMessageBox.information(self, "Similar Openings", "\n".join(lines) or "No similar openings found.")
+
     def apply_to_opening(self, opening_id):
         try:
             conn = sqlite3.connect(db_path)
@@ -658,8 +781,11 @@ class StudentDashboard(QMainWindow):
             conn.close()
             QMessageBox.information(self, "Success", "You applied successfully.")
             self.load_opportunities()
-        except sqlite3.IntegrityError:
-            QMessageBox.warning(self, "Warning", "You already applied for this opening.")
+        except sqlite3.IntegrityError as e:
+            if str(e) in (NO_OPEN_ROUND, ROUND_FROZEN):
+                QMessageBox.warning(self, "Warning", f"{e}.")
+            else:
+                QMessageBox.warning(self, "Warning", "You already applied for this opening.")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Something went wrong: {e}")
 
@@ -667,26 +793,55 @@ class StudentDashboard(QMainWindow):
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT o.company_name, o.specialization, o.location, o.stipend, o.required_skills, a.status
+            SELECT o.company_name, o.specialization, o.location, o.stipend, o.required_skills, a.status, a.application_id
             FROM applications a
             JOIN openings o ON a.opening_id = o.opening_id
             WHERE a.student_id = ?
         """, (self.current_student_id,))
         applications = cursor.fetchall()
+        positions = {app[6]: seats.waitlist_position(conn, app[6]) for app in applications if app[5] == "waitlisted"}
         conn.close()
 
-        headers = ["Company", "Specialization", "Location", "Stipend", "Skills", "Status"]
+        headers = ["Company", "Specialization", "Location", "Stipend", "Skills", "Status", "Action"]
         self.student_applications_table.setRowCount(len(applications))
         self.student_applications_table.setColumnCount(len(headers))
         self.student_applications_table.setHorizontalHeaderLabels(headers)
 
         for row, app in enumerate(applications):
-            for col, value in enumerate(app):
+            for col, value in enumerate(app[:6]):
                 self.student_applications_table.setItem(row, col, QTableWidgetItem(str(value)))
+            if positions.get(app[6]):
+                self.student_applications_table.setItem(row, 5, QTableWidgetItem(f"waitlisted (#{positions[app[6]]})"))
+
+            if app[5] in ("pending", "waitlisted", "accepted"):
+                withdraw_btn = QPushButton("Withdraw")
+                withdraw_btn.clicked.connect(partial(self.withdraw_application, app[6]))
+                self.student_applications_table.setCellWidget(row, 6, withdraw_btn)
 
         self.student_applications_table.resizeColumnsToContents()
         self.student_applications_table.horizontalHeader().setStretchLastSection(True)
 
+    def withdraw_application(self, application_id):
+        confirm = QMessageBox.question(self, "Confirm", "Withdraw this application?", QMessageBox.Yes | QMessageBox.No)
+        if confirm != QMessageBox.Yes:
+            return
+        conn = seats.connect(db_path)
+        try:
+            promoted = seats.withdraw(conn, application_id)
+        except sqlite3.IntegrityError as e:
+            if str(e) == ROUND_FROZEN:
+                QMessageBox.warning(self, "Warning", f"{e}.")
+            else:
+                QMessageBox.critical(self, "Error", f"Failed to withdraw application: {e}")
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to withdraw application: {e}")
+            return
+        finally:
+            conn.close()
+        notify_promoted(promoted)
+        QMessageBox.information(self, "Success", "Your application was withdrawn.")
+        self.load_applications()
 
 
 # =====================================
@@ -700,6 +855,11 @@ class CompanyDashboard(QMainWindow):
 
         self.company_tabWidget.tabBar().setVisible(False)
         self.current_company_name = company_name
+        self.applications_page = 0
+        self.job_workers = {}  # job_id -> matching.jobs.JobWorker started from this dashboard
+        self.jobs_timer = QTimer(self)
+        self.jobs_timer.timeout.connect(self.load_matching_jobs)
+        self.view_company_jobs_button.setVisible(admin_jobs)
         self.handle_company_buttons()
 
     def handle_company_buttons(self):
@@ -710,6 +870,12 @@ class CompanyDashboard(QMainWindow):
         self.company_save_changes_button.clicked.connect(self.save_company_changes)
         self.add_opening_button.clicked.connect(self.handle_add_opening)
         self.view_company_applications_button.clicked.connect(self.open_company_applications_tab)
+        self.company_applications_prev_button.clicked.connect(partial(self.change_applications_page, -1))
+        self.company_applications_next_button.clicked.connect(partial(self.change_applications_page, 1))
+        self.view_company_jobs_button.clicked.connect(self.open_matching_jobs_tab)
+        self.jobs_start_button.clicked.connect(self.start_matching_job)
+        self.jobs_cancel_button.clicked.connect(self.cancel_matching_job)
+        self.jobs_resume_button.clicked.connect(self.resume_matching_job)
         self.company_logout_button.clicked.connect(self.company_logout)
 
     def open_company_info_tab(self):
@@ -725,6 +891,18 @@ class CompanyDashboard(QMainWindow):
 
     def open_company_applications_tab(self):
         self.company_tabWidget.setCurrentIndex(3)
+        self.applications_page = 0
+        self.load_applications()
+
+    def open_matching_jobs_tab(self):
+        if not admin_jobs:
+            return
+        self.company_tabWidget.setCurrentIndex(5)
+        self.load_matching_jobs()
+        self.jobs_timer.start(1000)  # the workers write their progress to match_jobs; poll it while the tab is open
+
+    def change_applications_page(self, step):
+        self.applications_page = max(self.applications_page + step, 0)
         self.load_applications()
 
     def load_company_info(self):
@@ -792,6 +970,7 @@ class CompanyDashboard(QMainWindow):
         location = self.requierd_location_input.text()
         stipend = self.stipend_input.text()
         skills = self.requierd_skills_input.text()
+        capacity = self.capacity_input.value()
 
         if not all([specialization, location, stipend, skills]):
             QMessageBox.warning(self, "Input Error", "Please fill in all fields.")
@@ -809,16 +988,21 @@ class CompanyDashboard(QMainWindow):
             conn = sqlite3.connect(db_path)
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO openings (company_name, specialization, location, stipend, required_skills)
-                VALUES (?, ?, ?, ?, ?)
-            """, (self.current_company_name, specialization, location, stipend, skills))
+                INSERT INTO openings (company_name, specialization, location, stipend, required_skills, capacity)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (self.current_company_name, specialization, location, stipend, skills, capacity))
+            opening_id = cursor.lastrowid
             conn.commit()
             conn.close()
+            queue_incremental_update("opening_added", opening_id)
+            if similar_openings is not None:
+                similar_openings.opening_added(opening_id)
             QMessageBox.information(self, "Success", "Opening added successfully.")
             self.requierd_specialization_input.clear()
             self.requierd_location_input.clear()
             self.stipend_input.clear()
             self.requierd_skills_input.clear()
+            self.capacity_input.setValue(1)
         except Exception as e:
             QMessageBox.critical(self, "Database Error", f"Failed to add opening: {str(e)}")
 
@@ -829,14 +1013,14 @@ class CompanyDashboard(QMainWindow):
             conn = sqlite3.connect(db_path)
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT opening_id, specialization, location, stipend, required_skills
+                SELECT opening_id, specialization, location, stipend, required_skills, capacity
                 FROM openings
                 WHERE company_name = ?
             """, (self.current_company_name,))
             openings = cursor.fetchall()
             conn.close()
 
-            headers = ["ID", "Specialization", "Location", "Stipend", "Skills", "Delete"]
+            headers = ["ID", "Specialization", "Location", "Stipend", "Skills", "Seats", "Delete"]
             self.company_openings_table.setColumnCount(len(headers))
             self.company_openings_table.setRowCount(len(openings))
             self.company_openings_table.setHorizontalHeaderLabels(headers)
@@ -848,7 +1032,7 @@ class CompanyDashboard(QMainWindow):
                     self.company_openings_table.setItem(row_index, col_index, QTableWidgetItem(str(value)))
                     delete_btn = QPushButton("Delete")
                     delete_btn.clicked.connect(partial(self.delete_opening, row_data[0]))  
-                    self.company_openings_table.setCellWidget(row_index, 5, delete_btn)
+                    self.company_openings_table.setCellWidget(row_index, 6, delete_btn)
 
 
             self.company_openings_table.resizeColumnsToContents()
@@ -861,22 +1045,20 @@ class CompanyDashboard(QMainWindow):
 
 
     def load_applications(self):
+        # one page of applicants, best match first, read from the precomputed ranking index;
+        # applicant_count scores the queued applications first, so the count and the page agree
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT a.application_id, s.name, s.email, s.gpa, o.opening_id, o.specialization, o.location, a.status
-            FROM applications a
-            JOIN students s ON a.student_id = s.student_id
-            JOIN openings o ON a.opening_id = o.opening_id
-            WHERE o.company_name = ?
-            ORDER BY s.gpa DESC
-        """, (self.current_company_name,))
-
-        applications = cursor.fetchall()
+        total = applicant_count(conn, self.current_company_name)
+        pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+        self.applications_page = min(self.applications_page, pages - 1)
+        applications = ranked_page(conn, self.current_company_name, self.applications_page)
         conn.close()
 
-        headers = ["Student Name", "Email", "GPA", "Specialization", "Location", "Status", "Action"]
+        self.company_applications_page_label.setText(f"Page {self.applications_page + 1} of {pages} ({total} applicants)")
+        self.company_applications_prev_button.setEnabled(self.applications_page > 0)
+        self.company_applications_next_button.setEnabled(self.applications_page < pages - 1)
+
+        headers = ["Student Name", "Email", "GPA", "Specialization", "Location", "Status", "Match Score", "Action", "Decline"]
         self.company_applications_table.setColumnCount(len(headers))
         self.company_applications_table.setRowCount(len(applications))
         self.company_applications_table.setHorizontalHeaderLabels(headers)
@@ -889,12 +1071,17 @@ class CompanyDashboard(QMainWindow):
             self.company_applications_table.setItem(row, 3, QTableWidgetItem(spec))
             self.company_applications_table.setItem(row, 4, QTableWidgetItem(loc))
             self.company_applications_table.setItem(row, 5, QTableWidgetItem(status))
+            self.company_applications_table.setItem(row, 6, QTableWidgetItem(f"{app[8] * 100:.0f}%"))
 
                     # the accept action will be only if the status is pending
             if status == "pending":
                 accept_btn = QPushButton("Accept")
                 accept_btn.clicked.connect(partial(self.accept_application, app[0], email, name))
-                self.company_applications_table.setCellWidget(row, 6, accept_btn)
+                self.company_applications_table.setCellWidget(row, 7, accept_btn)
+            if status in ("pending", "waitlisted", "accepted"):
+                decline_btn = QPushButton("Decline")
+                decline_btn.clicked.connect(partial(self.decline_application, app[0]))
+                self.company_applications_table.setCellWidget(row, 8, decline_btn)
 
         self.company_applications_table.resizeColumnsToContents()
         self.company_applications_table.horizontalHeader().setStretchLastSection(True)
@@ -903,43 +1090,162 @@ class CompanyDashboard(QMainWindow):
 
 
     def accept_application(self, application_id, student_email, student_name):
+        # takes a free seat, or joins the opening's waitlist when every seat is taken
+        conn = seats.connect(db_path)
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("UPDATE applications SET status = 'accepted' WHERE application_id = ?", (application_id,))
-            conn.commit()
+            outcome = seats.accept(conn, application_id)
+            position = seats.waitlist_position(conn, application_id)
+        except sqlite3.IntegrityError as e:
+            # a closed round's applications wait for its matching job
+            if str(e) == ROUND_FROZEN:
+                QMessageBox.warning(self, "Warning", f"{e}.")
+            else:
+                QMessageBox.critical(self, "Error", f"Failed to accept application: {str(e)}")
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to accept application: {str(e)}")
+            return
+        finally:
             conn.close()
 
-                # inform the student if accepted
+        if outcome == "accepted":
+            # inform the student if accepted
             send_email(to_email=student_email,  subject="Congrats!, you have been accepted in the apprenticeship",  body=f"Hi {student_name}, you have been accepted for {self.current_company_name}.")
-
             QMessageBox.information(self, "Success", "Student accepted and notified.")
-            self.load_applications()  # update the table
+        else:
+            QMessageBox.information(self, "Waitlisted", f"All seats are taken. {student_name} is number {position} on the waitlist.")
+        self.load_applications()  # update the table
 
+    def decline_application(self, application_id):
+        # a declined accepted student frees a seat for the best waitlisted one
+        conn = seats.connect(db_path)
+        try:
+            promoted = seats.decline(conn, application_id)
+        except sqlite3.IntegrityError as e:
+            if str(e) == ROUND_FROZEN:
+                QMessageBox.warning(self, "Warning", f"{e}.")
+            else:
+                QMessageBox.critical(self, "Error", f"Failed to decline application: {str(e)}")
+            return
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to accept application: {str(e)}")
+            QMessageBox.critical(self, "Error", f"Failed to decline application: {str(e)}")
+            return
+        finally:
+            conn.close()
+        notify_promoted(promoted)
+        QMessageBox.information(self, "Success", "Application declined." + (" The next student on the waitlist was accepted and notified." if promoted else ""))
+        self.load_applications()
 
     def delete_opening(self, opening_id):
         confirm = QMessageBox.question(self, "Confirm", "Are you sure you want to delete this opening?", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
+            conn = sqlite3.connect(db_path)
             try:
-                conn = sqlite3.connect(db_path)
                 cursor = conn.cursor()
 
                 cursor.execute("DELETE FROM applications WHERE opening_id = ?", (opening_id,))
                 cursor.execute("DELETE FROM openings WHERE opening_id = ?", (opening_id,))
 
                 conn.commit()
-                conn.close()
-                QMessageBox.information(self, "Success", "Opening and related applications deleted successfully.")
-                self.load_company_openings()
+            except sqlite3.IntegrityError as e:
+                # nothing is deleted: the opening has applications in a closed round that is not matched yet
+                if str(e) == ROUND_FROZEN:
+                    QMessageBox.warning(self, "Warning", f"{e}.")
+                else:
+                    QMessageBox.critical(self, "Error", f"Failed to delete opening: {e}")
+                return
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to delete opening: {e}")
+                return
+            finally:
+                conn.close()
+            queue_incremental_update("opening_deleted", opening_id)
+            if similar_openings is not None:
+                similar_openings.opening_deleted(opening_id)
+            QMessageBox.information(self, "Success", "Opening and related applications deleted successfully.")
+            self.load_company_openings()
+
 
 
 
+    def load_matching_jobs(self):
+        if self.company_tabWidget.currentIndex() != 5:
+            self.jobs_timer.stop()
+            return
+        conn = jobs.connect(db_path)
+        job_list = jobs.list_jobs(conn, 50)
+        conn.close()
+
+        selected = self.selected_job_id()
+        self.jobs_table.setRowCount(len(job_list))
+        for row, job in enumerate(job_list):
+            self.jobs_table.setItem(row, 0, QTableWidgetItem(str(job["job_id"])))
+            self.jobs_table.setItem(row, 1, QTableWidgetItem(job["status"]))
+            self.jobs_table.setItem(row, 2, QTableWidgetItem(job["engine"] + (" weighted" if job["parameters"]["weighted"] else "")))
+            self.jobs_table.setItem(row, 3, QTableWidgetItem(f"{job['processed']:,} / {job['students']:,}"))
+            self.jobs_table.setItem(row, 4, QTableWidgetItem(f"{job['rate']:,.0f}" if job["rate"] else "-"))
+            self.jobs_table.setItem(row, 5, QTableWidgetItem(str(job["run_id"]) if job["run_id"] is not None else "-"))
+            if job["job_id"] == selected:
+                self.jobs_table.selectRow(row)
+
+        # the progress bar follows the selected job, or the newest one
+        shown = next((job for job in job_list if job["job_id"] == selected), job_list[0] if job_list else None)
+        if shown is None:
+            self.jobs_progress_bar.setValue(0)
+            self.jobs_status_label.setText("No matching jobs yet.")
+            return
+        self.jobs_progress_bar.setValue(int(100 * shown["processed"] / shown["students"]) if shown["students"] else 0)
+        text = f"Job {shown['job_id']} is {shown['status']}: {shown['processed']:,} of {shown['students']:,} students"
+        if shown["status"] == "running" and shown["rate"]:
+            remaining = (shown["students"] - shown["processed"]) / shown["rate"]
+            text += f", {shown['rate']:,.0f} students/s, about {remaining:,.0f}s left"
+        if shown["error"]:
+            text += f" ({shown['error']})"
+        self.jobs_status_label.setText(text)
+
+    def selected_job_id(self):
+        row = self.jobs_table.currentRow()
+        item = self.jobs_table.item(row, 0) if row >= 0 else None
+        return int(item.text()) if item else None
+
+    def start_matching_job(self):
+        try:
+            conn = jobs.connect(db_path)
+            job_id = jobs.create_job(conn, self.jobs_engine_input.currentText(), weighted=self.jobs_weighted_input.isChecked())
+            conn.close()
+            self.job_workers[job_id] = jobs.start(db_path, job_id)
+            self.load_matching_jobs()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to start the matching job: {str(e)}")
+
+    def cancel_matching_job(self):
+        job_id = self.selected_job_id()
+        if job_id is None:
+            QMessageBox.warning(self, "Error", "Select a job first.")
+            return
+        # through the database, so a job started from the command line stops too
+        conn = jobs.connect(db_path)
+        status = jobs.cancel(conn, job_id)
+        conn.close()
+        QMessageBox.information(self, "Matching job", f"Job {job_id} is {status}. A running job stops after its current chunk and can be resumed.")
+        self.load_matching_jobs()
+
+    def resume_matching_job(self):
+        job_id = self.selected_job_id()
+        if job_id is None:
+            QMessageBox.warning(self, "Error", "Select a job first.")
+            return
+        try:
+            self.job_workers[job_id] = jobs.start(db_path, job_id)
+            self.load_matching_jobs()
+        except jobs.JobError as e:
+            QMessageBox.warning(self, "Matching job", str(e))
 
     def company_logout(self):
+        # running jobs stop after their current chunk; they can be resumed from this tab or the command line
+        for worker in self.job_workers.values():
+            worker.cancel()
+        self.jobs_timer.stop()
         self.close()
 
 # The rest of the UI classes and dashboards are being added next.